@@ -32,8 +32,12 @@ parent GUI widget.
 """
 
 from collections import namedtuple, OrderedDict
+import array
 import logging
+import mmap
 import pathlib
+import re
+import sys
 
 from . import symbols
 
@@ -101,13 +105,322 @@ class Block(object):
         self.end = end
         self.level = level
         self.symbol = symbol
+        self.assignments = {}  # assignments at THIS nesting level (in order)
+        self.blocks = []  # blocks nested directly within this block
 
     def __str__(self):
         fmt = "Block: %d:%d:%d %s"
         return fmt % (self.level, self.start, self.end, str(self.symbol))
 
+    def lines(self, buf):
+        """view (not a copy) of the lines of buf between this block's braces"""
+        return BufferView(buf, self.start + 1, self.end)
+
+
+class BufferView(object):
+    """
+    range of lines in a shared buffer, use in place of a list slice
+
+    A slice such as ``buf[block.start + 1 : block.end]`` copies the
+    lines.  Nested blocks would copy the same lines again at each level.
+    A view only records ``(buffer, start, end)``.  A view of a view
+    refers to the same, original buffer.
+
+    A view can be iterated, indexed, sliced (another view), and
+    has a length, so it can be given wherever a list of lines is expected.
+    """
+
+    __slots__ = ("buffer", "start", "end")
+
+    def __init__(self, buffer, start=0, end=None):
+        size = len(buffer)
+        start = max(0, min(start, size))
+        end = size if end is None else max(start, min(end, size))
+        if isinstance(buffer, BufferView):
+            start += buffer.start
+            end += buffer.start
+            buffer = buffer.buffer
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        buffer = self.buffer
+        for i in range(self.start, self.end):
+            yield buffer[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("BufferView slices must be contiguous")
+            return BufferView(self, start, stop)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("BufferView index out of range")
+        return self.buffer[self.start + key]
+
+    def __str__(self):
+        fmt = "BufferView: %d:%d"
+        return fmt % (self.start, self.end)
+
+    def text(self):
+        """copy of the lines in this view, as one string"""
+        return "".join(self)
+
+
+# kinds of line identified by classifyAdlLine()
+OPEN_BLOCK, CLOSE_BLOCK, ASSIGNMENT = range(3)
+
+# any byte that is not printable ASCII or ASCII white space
+UNUSUAL_BYTES = re.compile(rb"[^\x20-\x7e\t\n\r\x0b\x0c]")
+
+# same rules as classifyAdlLine(), applied to a whole (ASCII) file at once
+ADL_LINE_PATTERN = re.compile(
+    rb"^(?:"
+    rb"(?P<open>[^\n]* )\{"  # symbol {
+    rb"|(?P<close>[^\n]*)\}"  # }
+    rb"|(?P<key>[^\n=]+)=(?P<value>[^\n]*?)"  # key=value
+    rb")[ \t\r\x0b\x0c]*$",
+    re.MULTILINE,
+)
+
+
+def classifyAdlLine(text):
+    """
+    identify one line of an .adl file
+
+    Returns ``(OPEN_BLOCK, symbol, None)``, ``(CLOSE_BLOCK, None, None)``,
+    ``(ASSIGNMENT, key, value)``, or ``None`` for any other line
+    (such as a value in a list).
+    """
+    stripped = text.rstrip()
+    if stripped.endswith(" {"):
+        symbol = text.strip()[:-2]
+        return OPEN_BLOCK, sys.intern(symbol.strip('"')), None
+    elif stripped.endswith("}"):
+        return CLOSE_BLOCK, None, None
+    p = text.find("=")
+    if p > 0:
+        key = text[:p].strip().strip('"')
+        value = text[p + 1 :].strip().strip('"')
+        return ASSIGNMENT, sys.intern(key), value
+
+
+def iterAdlItems(lines):
+    """yield (line number, kind, key, value) of each block and assignment in lines"""
+    for line, text in enumerate(lines):
+        item = classifyAdlLine(text)
+        if item is not None:
+            yield (line,) + item
+
+
+def iterAdlBlocks(lines, root=None, items=None):
+    """
+    scan lines once, yield each top-level block as soon as it closes
+
+    Each block in the tree records the line numbers (counted from the
+    first of ``lines``) of its opening and closing braces, the
+    assignments at its own nesting level, and the blocks nested
+    directly within it.  Any top-level assignments are recorded in
+    ``root.assignments`` (if ``root`` is given).
+
+    Instead of ``lines``, the result of ``iterAdlItems()``
+    (or equivalent) may be given as ``items``.
+
+    Same rules as ``locateBlocks()`` and ``locateAssignments()``:
+    a block whose closing brace is never found is discarded.
+    """
+    root = root or Block(-1, None, -1, None)
+    stack = [root]
+    values = {}  # one copy of each value (many repeat, such as "outline")
+    if items is None:
+        items = iterAdlItems(lines)
+    for line, kind, key, value in items:
+        if kind == OPEN_BLOCK:
+            block = Block(line, None, len(stack) - 1, key)
+            if len(stack) > 1:
+                stack[-1].blocks.append(block)
+            stack.append(block)
+        elif kind == CLOSE_BLOCK:
+            if len(stack) > 1:
+                block = stack.pop()
+                block.end = line
+                if len(stack) == 1:
+                    yield block
+        else:
+            stack[-1].assignments[key] = values.setdefault(value, value)
+
+
+def tokenizeAdlBuffer(buf):
+    """
+    scan the buffer once into a tree of blocks and assignments
+
+    Returns a root ``Block`` (``symbol=None``) that spans the whole buffer.
+    Line numbers in the tree are indices into ``buf``.
+    A ``MappedAdlFile`` is scanned as bytes.
+    """
+    root = Block(-1, len(buf), -1, None)
+    items = None
+    if isinstance(buf, MappedAdlFile):
+        items = buf.iterItems()
+    root.blocks = list(iterAdlBlocks(buf, root, items))
+    return root
+
+
+class MappedAdlFile(object):
+    """
+    lines of an .adl file, memory-mapped and scanned as bytes
+
+    Only the line offsets are kept.  A line is decoded
+    (discarding any non-utf8 characters) only when it is used.
+    Use as a list of lines, such as for ``parseAdlBuffer()``.
+
+    Files that cannot be mapped (empty) or that use carriage
+    returns (``\\r``) in line endings are read as text instead.
+    """
+
+    def __init__(self, fname):
+        self.mm = None
+        self.offsets = None  # offsets[i] is start of line i
+        self.lines = None  # used when not mapped
+        with open(fname, "rb") as fp:
+            try:
+                mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # cannot map an empty file
+                mm = None
+        if mm is not None and mm.find(b"\r") >= 0:
+            # let text mode handle the universal newlines
+            mm.close()
+            mm = None
+
+        if mm is None:
+            with open(fname, "r", encoding="utf8", errors="ignore") as fp:
+                self.lines = fp.readlines()
+        else:
+            self.mm = mm
+            self.offsets = array.array("Q", [0])
+            pos = mm.find(b"\n")
+            while pos >= 0:
+                self.offsets.append(pos + 1)
+                pos = mm.find(b"\n", pos + 1)
+            if self.offsets[-1] < len(mm):
+                self.offsets.append(len(mm))  # last line has no newline
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        if self.mm is None:
+            return len(self.lines)
+        return len(self.offsets) - 1
+
+    def __getitem__(self, line):
+        if self.mm is None:
+            return self.lines[line]
+        if line < 0:
+            line += len(self)
+        if not 0 <= line < len(self):
+            raise IndexError("line number out of range")
+        raw = self.mm[self.offsets[line] : self.offsets[line + 1]]
+        return raw.decode("utf8", errors="ignore")
+
+    def __iter__(self):
+        for line in range(len(self)):
+            yield self[line]
+
+    def close(self):
+        """release the memory map, lines are no longer available"""
+        if self.mm is not None:
+            self.mm.close()
+
+    def iterItems(self):
+        """
+        like ``iterAdlItems()``, decode only symbols, keys, and values
+
+        A file with any non-ASCII (or control) characters is
+        decoded and scanned line by line, as ``iterAdlItems()``.
+        """
+        if self.mm is None or UNUSUAL_BYTES.search(self.mm) is not None:
+            yield from iterAdlItems(self)
+            return
+
+        offsets = self.offsets
+        line = 0
+        for match in ADL_LINE_PATTERN.finditer(self.mm):
+            pos = match.start()
+            while offsets[line + 1] <= pos:
+                line += 1
+            symbol, closing, key, value = match.groups()
+            if symbol is not None:
+                symbol = symbol.lstrip()[:-1]  # same as text.strip()[:-2]
+                yield line, OPEN_BLOCK, sys.intern(symbol.strip(b'"').decode()), None
+            elif closing is not None:
+                yield line, CLOSE_BLOCK, None, None
+            else:
+                key = sys.intern(key.strip().strip(b'"').decode())
+                yield line, ASSIGNMENT, key, value.strip().strip(b'"').decode()
+
+
+class StreamBuffer(object):
+    """
+    lines read from a stream, only the lines not yet discarded are kept
+
+    Indexed by line number (counted from the first line read),
+    as a list of all the lines read so far would be.
+    """
+
+    def __init__(self):
+        self.base = 0  # line number of self.lines[0]
+        self.lines = []
+
+    def __len__(self):
+        return self.base + len(self.lines)
+
+    def __getitem__(self, line):
+        if line < self.base:
+            raise IndexError(f"line {line} was discarded")
+        return self.lines[line - self.base]
+
+    def discard(self, line):
+        """forget all lines before this line number"""
+        if line > self.base:
+            del self.lines[: line - self.base]
+            self.base = line
+
+    def record(self, lines):
+        """keep each line as it is read from lines"""
+        for text in lines:
+            self.lines.append(text)
+            yield text
+
 
 class MedmBaseWidget(object):
+    # MEDM widget symbol: class that parses it, see registerMedmWidget()
+    medm_widget_handlers = {}
+
+    # A screen may have many thousand widgets, keep each one compact.
+    # Subclasses declare __slots__ for any new attributes (or an empty one).
+    # (MedmMainWidget does not, any "display" attributes are kept.)
+    __slots__ = (
+        "background_color",
+        "color",
+        "contents",
+        "geometry",
+        "line_offset",
+        "points",
+        "symbol",
+        "title",
+        "__weakref__",
+    )
+
     def __init__(self):
         self.background_color = None
         self.color = None
@@ -115,32 +428,6 @@ class MedmBaseWidget(object):
         self.line_offset = 0
         self.symbol = None
         self.title = None
-        self.medm_widget_handlers = {
-            "arc": MedmArcWidget,
-            "bar": MedmBarWidget,
-            "byte": MedmByteWidget,
-            "cartesian plot": MedmCartesianPlotWidget,
-            "choice button": MedmChoiceButtonWidget,
-            "composite": MedmCompositeWidget,
-            "embedded display": MedmEmbeddedDisplayWidget,
-            "image": MedmImageWidget,
-            "indicator": MedmIndicatorWidget,
-            "menu": MedmMenuWidget,
-            "message button": MedmMessageButtonWidget,
-            "meter": MedmMeterWidget,
-            "oval": MedmOvalWidget,
-            "polygon": MedmPolygonWidget,
-            "polyline": MedmPolylineWidget,
-            "rectangle": MedmRectangleWidget,
-            "related display": MedmRelatedDisplayWidget,
-            "shell command": MedmShellCommandWidget,
-            "strip chart": MedmStripChartWidget,
-            "text": MedmTextWidget,
-            "text entry": MedmTextEntryWidget,
-            "text update": MedmTextUpdateWidget,
-            "valuator": MedmValuatorWidget,
-            "wheel switch": MedmWheelSwitchWidget,
-        }
 
     def __str__(self):
         fmt = "Widget(%s)"
@@ -161,6 +448,8 @@ class MedmBaseWidget(object):
     def locateAssignments(self, buf):
         """
         identify and record the line number of all assignments in the buffer at this nesting level
+
+        ``buf`` is a list of lines or a ``BufferView``.
         """
         assignments = OrderedDict()
         level = 0
@@ -181,6 +470,9 @@ class MedmBaseWidget(object):
     def locateBlocks(self, buf):
         """
         identify and record the start and end of all blocks at this nesting level in the buffer
+
+        ``buf`` is a list of lines or a ``BufferView``.
+        Line numbers are counted from the start of ``buf``.
         """
         blocks = []
         level = 0
@@ -198,10 +490,18 @@ class MedmBaseWidget(object):
                     blocks.append(block)
         return blocks
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
+    def parseAdlBuffer(self, buf):
+        """
+        scan the buffer (once) into a block tree, then parse that tree
+
+        ``buf`` is a list of lines or a ``BufferView``.
+        """
+        return self.parseAdlTree(buf, tokenizeAdlBuffer(buf))
+
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
         """generic handling, override as needed"""
-        assignments = self.locateAssignments(buf)
-        blocks = self.locateBlocks(buf)
+        assignments = node.assignments.copy()
+        blocks = list(node.blocks)
 
         # assign certain items in named attributes
         assignments = self.parseColorAssignments(assignments)
@@ -209,7 +509,7 @@ class MedmBaseWidget(object):
         # all widget blocks have an "object"
         block = self.getNamedBlock("object", blocks)
         if block is not None:
-            self.geometry = self.parseObjectBlock(buf[block.start + 1 : block.end])
+            self.geometry = self.parseObjectBlock(block)
 
             # remove that block
             for i, b in enumerate(blocks):
@@ -227,7 +527,9 @@ class MedmBaseWidget(object):
         # stash remaining contents
         contents = dict(**assignments)
         for block in blocks:  # TODO: improve
-            contents[block.symbol] = "".join(buf[block.start + 1 : block.end])
+            if block.symbol not in ("children", "points"):
+                # do not copy the (possibly long) text of these, they are parsed below
+                contents[block.symbol] = block.lines(buf).text()
         self.contents = contents
 
         limits = self.contents.get("limits", "").strip()
@@ -245,8 +547,7 @@ class MedmBaseWidget(object):
         ):
             block = self.getNamedBlock(symbol, blocks)
             if block is not None:
-                aa = self.locateAssignments(buf[block.start + 1 : block.end])
-                aa = self.parseColorAssignments(aa)
+                aa = self.parseColorAssignments(block.assignments.copy())
                 self.contents[symbol] = aa
 
         for angle_name in "begin path".split():
@@ -257,23 +558,32 @@ class MedmBaseWidget(object):
         block = self.getNamedBlock("points", blocks)
         if block is not None:
             points = []
-            for pair in buf[block.start + 1 : block.end]:
+            for pair in block.lines(buf):
                 x, y = map(int, pair.replace("(", "").replace(")", "").split(","))
                 points.append(Point(x, y))
             self.points = points
-            if "points" in self.contents:
-                del self.contents["points"]
 
         return assignments, blocks
 
-    def parseChildren(self, main, blocks, buf):
+    def parseChildren(self, main, blocks, buf, origin=0):
+        """
+        create & parse the widgets described by blocks
+
+        ``origin`` is the index in ``buf`` that line numbers of
+        these child widgets are counted from.
+        """
         for block in blocks:
             if block.symbol in symbols.adl_widgets:
-                logger.debug("(#%d) %s" % (self.line_offset + block.start, block.symbol))
-                handler = self.medm_widget_handlers.get(block.symbol, MedmGenericWidget)
-                widget = handler(self.line_offset + block.start, main, block.symbol)
-                widget.parseAdlBuffer(buf[block.start + 1 : block.end])
-                self.widgets.append(widget)
+                self.widgets.append(self.parseWidget(main, block, buf, origin))
+
+    def parseWidget(self, main, block, buf, origin=0):
+        """create & parse the widget described by block"""
+        line = self.line_offset + block.start - origin
+        logger.debug("(#%d) %s" % (line, block.symbol))
+        handler = self.medm_widget_handlers.get(block.symbol, MedmGenericWidget)
+        widget = handler(line, main, block.symbol)
+        widget.parseAdlTree(buf, block)
+        return widget
 
     def parseColorAssignments(self, assignments):
         # assign certain items in named attributes
@@ -293,21 +603,17 @@ class MedmBaseWidget(object):
                 del assignments[k]
         return assignments
 
-    def parseObjectBlock(self, buf):
+    def parseObjectBlock(self, block):
         """MEDM "object" block defines a Geometry for its parent"""
-        a = self.locateAssignments(buf)
+        a = block.assignments
         arr = map(int, (a["x"], a["y"], a["width"], a["height"]))  # convert to int
         return Geometry(*list(arr))
 
-    def parsePlotcomBlock(self, buf, blocks):
+    def parsePlotcomBlock(self, blocks):
         block = self.getNamedBlock("plotcom", blocks)
         if block is not None:
-            # fmt: off
-            self.parseColorAssignments(
-                self.locateAssignments(buf[block.start + 1 : block.end])
-            )
-            # fmt: on
-            aa = self.locateAssignments(buf[block.start + 1 : block.end])
+            self.parseColorAssignments(block.assignments.copy())
+            aa = block.assignments.copy()
             for symbol in "clr bclr".split():
                 if symbol in aa:
                     del aa[symbol]
@@ -340,46 +646,105 @@ class MedmMainWidget(MedmBaseWidget):
         buf = open(fname, "r", encoding="utf8", errors="ignore").readlines()
         return buf
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        logger.debug("\n" * 2)
-        logger.debug(self.given_filename)
-        blocks = self.locateBlocks(buf)
-        for block in blocks:
-            logger.debug(str(block))
+    def mapAdlFile(self, fname=None):
+        """
+        like ``getAdlLines()`` but memory-mapped, read lines only as needed
+
+        Returns a ``MappedAdlFile``, close it (or use it as a
+        context manager) when done parsing.
+        """
+        fname = fname or self.given_filename
+        if not pathlib.Path(fname).exists():
+            msg = "Could not find file: " + str(fname)
+            raise ValueError(msg)
+        self.given_filename = fname
+        return MappedAdlFile(fname)
 
-        xref = OrderedDict(
+    def getHeaderHandlers(self):
+        """handlers of the blocks that describe the screen, in the order to be called"""
+        return OrderedDict(
             [
                 ("file", self.parseFileBlock),
                 ("color map", self.parseColorMapBlock),  # must BEFORE display
                 ("display", self.parseDisplayBlock),
             ]
         )
-        for symbol, handler in xref.items():
+
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        logger.debug("\n" * 2)
+        logger.debug(self.given_filename)
+        blocks = node.blocks
+        for block in blocks:
+            logger.debug(str(block))
+
+        for symbol, handler in self.getHeaderHandlers().items():
             block = self.getNamedBlock(symbol, blocks)
             if block is None:
                 logger.warning("Did not find %s block" % symbol)
             else:
                 logger.debug("Processing %s block" % symbol)
-                handler(buf[block.start + 1 : block.end])
+                handler(buf, block)
 
         # sift out the three block types already handled
         blocks = [block for block in blocks if block.symbol in symbols.adl_widgets]
         self.parseChildren(self, blocks, buf)
 
-    def parseFileBlock(self, buf):
-        # TODO: keep original line numbers for debug purposes
+    def iter_widgets(self, fileobj):
+        """
+        parse lines from fileobj, yield each top-level widget when its block closes
+
+        Only the lines of the block being parsed are kept in memory and
+        the widgets are not collected in ``self.widgets``.  The ``file``,
+        ``color map``, and ``display`` blocks are parsed before the first
+        widget is yielded.  (MEDM writes these blocks before any widgets.)
+
+        ``fileobj`` is any iterable of lines, such as an open text file.
+        """
+        logger.debug("\n" * 2)
+        logger.debug(self.given_filename)
+        headers = self.getHeaderHandlers()
+        waiting = {}  # header blocks found but not parsed yet
+
+        def parse_headers(final=False):
+            # in the order of headers, wait for any not found yet (unless final)
+            while len(headers) > 0:
+                symbol, handler = next(iter(headers.items()))
+                block = waiting.pop(symbol, None)
+                if block is not None:
+                    logger.debug("Processing %s block" % symbol)
+                    handler(buf, block)
+                elif final:
+                    logger.warning("Did not find %s block" % symbol)
+                else:
+                    return
+                del headers[symbol]
+
+        buf = StreamBuffer()
+        for block in iterAdlBlocks(buf.record(fileobj)):
+            logger.debug(str(block))
+            if block.symbol in symbols.adl_widgets:
+                parse_headers(final=True)
+                yield self.parseWidget(self, block, buf)
+            elif block.symbol in headers and block.symbol not in waiting:
+                waiting[block.symbol] = block
+                parse_headers()
+            if len(waiting) == 0:
+                buf.discard(block.end + 1)
+
+        parse_headers(final=True)
+
+    def parseFileBlock(self, buf, block):
         xref = dict(name="adl_filename", version="adl_version")
-        assignments = self.locateAssignments(buf)
+        assignments = block.assignments
         for k, sk in xref.items():
             value = assignments.get(k)
             if value is not None:
                 self.__setattr__(sk, value)
 
-    def parseColorMapBlock(self, buf):
+    def parseColorMapBlock(self, buf, block):
         """read the color_table (clut) from the "color map"""
-        # TODO: keep original line numbers for debug purposes
-        # assignments = self.locateAssignments(buf)   # ignore ncolors=
-        blocks = self.locateBlocks(buf)
+        # ignore ncolors=
+        blocks = block.blocks
 
         block = self.getNamedBlock("colors", blocks)
         if block is not None:
@@ -390,7 +755,7 @@ class MedmMainWidget(MedmBaseWidget):
                 b = int(rgbhex[4:6], 16)
                 return Color(r, g, b)
 
-            text = "".join(buf[block.start + 1 : block.end])
+            text = block.lines(buf).text()
             clut = map(_parse_colors_, text.replace(",", " ").split())
             self.color_table = list(clut)
         else:
@@ -399,16 +764,15 @@ class MedmMainWidget(MedmBaseWidget):
             if block is not None:
                 clut = []
                 for block in blocks:
-                    a = self.locateAssignments(buf[block.start + 1 : block.end])
+                    a = block.assignments
                     arr = map(int, (a["r"], a["g"], a["b"]))
                     color = Color(*list(arr))  # ignore inten (default = 255)
                     clut.append(color)
                 self.color_table = clut
 
-    def parseDisplayBlock(self, buf):
-        # TODO: keep original line numbers for debug purposes
-        assignments = self.locateAssignments(buf)
-        blocks = self.locateBlocks(buf)
+    def parseDisplayBlock(self, buf, block):
+        assignments = block.assignments.copy()
+        blocks = block.blocks
 
         # assign certain items in named attributes
         assignments = self.parseColorAssignments(assignments)
@@ -419,11 +783,12 @@ class MedmMainWidget(MedmBaseWidget):
 
         block = self.getNamedBlock("object", blocks)
         if block is not None:
-            self.geometry = self.parseObjectBlock(buf[block.start + 1 : block.end])
+            self.geometry = self.parseObjectBlock(block)
         # ignore any other blocks
 
 
 class MedmGenericWidget(MedmBaseWidget):
+    __slots__ = ("main",)
 
     debug = False
 
@@ -433,43 +798,44 @@ class MedmGenericWidget(MedmBaseWidget):
         self.main = main
         self.symbol = symbol
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
         # assignments, blocks =
-        MedmBaseWidget.parseAdlBuffer(self, buf)
+        MedmBaseWidget.parseAdlTree(self, buf, node)
 
 
 class MedmArcWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmBarWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmByteWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmCartesianPlotWidget(MedmGenericWidget):
+    __slots__ = ()
+
     def __init__(self, line, main, symbol):
         MedmGenericWidget.__init__(self, line, main, symbol)
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        assignments, blocks = MedmBaseWidget.parseAdlBuffer(self, buf)
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        assignments, blocks = MedmBaseWidget.parseAdlTree(self, buf, node)
 
-        self.parsePlotcomBlock(buf, blocks)
+        self.parsePlotcomBlock(blocks)
 
         for symbol in ("x_axis", "y1_axis", "y2_axis"):
             block = self.getNamedBlock(symbol, blocks)
             if block is not None:
-                aa = self.locateAssignments(buf[block.start + 1 : block.end])
-                self.contents[symbol] = aa
+                self.contents[symbol] = block.assignments.copy()
 
         traces = {}
         for block in blocks:
             if block.symbol.startswith("trace["):
                 del self.contents[block.symbol]
-                aa = self.locateAssignments(buf[block.start + 1 : block.end])
+                aa = block.assignments.copy()
                 clr = aa.get("data_clr")
                 if clr is not None:
                     del aa["data_clr"]
@@ -484,12 +850,14 @@ class MedmCartesianPlotWidget(MedmGenericWidget):
 
 
 class MedmChoiceButtonWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmCompositeWidget(MedmBaseWidget):
     """contains other widgets or an entire .adl screen"""
 
+    __slots__ = ("main", "widgets")
+
     def __init__(self, line, main, symbol):
         MedmBaseWidget.__init__(self)
         self.line_offset = line
@@ -497,17 +865,17 @@ class MedmCompositeWidget(MedmBaseWidget):
         self.symbol = symbol  # "composite"
         self.widgets = []
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        assignments, blocks = MedmBaseWidget.parseAdlBuffer(self, buf)
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        assignments, blocks = MedmBaseWidget.parseAdlTree(self, buf, node)
 
         block = self.getNamedBlock("children", blocks)
         if block is not None:
-            # aa = self.locateAssignments(buf[block.start+1:block.end])
-            bb = self.locateBlocks(buf[block.start + 1 : block.end])
-            self.parseChildren(self.main, bb, buf[block.start + 1 : block.end])
+            # MEDM numbers these child widgets from the start of "children"
+            self.parseChildren(self.main, block.blocks, buf, block.start + 1)
 
 
 class MedmEmbeddedDisplayWidget(MedmGenericWidget):
+    __slots__ = ()
     debug = True  # TODO: need example in .adl file!
 
     def __init__(self, line, main, symbol):
@@ -531,48 +899,50 @@ class MedmEmbeddedDisplayWidget(MedmGenericWidget):
 
 
 class MedmImageWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmIndicatorWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmMenuWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmMessageButtonWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmMeterWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmOvalWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmPolygonWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmPolylineWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmRectangleWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmRelatedDisplayWidget(MedmGenericWidget):
+    __slots__ = ("displays",)
+
     def __init__(self, line, main, symbol):
         MedmGenericWidget.__init__(self, line, main, symbol)
         self.displays = []
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        assignments, blocks = MedmBaseWidget.parseAdlBuffer(self, buf)
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        assignments, blocks = MedmBaseWidget.parseAdlTree(self, buf, node)
 
         displays = {}
         for block in blocks:
@@ -580,7 +950,7 @@ class MedmRelatedDisplayWidget(MedmGenericWidget):
                 continue
             if block.symbol in self.contents:
                 del self.contents[block.symbol]
-            aa = self.locateAssignments(buf[block.start + 1 : block.end])
+            aa = block.assignments.copy()
             row = block.symbol.replace("[", " ").replace("]", "").split()[-1]
             displays[row] = aa
 
@@ -591,19 +961,21 @@ class MedmRelatedDisplayWidget(MedmGenericWidget):
 
 
 class MedmShellCommandWidget(MedmGenericWidget):
+    __slots__ = ("commands",)
+
     def __init__(self, line, main, symbol):
         MedmGenericWidget.__init__(self, line, main, symbol)
         self.commands = []
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        assignments, blocks = MedmBaseWidget.parseAdlBuffer(self, buf)
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        assignments, blocks = MedmBaseWidget.parseAdlTree(self, buf, node)
 
         commands = {}
         for block in blocks:
             if not block.symbol.startswith("command["):
                 continue
             del self.contents[block.symbol]
-            aa = self.locateAssignments(buf[block.start + 1 : block.end])
+            aa = block.assignments.copy()
             row = block.symbol.replace("[", " ").replace("]", "").split()[-1]
             commands[row] = aa
 
@@ -614,17 +986,19 @@ class MedmShellCommandWidget(MedmGenericWidget):
 
 
 class MedmStripChartWidget(MedmGenericWidget):
+    __slots__ = ()
+
     def __init__(self, line, main, symbol):
         MedmGenericWidget.__init__(self, line, main, symbol)
 
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        assignments, blocks = MedmBaseWidget.parseAdlBuffer(self, buf)
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        assignments, blocks = MedmBaseWidget.parseAdlTree(self, buf, node)
 
         pens = {}
         for block in blocks:
             if block.symbol.startswith("pen["):
                 del self.contents[block.symbol]
-                aa = self.locateAssignments(buf[block.start + 1 : block.end])
+                aa = block.assignments.copy()
                 clr = aa.get("clr")
                 if clr is not None:
                     del aa["clr"]
@@ -632,7 +1006,7 @@ class MedmStripChartWidget(MedmGenericWidget):
                 row = block.symbol.replace("[", " ").replace("]", "").split()[-1]
                 pens[row] = aa
             elif block.symbol == "plotcom":
-                self.parsePlotcomBlock(buf, blocks)
+                self.parsePlotcomBlock(blocks)
             # elif block.symbol == "symbol":
             #     raise ValueError(block.symbol + " not handled yet")
             else:
@@ -645,24 +1019,75 @@ class MedmStripChartWidget(MedmGenericWidget):
 
 
 class MedmTextWidget(MedmGenericWidget):
-    def parseAdlBuffer(self, buf):  # lgtm [py/similar-function]
-        assignments, blocks = MedmBaseWidget.parseAdlBuffer(self, buf)
+    __slots__ = ()
+
+    def parseAdlTree(self, buf, node):  # lgtm [py/similar-function]
+        assignments, blocks = MedmBaseWidget.parseAdlTree(self, buf, node)
         if "textix" in assignments:
             self.title = assignments["textix"]
             del self.contents["textix"], assignments["textix"]
 
 
 class MedmTextEntryWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmTextUpdateWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmValuatorWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
 
 
 class MedmWheelSwitchWidget(MedmGenericWidget):
-    pass
+    __slots__ = ()
+
+
+def registerMedmWidget(symbol, handler, pydm_widget=None, widget_type="static"):
+    """
+    register the class that parses MEDM widget ``symbol``
+
+    ``handler`` is called as ``handler(line, main, symbol)`` and returns
+    a widget with a ``parseAdlTree(buf, block)`` method, such as a
+    subclass of ``MedmGenericWidget``.
+
+    The PyDM widget class to write for ``symbol`` is described in
+    ``symbols.adl_widgets``.  To add (or replace) that description,
+    give the name of the ``pydm_widget`` class.
+    """
+    if pydm_widget is not None:
+        symbols.adl_widgets[symbol] = dict(type=widget_type, pydm_widget=pydm_widget)
+    if symbol not in symbols.adl_widgets:
+        raise ValueError(f"MEDM widget '{symbol}' needs a pydm_widget")
+    MedmBaseWidget.medm_widget_handlers[symbol] = handler
+
+
+MedmBaseWidget.medm_widget_handlers.update(
+    {
+        "arc": MedmArcWidget,
+        "bar": MedmBarWidget,
+        "byte": MedmByteWidget,
+        "cartesian plot": MedmCartesianPlotWidget,
+        "choice button": MedmChoiceButtonWidget,
+        "composite": MedmCompositeWidget,
+        "embedded display": MedmEmbeddedDisplayWidget,
+        "image": MedmImageWidget,
+        "indicator": MedmIndicatorWidget,
+        "menu": MedmMenuWidget,
+        "message button": MedmMessageButtonWidget,
+        "meter": MedmMeterWidget,
+        "oval": MedmOvalWidget,
+        "polygon": MedmPolygonWidget,
+        "polyline": MedmPolylineWidget,
+        "rectangle": MedmRectangleWidget,
+        "related display": MedmRelatedDisplayWidget,
+        "shell command": MedmShellCommandWidget,
+        "strip chart": MedmStripChartWidget,
+        "text": MedmTextWidget,
+        "text entry": MedmTextEntryWidget,
+        "text update": MedmTextUpdateWidget,
+        "valuator": MedmValuatorWidget,
+        "wheel switch": MedmWheelSwitchWidget,
+    }
+)
@@ -0,0 +1,58 @@
+"""
+Convert .adl content to .ui content in memory, without any file access.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+EXAMPLE::
+
+    from adl2pydm.api import convert_bytes
+
+    ui_text = convert_bytes(adl_data, name="motor.adl")
+"""
+
+import io
+
+from . import adl_parser
+from .session import ConversionSession
+
+
+DEFAULT_SCREEN_NAME = "screen.adl"
+
+
+def adl_lines(text):
+    """Split .adl content into lines, the same as ``getAdlLines()`` reads a file."""
+    return io.StringIO(text, newline=None).readlines()
+
+
+def parse_string(text, name=DEFAULT_SCREEN_NAME):
+    """
+    Parse .adl content (str), return the screen (``MedmMainWidget``).
+
+    ``name`` stands for the file name, it is the default window title.
+    """
+    screen = adl_parser.MedmMainWidget(name)
+    screen.parseAdlBuffer(adl_lines(text))
+    return screen
+
+
+def convert_string(text, name=DEFAULT_SCREEN_NAME, use_scatterplot=None):
+    """
+    Convert .adl content (str), return the .ui content (str).
+
+    ``name`` stands for the file name, it is the default window title.
+    The stylesheet file is not looked up.  To convert many screens, use
+    one ``session.ConversionSession(find_stylesheet=False)`` instead.
+    """
+    session = ConversionSession(use_scatterplot=use_scatterplot, find_stylesheet=False)
+    return session.convertScreen(parse_string(text, name))
+
+
+def convert_bytes(data, name=DEFAULT_SCREEN_NAME, use_scatterplot=None):
+    """
+    Convert .adl content (bytes), return the .ui content (str).
+
+    Like ``getAdlLines()``, the bytes are read as UTF-8, discarding
+    any that cannot be decoded.
+    """
+    text = data.decode("utf8", errors="ignore")
+    return convert_string(text, name=name, use_scatterplot=use_scatterplot)
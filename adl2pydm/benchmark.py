@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the conversion: the bundled MEDM screens and synthetic screens.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+Each corpus screen is timed (best of ``--repeat``) in these steps:
+
+* parse: scan and parse the lines of the .adl file (already read)
+* write: build and write the .ui file from the parsed screen
+* convert: the whole conversion, as ``cli.processFile()`` does it
+
+and its memory: the peak while converting, and the memory retained by
+the parsed screen (the widget model, kept while the .ui file is written).
+
+Synthetic screens (see ``synthetic``) are made larger, one parameter at
+a time (number of widgets, ``composite`` nesting depth, polyline points,
+trace/pen/display/command entries).  The
+slope of log(time) against log(size) shows how each scales: about 1 is
+linear, much more than 1 is a (super-linear) scaling regression.
+
+The MEDM calc expressions of ``tests/test_calcs.json`` are converted to
+PyDM rules ``CALC_ROUNDS`` times: each time compiled (uncached) and
+looked up (cached).
+
+With ``--history FILE``, each run is appended to a JSON list, and
+compared with the run before it.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import pathlib
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import __version__
+from . import adl_parser
+from . import calc2rules
+from . import cli
+from . import output_handler
+from . import synthetic
+
+
+CORPUS_DIR = pathlib.Path(__file__).parent / "tests" / "medm"
+CALC_CASES = pathlib.Path(__file__).parent / "tests" / "test_calcs.json"
+CALC_ROUNDS = 100  # conversions of each calc expression in one timing
+DEFAULT_REPEAT = 3
+MAX_SCALING_SLOPE = 1.3  # larger slope of log(time) v. log(size): super-linear
+DEFAULT_TOLERANCE = 0.25  # slower than the previous run by this fraction: regression
+MIN_REGRESSION_SECONDS = 0.002  # smaller differences are noise
+
+# parameter of the synthetic screens: (sizes, other parameters)
+SCALING_SERIES = {
+    "widgets": ((250, 500, 1000, 2000), {}),
+    "depth": ((16, 32, 64, 128), dict(widgets=24)),
+    "points": ((2000, 4000, 8000, 16000), dict(widgets=4, types=("polyline", "polygon"))),
+    "entries": (
+        (100, 200, 400, 800),
+        dict(widgets=4, types=("cartesian plot", "strip chart", "related display", "shell command")),
+    ),
+}
+
+
+def corpusFiles(path=CORPUS_DIR):
+    """Sorted list of the .adl files in directory ``path``."""
+    return sorted(str(p) for p in pathlib.Path(path).glob("*.adl"))
+
+
+def bestTime(run, setup=None, repeat=DEFAULT_REPEAT):
+    """
+    Shortest time (seconds) of ``repeat`` calls to ``run(setup())``.
+
+    ``setup()`` (not timed) prepares the argument of each call.
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        arg = None if setup is None else setup()
+        t0 = time.perf_counter()
+        run(arg)
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peakMemory(func, *args):
+    """Peak memory (bytes) allocated while calling ``func(*args)``."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retainedMemory(adl_filename):
+    """Memory (bytes) retained by the parsed screen of ``adl_filename``."""
+    tracemalloc.start()
+    try:
+        screen = parseScreen(adl_filename)
+        retained = tracemalloc.get_traced_memory()[0]
+        del screen  # kept until measured
+        return retained
+    finally:
+        tracemalloc.stop()
+
+
+def readScreen(adl_filename):
+    """the lines of ``adl_filename`` and an empty screen to parse them into"""
+    screen = adl_parser.MedmMainWidget(adl_filename)
+    return screen, screen.getAdlLines(adl_filename)
+
+
+def parseScreen(adl_filename):
+    screen, buf = readScreen(adl_filename)
+    screen.parseAdlBuffer(buf)
+    return screen
+
+
+def countWidgets(widgets):
+    """number of widgets, including those in composites"""
+    return sum(1 + countWidgets(getattr(w, "widgets", [])) for w in widgets)
+
+
+def benchmarkFile(adl_filename, repeat=DEFAULT_REPEAT, output_path=None):
+    """
+    Time the steps of converting ``adl_filename``, return a dict.
+
+    The .ui files are written to ``output_path`` (default: a temporary
+    directory).
+    """
+    temporary = output_path is None
+    output_path = output_path or tempfile.mkdtemp()
+    try:
+        screen = parseScreen(adl_filename)
+        result = dict(
+            lines=len(readScreen(adl_filename)[1]),
+            widgets=countWidgets(screen.widgets),
+            parse=bestTime(
+                lambda arg: arg[0].parseAdlBuffer(arg[1]),
+                lambda: readScreen(adl_filename),
+                repeat,
+            ),
+            write=bestTime(
+                lambda s: output_handler.Widget2Pydm().write_ui(s, output_path),
+                lambda: parseScreen(adl_filename),
+                repeat,
+            ),
+            convert=bestTime(lambda _: cli.processFile(adl_filename, output_path), repeat=repeat),
+            peak_bytes=peakMemory(cli.processFile, adl_filename, output_path),
+            retained_bytes=retainedMemory(adl_filename),
+        )
+    finally:
+        if temporary:
+            shutil.rmtree(output_path, ignore_errors=True)
+    return result
+
+
+def benchmarkCorpus(adlfiles=None, repeat=DEFAULT_REPEAT):
+    """Benchmark each file (default: ``corpusFiles()``), return {name: result}."""
+    results = {}
+    with tempfile.TemporaryDirectory() as output_path:
+        for adlfile in adlfiles or corpusFiles():
+            results[pathlib.Path(adlfile).name] = benchmarkFile(adlfile, repeat, output_path)
+    return results
+
+
+def loglogSlope(sizes, seconds):
+    """least-squares slope of log(seconds) against log(sizes)"""
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in seconds]
+    xm, ym = sum(xs) / len(xs), sum(ys) / len(ys)
+    sxx = sum((x - xm) ** 2 for x in xs)
+    return sum((x - xm) * (y - ym) for x, y in zip(xs, ys)) / sxx
+
+
+def benchmarkScaling(parameter, sizes, repeat=DEFAULT_REPEAT, **fixed):
+    """
+    Time synthetic screens as ``parameter`` takes each of ``sizes``.
+
+    Returns a dict with the times (parse, convert) and their log-log slopes.
+    """
+    parse, convert = [], []
+    with tempfile.TemporaryDirectory() as path:
+        adlfile = str(pathlib.Path(path) / "synthetic.adl")
+        for size in sizes:
+            synthetic.writeSyntheticScreen(adlfile, **dict(fixed, **{parameter: size}))
+            result = benchmarkFile(adlfile, repeat, path)
+            parse.append(result["parse"])
+            convert.append(result["convert"])
+    parse_slope = loglogSlope(sizes, parse)
+    return dict(
+        sizes=list(sizes),
+        parse=parse,
+        convert=convert,
+        parse_slope=parse_slope,
+        convert_slope=loglogSlope(sizes, convert),
+        superlinear=parse_slope > MAX_SCALING_SLOPE,
+    )
+
+
+def benchmarkCalcs(fname=CALC_CASES, repeat=DEFAULT_REPEAT, rounds=CALC_ROUNDS):
+    """
+    Time converting the calc expressions of JSON file ``fname``, return a dict.
+
+    ``compile``: without the cache, ``cached``: with it (seconds for
+    ``rounds`` conversions of all expressions).
+    """
+    expressions = [case[0] for case in json.loads(pathlib.Path(fname).read_text())]
+    convert = calc2rules.convertCalcToRuleExpression
+
+    def run(func):
+        for _ in range(rounds):
+            for expression in expressions:
+                func(expression)
+
+    return dict(
+        expressions=len(expressions),
+        rounds=rounds,
+        compile=bestTime(lambda _: run(convert.__wrapped__), repeat=repeat),
+        cached=bestTime(lambda _: run(convert), convert.cache_clear, repeat),
+    )
+
+
+def runBenchmarks(corpus=True, synthetic=True, repeat=DEFAULT_REPEAT, calcs=True):
+    """Run the benchmarks, return the results (dict, see ``--history``)."""
+    run = dict(
+        adl2pydm=__version__,
+        time=datetime.datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        repeat=repeat,
+    )
+    if corpus:
+        run["corpus"] = benchmarkCorpus(repeat=repeat)
+    if synthetic:
+        run["scaling"] = {
+            parameter: benchmarkScaling(parameter, sizes, repeat, **fixed)
+            for parameter, (sizes, fixed) in SCALING_SERIES.items()
+        }
+    if calcs:
+        run["calcs"] = benchmarkCalcs(repeat=repeat)
+    return run
+
+
+def readHistory(fname):
+    """List of the runs in history file ``fname`` (empty if no file)."""
+    path = pathlib.Path(fname)
+    if not path.exists():
+        return []
+    return json.loads(path.read_text())
+
+
+def appendHistory(fname, run):
+    history = readHistory(fname) + [run]
+    pathlib.Path(fname).write_text(json.dumps(history, indent=2) + "\n")
+    return history
+
+
+def compareRuns(previous, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Describe the regressions of run ``current`` since run ``previous``.
+
+    Returns a list of messages: steps slower by more than ``tolerance``
+    (a fraction, and by at least ``MIN_REGRESSION_SECONDS``), parsed
+    screens that retain more memory by more than ``tolerance``, and
+    parameters that now scale super-linearly.
+    """
+    messages = []
+    old_corpus = previous.get("corpus", {})
+    for name, result in sorted(current.get("corpus", {}).items()):
+        for step in ("parse", "write", "convert"):
+            old = old_corpus.get(name, {}).get(step)
+            if old and result[step] - old > max(old * tolerance, MIN_REGRESSION_SECONDS):
+                messages.append(f"{name} {step}: {old:.4f}s -> {result[step]:.4f}s")
+        old = old_corpus.get(name, {}).get("retained_bytes")
+        if old and result.get("retained_bytes", 0) > old * (1 + tolerance):
+            messages.append(f"{name} retained memory: {old} -> {result['retained_bytes']} bytes")
+    old_calcs = previous.get("calcs", {})
+    for step in ("compile", "cached"):
+        old, new = old_calcs.get(step), current.get("calcs", {}).get(step)
+        if old and new and new - old > max(old * tolerance, MIN_REGRESSION_SECONDS):
+            messages.append(f"calc {step}: {old:.4f}s -> {new:.4f}s")
+    old_scaling = previous.get("scaling", {})
+    for parameter, result in sorted(current.get("scaling", {}).items()):
+        old = old_scaling.get(parameter)
+        if result["superlinear"] and not (old or {}).get("superlinear"):
+            messages.append(f"parse scales super-linearly with {parameter}: slope {result['parse_slope']:.2f}")
+    return messages
+
+
+def report(run, out=sys.stdout):
+    """Print a summary of ``run``."""
+    corpus = run.get("corpus", {})
+    if len(corpus) > 0:
+        print(
+            f"{'screen':40s} {'widgets':>7s} {'parse':>9s} {'write':>9s} {'convert':>9s}"
+            f" {'peak KiB':>9s} {'B/widget':>9s}",
+            file=out,
+        )
+        for name, r in sorted(corpus.items()):
+            print(
+                f"{name:40s} {r['widgets']:7d} {r['parse']:9.4f} {r['write']:9.4f}"
+                f" {r['convert']:9.4f} {r['peak_bytes'] // 1024:9d}"
+                f" {r['retained_bytes'] // max(1, r['widgets']):9d}",
+                file=out,
+            )
+        total = sum(r["convert"] for r in corpus.values())
+        print(f"{len(corpus)} screens converted in {total:.3f}s", file=out)
+        widgets = sum(r["widgets"] for r in corpus.values())
+        retained = sum(r["retained_bytes"] for r in corpus.values())
+        print(
+            f"parsed screens retain {retained // 1024} KiB,"
+            f" {retained // max(1, widgets)} bytes per widget ({widgets} widgets)",
+            file=out,
+        )
+    for parameter, r in run.get("scaling", {}).items():
+        flag = "  SUPER-LINEAR" if r["superlinear"] else ""
+        print(
+            f"scaling with {parameter} {r['sizes']}:"
+            f" parse slope {r['parse_slope']:.2f}, convert slope {r['convert_slope']:.2f}{flag}",
+            file=out,
+        )
+    calcs = run.get("calcs")
+    if calcs is not None:
+        n = calcs["expressions"] * calcs["rounds"]
+        print(
+            f"{n} calc expressions: compiled in {calcs['compile']:.4f}s, cached in {calcs['cached']:.4f}s",
+            file=out,
+        )
+
+
+def get_user_parameters():
+    doc = __doc__.strip().splitlines()[0]
+    parser = argparse.ArgumentParser(prog="adl2pydm-benchmark", description=doc)
+
+    msg = "append the results to this JSON file, compare with the previous run"
+    parser.add_argument("--history", action="store", dest="history", help=msg, default=None)
+
+    msg = f"time each step this many times, keep the best, default: {DEFAULT_REPEAT}"
+    parser.add_argument("--repeat", action="store", dest="repeat", type=int, help=msg, default=DEFAULT_REPEAT)
+
+    msg = "skip the bundled MEDM screens (from a source checkout)"
+    parser.add_argument("--no-corpus", action="store_false", dest="corpus", help=msg, default=True)
+
+    msg = "skip the synthetic screens (scaling)"
+    parser.add_argument("--no-synthetic", action="store_false", dest="synthetic", help=msg, default=True)
+
+    msg = "skip the MEDM calc expressions (from a source checkout)"
+    parser.add_argument("--no-calcs", action="store_false", dest="calcs", help=msg, default=True)
+
+    msg = "with --history, a step slower by this fraction is a regression"
+    msg += f", default: {DEFAULT_TOLERANCE}"
+    parser.add_argument(
+        "--tolerance", action="store", dest="tolerance", type=float, help=msg, default=DEFAULT_TOLERANCE
+    )
+
+    msg = "exit with status 1 if there are regressions or super-linear scaling"
+    parser.add_argument("--strict", action="store_true", default=False, help=msg)
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_user_parameters()
+    if options.corpus and len(corpusFiles(CORPUS_DIR)) == 0:
+        # the bundled screens and calcs are test files, not installed with the package
+        sys.exit(f"no MEDM screens in {CORPUS_DIR}: run from a source checkout, or use --no-corpus")
+    if options.calcs and not CALC_CASES.exists():
+        sys.exit(f"no MEDM calc expressions in {CALC_CASES}: run from a source checkout, or use --no-calcs")
+    run = runBenchmarks(
+        corpus=options.corpus, synthetic=options.synthetic, repeat=options.repeat, calcs=options.calcs
+    )
+    report(run)
+
+    problems = [
+        f"parse scales super-linearly with {p}" for p, r in run.get("scaling", {}).items() if r["superlinear"]
+    ]
+    if options.history is not None:
+        history = appendHistory(options.history, run)
+        if len(history) > 1:
+            regressions = compareRuns(history[-2], run, options.tolerance)
+            for msg in regressions:
+                print(f"regression: {msg}")
+            problems += regressions
+    if options.strict and len(problems) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Persistent caches, kept on disk between runs.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+Each entry is one file, named by its key, in the cache directory.
+Entries are evicted, least-recently-used first, once the total size of
+the directory exceeds ``max_bytes``.
+
+Cached parse results are Python pickles.  Only point the cache to a
+directory that you alone can write.
+"""
+
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+
+from . import __version__
+from . import adl_parser
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# change when the parsed model (adl_parser classes) changes shape
+PARSE_CACHE_FORMAT = 1
+# change when the entries of the .ui store change shape
+UI_STORE_FORMAT = 1
+
+
+def content_key(data, *tags, **options):
+    """
+    Hash ``data`` (bytes) together with any tags and options.
+
+    Options are sorted by name, so their order does not change the key.
+    """
+    h = hashlib.sha256(data)
+    for tag in tags:
+        h.update(b"\0" + str(tag).encode())
+    for k, v in sorted(options.items()):
+        h.update(b"\0" + f"{k}={v!r}".encode())
+    return h.hexdigest()
+
+
+class DiskCache(object):
+    """
+    size-bounded directory of cached bytes, one file per key
+
+    PARAMETERS
+
+    path
+        *str* : cache directory, created if needed
+    max_bytes
+        *int* : evict entries when the directory grows past this size
+    suffix
+        *str* : file name extension of each entry
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_MAX_BYTES, suffix=".bin"):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # total size of the entries, scanned when first needed
+
+    def _entry(self, key):
+        return self.path / (key + self.suffix)
+
+    def _entries(self):
+        """(mtime, size, path) of each entry"""
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(self.suffix):
+                try:
+                    st = entry.stat()
+                except OSError:  # removed by another process
+                    continue
+                yield st.st_mtime, st.st_size, entry.path
+
+    def __contains__(self, key):
+        return self._entry(key).exists()
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    def get(self, key):
+        """Return the bytes cached for ``key`` or None."""
+        fname = self._entry(key)
+        try:
+            with open(fname, "rb") as fp:
+                data = fp.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(fname)  # recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Cache ``data`` (bytes) for ``key``, then evict if over the size limit."""
+        fname = self._entry(key)
+        # write to a temporary file first: readers never see partial entries
+        fd, tmpname = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(data)
+            if self._size is not None and fname.exists():
+                self._size -= fname.stat().st_size
+            os.replace(tmpname, fname)
+        except OSError as exc:
+            logger.warning("could not write cache entry %s: %s", fname, exc)
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            return
+        if self._size is None:
+            self._size = sum(size for _t, size, _p in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self, max_bytes=None):
+        """Remove least-recently-used entries until the cache fits ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _t, size, _p in entries)
+        for _mtime, size, fname in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(fname)
+                total -= size
+                logger.debug("evicted cache entry %s", fname)
+            except OSError:
+                pass
+        self._size = total
+
+    def clear(self):
+        """Remove all entries."""
+        self.evict(0)
+
+
+class ParseCache(DiskCache):
+    """
+    parsed .adl screens (``MedmMainWidget``), keyed by file content
+
+    The key combines the content of the .adl file, the adl2pydm version,
+    ``PARSE_CACHE_FORMAT``, and any parser ``options``.  Neither the file
+    name nor its time stamp are part of the key.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes=max_bytes, suffix=".pickle")
+
+    def key(self, data, **options):
+        return content_key(data, __version__, PARSE_CACHE_FORMAT, **options)
+
+    def parse(self, adl_filename, **options):
+        """
+        Return the parsed screen of ``adl_filename``, from the cache if possible.
+        """
+        adl_filename = str(adl_filename)
+        if not pathlib.Path(adl_filename).exists():
+            raise ValueError("Could not find file: " + adl_filename)
+        with open(adl_filename, "rb") as fp:
+            key = self.key(fp.read(), **options)
+
+        data = self.get(key)
+        if data is not None:
+            try:
+                screen = pickle.loads(data)
+            except Exception as exc:
+                logger.warning("ignoring unreadable cache entry for %s: %s", adl_filename, exc)
+            else:
+                # same content may have been cached from another file name
+                screen.given_filename = adl_filename
+                return screen
+
+        screen = adl_parser.MedmMainWidget(adl_filename)
+        buf = screen.getAdlLines(adl_filename)
+        screen.parseAdlBuffer(buf)
+        self.put(key, pickle.dumps(screen, pickle.HIGHEST_PROTOCOL))
+        return screen
+
+
+class UiStore(DiskCache):
+    """
+    converted .ui files, shared by identical .adl files (wherever they are)
+
+    The key combines the content of the .adl file, its file name stem
+    (the default window title), the adl2pydm version, ``UI_STORE_FORMAT``,
+    and the conversion ``options``.  Each entry has the name and the
+    content of the .ui file.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes=max_bytes, suffix=".ui")
+
+    def key(self, data, stem, **options):
+        return content_key(data, "ui", __version__, UI_STORE_FORMAT, stem=stem, **options)
+
+    def lookup(self, key):
+        """Return (.ui file name, content bytes) stored for ``key``, or None."""
+        data = self.get(key)
+        if data is None:
+            return None
+        ui_name, sep, content = data.partition(b"\n")
+        if len(sep) == 0:
+            logger.warning("ignoring unreadable store entry %s", key)
+            return None
+        return ui_name.decode("utf8"), content
+
+    def store(self, key, ui_name, content):
+        """Store .ui file name ``ui_name`` and ``content`` (bytes) for ``key``."""
+        self.put(key, ui_name.encode("utf8") + b"\n" + content)
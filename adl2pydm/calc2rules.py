@@ -5,15 +5,72 @@ convert MEDM calc expressions to PyDM rules
 
 see: https://epics.anl.gov/EpicsDocumentation/ExtensionsManuals/MEDM/MEDM.html#CalcExpression
 see: https://slaclab.github.io/pydm/widgets/widget_rules/index.html
+
+Screens use the same few calc expressions (such as ``A=0``, ``A#0``,
+``A&&B``) many times, each is converted once (``CALC_CACHE_SIZE``).
 """
 
-import io
+import functools
 import logging
-import tokenize
+import re
 
 logger = logging.getLogger(__file__)
 
+CALC_CACHE_SIZE = 1024  # number of converted calc expressions to remember
+CALC_VARIABLES = "ABCDEFGHIJKL"  # MEDM calc variables
+MAX_CALC_CHANNELS = 4  # variables A-D are the channels, ch[0] - ch[3]
+
+# MEDM calc syntax (EPICS CALC): decimal or hex numbers, names
+# (variables A-L, functions), operators.  ``!``, ``?`` and most other
+# characters are kept as they are, with the space before them (if any).
+# Operators out of place are errors, not passed on as another expression.
+_CALC_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<number>0[xX][0-9a-fA-F]+|(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<name>[^\W\d_]\w*)
+    |(?P<op>&&|\|\||\*\*|>=|<=|!=|==|:=|>>|<<|[-+*/%&|^~<>=(),:;\#])
+    |(?P<other>.)
+    """,
+    re.VERBOSE,
+)
+
+# MEDM operator: PyDM rule operator (others are the same)
+_CALC_OPERATORS = {
+    "#": "!=",
+    "=": "==",
+    "&&": " and ",
+    "&": " and ",
+    "||": " or ",
+    "|": " or ",
+}
+_PREFIX_OPERATORS = ("(", "-", "+", "~")  # may come first, or after another operator
+_UNEXPECTED = "[]{}_"  # not in MEDM calc (Python would take them)
+
+
+def tokenizeCalc(medm_calc):
+    """
+    Generate the tokens of a MEDM calc expression: (kind, text).
+
+    *kind* is one of: space, number, name, op, other (any other
+    character, such as ``!`` or ``?``).
+    """
+    for match in _CALC_TOKEN.finditer(medm_calc):
+        yield match.lastgroup, match.group()
+
 
+def _channel(variable, medm_calc):
+    """PyDM rule channel of MEDM calc variable (one letter)"""
+    idx = CALC_VARIABLES.find(variable.upper())
+    if idx < 0:
+        raise ValueError(f"unknown variable '{variable}' in MEDM calc '{medm_calc}'")
+    if idx >= MAX_CALC_CHANNELS:
+        # TODO: consider handling these less common cases
+        raise ValueError(f"unhandled complexity in MEDM calc '{medm_calc}'" f" uses special variable {variable}")
+    return f"ch[{idx}]"
+
+
+@functools.lru_cache(maxsize=CALC_CACHE_SIZE)
 def convertCalcToRuleExpression(medm_calc):
     """
     convert MEDM calc expression to PyDM rules
@@ -30,44 +87,45 @@ def convertCalcToRuleExpression(medm_calc):
     """
     logger.debug(f"MEDM: {medm_calc}")
 
-    medm_calc = medm_calc.replace("#", "!=")
-    medm_calc = medm_calc.replace("&&", "&")
-    medm_calc = medm_calc.replace("||", "|")
-
-    calc = ""
-    with io.StringIO(medm_calc) as f:
-        for tok in tokenize.generate_tokens(f.read):
-            logger.debug(tok)
-            if tok.type == tokenize.NAME:
-                if len(tok.string) == 1:
-                    idx = "ABCDEFGHIJKL".index(tok.string.upper())
-                    if idx > 3:
-                        # TODO: consider handling these less common cases
-                        raise ValueError(
-                            f"unhandled complexity in MEDM calc '{medm_calc}''"
-                            f" uses special variable {tok.string}"
-                        )
-                    calc += f"ch[{idx}]"
-                else:
-                    # probably a math expression
-                    # TODO: need a mapping?
-                    # we have these imports available:
-                    #     from math import *
-                    #     import numpy as np
-                    calc += tok.string.lower()  # simply
-            elif tok.type == tokenize.ERRORTOKEN:
-                op = tok.string
-                if op == "!":
-                    op = " not "
-                calc += op
-            elif tok.type == tokenize.OP:
-                calc += {
-                    "=": "==",
-                    "|": " or ",
-                    "&": " and ",
-                }.get(tok.string, tok.string)
-            elif tok.type not in (tokenize.NEWLINE, tokenize.ENDMARKER):
-                calc += tok.string
-
-    pydm_rule = " ".join(calc.strip().split())  # remove interior extra spaces
+    parts = []
+    depth = 0  # of parentheses
+    spaced = False
+    operand = False  # does the last token end an operand?
+    for kind, text in tokenizeCalc(medm_calc):
+        if kind == "space":
+            spaced = True
+            continue
+        if kind == "op" and not operand and text not in _PREFIX_OPERATORS:
+            # such as "A+=0" or "A|=1": not MEDM calc, would become another expression
+            raise ValueError(f"operator '{text}' needs an operand before it in MEDM calc '{medm_calc}'")
+        operand = kind in ("name", "number") or text == ")"
+        if kind == "name":
+            if len(text) == 1:
+                parts.append(_channel(text, medm_calc))
+            else:
+                # probably a math expression
+                # TODO: need a mapping?
+                # we have these imports available:
+                #     from math import *
+                #     import numpy as np
+                parts.append(text.lower())  # simply
+        elif kind == "op":
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+            parts.append(_CALC_OPERATORS.get(text, text))
+        elif kind == "other":
+            if text in _UNEXPECTED:
+                raise ValueError(f"unexpected '{text}' in MEDM calc '{medm_calc}'")
+            if spaced:
+                parts.append(" ")  # not part of an operator: keep the space
+            parts.append(" not " if text == "!" else text)
+        else:
+            parts.append(text)
+        spaced = False
+    if depth != 0:
+        raise ValueError(f"unbalanced parentheses in MEDM calc '{medm_calc}'")
+
+    pydm_rule = " ".join("".join(parts).split())  # remove interior extra spaces
     return pydm_rule
@@ -7,26 +7,448 @@ Only rely on packages in this project or from the standard Python distribution.
 """
 
 import argparse
-
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import fnmatch
+import itertools
 import logging
+import os
 import pathlib
 
-from . import adl_parser
+from . import cache as adl_cache
+from . import dedup as adl_dedup
+from . import dependencies
+from . import manifest
 from . import output_handler
+from . import stats as adl_stats
+from . import watch
+from .session import READERS
+from .session import ConversionSession
 
 
 logger = None
 
 
-def processFile(adl_filename, output_path=None):
-    output_path = output_path or str(pathlib.Path(adl_filename).parent)
+def processFile(adl_filename, output_path=None, cache=None, stats=None, store=None, session=None):
+    """
+    Convert one .adl file, write the .ui file into ``output_path`` (created if needed).
+
+    If ``store`` (a ``cache.UiStore``) is given, copy the .ui file from
+    there if an identical .adl file was converted before.  If ``cache``
+    (a ``cache.ParseCache``) is given, look for the parsed screen there
+    before parsing.  If ``stats`` (a ``stats.ConversionStats``) is given,
+    time the phases of the conversion there.  With ``session`` (a
+    ``session.ConversionSession``, made once for a batch), use its
+    options, cache and store instead.
+    Returns the name of the .ui file.
+    """
+    if session is None:
+        session = ConversionSession(cache=cache, store=store)
+    return session.convertFile(adl_filename, output_path, stats=stats)
+
+
+class _RecordCollector(logging.Handler):
+    """keep the log records of a worker process, the main process reports them"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # records go back to the main process: make them picklable
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        self.records.append(record)
+
+
+_worker = {}  # state of a worker process: log collector and conversion session
+
+
+def _initWorker(level, session):
+    collector = _RecordCollector()
+    logging.root.handlers = [collector]
+    logging.root.setLevel(level)
+    _worker["collector"] = collector
+    _worker["session"] = session  # unpickled: with its own cache and store
+
+
+def _processFileInWorker(adl_filename, output_path, timed=False):
+    """
+    convert in a worker process
+
+    Returns (.ui file, error message, log records, timings or None).
+    """
+    collector = _worker["collector"]
+    collector.records = []
+    ui_filename, error = None, None
+    stats = adl_stats.ConversionStats(adl_filename) if timed else None
+    try:
+        ui_filename = _worker["session"].convertFile(adl_filename, output_path, stats=stats)
+    except Exception as exc:
+        error = str(exc)
+        if stats is not None:
+            stats.error = error
+    return ui_filename, error, collector.records, None if stats is None else stats.asdict()
+
+
+def _fileSize(fname):
+    try:
+        return os.path.getsize(fname)
+    except OSError:
+        return 0
+
+
+def processFiles(
+    adlfiles,
+    output_path=None,
+    jobs=1,
+    cache=None,
+    input_root=None,
+    stats=None,
+    store=None,
+    dedup=False,
+    session=None,
+):
+    """
+    Convert several .adl files, in ``jobs`` processes.
+
+    ``adlfiles`` is a list or any iterable, such as ``findAdlFiles()``.
+    Files of a list are started largest first, other iterables are
+    converted as they are produced.  Errors and log messages are
+    reported in the order of ``adlfiles``.  Returns the list of .ui
+    files written, in the same order (None where there was an error).
+
+    With ``input_root``, the output directories mirror the tree below it,
+    see ``outputPathFor()``.  With ``stats`` (a ``stats.RunStats``), the
+    conversion of each file is timed and added there.  With ``store``
+    (a ``cache.UiStore``), identical .adl files are converted once.
+    With ``dedup``, duplicate files of ``adlfiles`` (see ``dedup``) are
+    converted once, their other .ui files are linked to that one.
+    All files are converted with one ``session`` (a
+    ``session.ConversionSession``, default: made from ``cache`` and
+    ``store``); worker processes each make a copy of it.
+    """
+    log = logging.getLogger(__name__)
+    if session is None:
+        session = ConversionSession(cache=cache, store=store)
+    if dedup:
+        kwargs = dict(jobs=jobs, input_root=input_root, stats=stats, session=session)
+        return _processDuplicates(adlfiles, output_path, **kwargs)
+
+    results = []
+    if jobs <= 1:
+        for adlfile in adlfiles:
+            path = outputPathFor(adlfile, output_path, input_root)
+            file_stats = None if stats is None else adl_stats.ConversionStats(adlfile)
+            try:
+                results.append(session.convertFile(adlfile, path, stats=file_stats))
+            except Exception as exc:
+                log.error(f"error processing {adlfile}:" f" {exc}")
+                results.append(None)
+                if file_stats is not None:
+                    file_stats.error = str(exc)
+            if stats is not None:
+                stats.add(file_stats)
+        return results
+
+    def report(adlfile, future):
+        try:
+            ui_filename, error, records, file_stats = future.result()
+        except Exception as exc:  # such as a worker process that died
+            ui_filename, error, records, file_stats = None, str(exc), [], None
+        for record in records:
+            logging.getLogger(record.name).handle(record)
+        if error is not None:
+            log.error(f"error processing {adlfile}:" f" {error}")
+        results.append(ui_filename)
+        if stats is not None:
+            if file_stats is None:
+                file_stats = adl_stats.ConversionStats(adlfile)
+                file_stats.error = error
+            stats.add(file_stats)
+
+    initargs = (logging.getLogger().getEffectiveLevel(), session)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_initWorker, initargs=initargs) as pool:
+
+        def submit(adlfile):
+            path = outputPathFor(adlfile, output_path, input_root)
+            return pool.submit(_processFileInWorker, adlfile, path, stats is not None)
+
+        if hasattr(adlfiles, "__len__"):
+            futures = {}
+            for adlfile in sorted(adlfiles, key=_fileSize, reverse=True):
+                if adlfile not in futures:
+                    futures[adlfile] = submit(adlfile)
+            for adlfile in adlfiles:
+                report(adlfile, futures[adlfile])
+        else:
+            pending = collections.deque()
+            for adlfile in adlfiles:
+                pending.append((adlfile, submit(adlfile)))
+                while pending and pending[0][1].done():
+                    report(*pending.popleft())
+            while pending:
+                report(*pending.popleft())
+    return results
+
+
+def _processDuplicates(adlfiles, output_path=None, input_root=None, stats=None, session=None, **kwargs):
+    """``processFiles()`` with ``dedup``: convert one of each group of duplicates"""
+    log = logging.getLogger(__name__)
+    adlfiles = list(adlfiles)
+    groups = adl_dedup.groupDuplicates(adlfiles, **session.options)
+    kwargs.update(input_root=input_root, stats=stats, session=session)
+    converted = processFiles(list(groups), output_path, **kwargs)
+
+    ui_files = {}
+    methods = collections.Counter()
+    for (representative, duplicates), ui_filename in zip(groups.items(), converted):
+        ui_files[representative] = ui_filename
+        for adlfile in duplicates:
+            ui_files[adlfile] = None
+            if ui_filename is None:
+                log.error(f"error processing {adlfile}:" f" not converted, same as {representative}")
+                continue
+            path = pathlib.Path(outputPathFor(adlfile, output_path, input_root))
+            try:
+                path.mkdir(parents=True, exist_ok=True)
+                target = str(path / pathlib.Path(ui_filename).name)
+                method = adl_dedup.linkFile(ui_filename, target)
+            except OSError as exc:
+                log.error(f"error processing {adlfile}:" f" {exc}")
+                continue
+            log.debug("%s: same as %s (%s)", adlfile, representative, method or "same .ui file")
+            methods[method or "same file"] += 1
+            ui_files[adlfile] = target
+
+    duplicates = sum(methods.values())
+    summary = dict(files=len(adlfiles), converted=len(groups), duplicates=duplicates, **methods)
+    if duplicates > 0:
+        details = ", ".join(f"{n} {method}" for method, n in sorted(methods.items()))
+        log.info(f"{duplicates} of {len(adlfiles)} .adl files were duplicates, not converted ({details})")
+    if stats is not None:
+        stats.deduplicated = summary
+    return [ui_files[adlfile] for adlfile in adlfiles]
+
+
+def processFilesIncremental(
+    adlfiles,
+    output_path=None,
+    jobs=1,
+    cache=None,
+    input_root=None,
+    stats=None,
+    store=None,
+    dedup=False,
+    session=None,
+):
+    """
+    Like ``processFiles()`` but skip .adl files converted before and unchanged.
+
+    A manifest in each output directory remembers the converted files.
+    Outputs of .adl files that no longer exist are removed.  With
+    ``input_root``, so are those in any other directory of the output
+    tree (``output_path``, or else ``input_root``), and output
+    directories left empty.
+    Returns the list of .adl files converted.
+    """
+    log = logging.getLogger(__name__)
+    if session is None:
+        session = ConversionSession(cache=cache, store=store)
+    options = session.options
+    manifests = {}  # absolute output directory: Manifest
+    todo = []
+
+    def manifestFor(path):
+        # one Manifest per directory, however it is named ("out", "./out", "out/")
+        key = os.path.abspath(path)
+        if key not in manifests:
+            manifests[key] = manifest.Manifest(path, options)
+        return manifests[key]
+
+    def outOfDate():
+        for adlfile in adlfiles:
+            if manifestFor(outputPathFor(adlfile, output_path, input_root)).isCurrent(adlfile):
+                log.debug("up to date: %s", adlfile)
+            else:
+                todo.append(adlfile)
+                yield adlfile
+
+    kwargs = dict(jobs=jobs, input_root=input_root, stats=stats, dedup=dedup, session=session)
+    if hasattr(adlfiles, "__len__"):
+        list(outOfDate())  # a list: sort the work by size
+        results = processFiles(todo, output_path, **kwargs)
+    else:
+        results = processFiles(outOfDate(), output_path, **kwargs)
+    for adlfile, ui_filename in zip(todo, results):
+        if ui_filename is not None:
+            manifestFor(outputPathFor(adlfile, output_path, input_root)).record(adlfile, ui_filename)
+
+    if input_root is not None:
+        # also directories with no .adl files this time, such as a deleted subdirectory
+        for path in manifest.findManifests(output_path or input_root):
+            manifestFor(path)
+    elif output_path is not None:
+        manifestFor(output_path)
+
+    for path, m in manifests.items():
+        m.removeStale()
+        m.save()
+        if output_path is not None and input_root is not None:
+            _removeEmptyDirectories(path, output_path)
+    return todo
+
+
+def _removeEmptyDirectories(path, top):
+    """Remove directory ``path`` and its parents below ``top`` while they are empty."""
+    path, top = pathlib.Path(path).absolute(), pathlib.Path(top).absolute()
+    while path != top and top in path.parents:
+        try:
+            path.rmdir()
+        except OSError:  # not empty (or gone)
+            return
+        path = path.parent
+
+
+def processDisplayTree(entries, output_path=None, cache=None, search_path=None, stats=None, session=None):
+    """
+    Convert the ``entries`` screens and all screens they refer to, each once.
+
+    Referenced screens are found with ``dependencies.DisplayCrawler``.
+    With ``output_path``, the output tree mirrors each screen's path
+    below its root (the directory of an entry or of the search path).
+    Otherwise, the .ui files are written next to the .adl files, but
+    not into the search path: those screens are reported and skipped.
+    A screen that would write the same .ui file as another is reported
+    and skipped.
+
+    Returns the crawler (its ``graph``, ``cycles`` and ``missing`` describe
+    what was found).  With ``stats`` (a ``stats.RunStats``), the writing
+    of each screen is timed (the crawler parses them).  The screens are
+    parsed (once) and written with ``session`` (default: a new
+    ``session.ConversionSession``), its reader, parse cache and .ui store.
+    """
+    log = logging.getLogger(__name__)
+    if session is None:
+        session = ConversionSession(cache=cache)
+    crawler = dependencies.DisplayCrawler(search_path=search_path, session=session)
+    written = {}  # .ui file: .adl file
+    for adlfile, screen in crawler.crawl(entries):
+        if output_path is None:
+            if crawler.inSearchPath(adlfile):
+                log.warning(f"not converted: {adlfile} is in the search path, use --dir for its output")
+                continue
+            path = str(pathlib.Path(adlfile).parent)
+        else:
+            relative = crawler.relativeDirectory(adlfile)
+            path = output_path if relative is None else os.path.normpath(os.path.join(output_path, relative))
+        ui_filename = os.path.abspath(output_handler.screen_ui_filename(screen, path))
+        if ui_filename in written:
+            log.error(f"error processing {adlfile}: same .ui file as {written[ui_filename]}: {ui_filename}")
+            continue
+        written[ui_filename] = adlfile
+
+        file_stats = None if stats is None else adl_stats.ConversionStats(adlfile)
+        try:
+            session.convertFile(adlfile, path, stats=file_stats, screen=screen)
+        except Exception as exc:
+            log.error(f"error processing {adlfile}:" f" {exc}")
+            if file_stats is not None:
+                file_stats.error = str(exc)
+        if stats is not None:
+            stats.add(file_stats)
+    return crawler
+
+
+def watchDirectory(
+    top, output_path=None, cache=None, include=("*.adl",), exclude=(), store=None, session=None, **kwargs
+):
+    """
+    Convert .adl files below ``top`` whenever they change (until interrupted).
 
-    screen = adl_parser.MedmMainWidget(adl_filename)
-    buf = screen.getAdlLines(adl_filename)
-    screen.parseAdlBuffer(buf)
+    With ``output_path``, the output tree mirrors the tree below ``top``.
+    All changes are converted with one ``session`` (default: made from
+    ``cache`` and ``store``), as ``processFilesIncremental()`` does: the
+    manifests tell which content was converted, so a file saved (or
+    touched) without changes is not converted again, and the outputs of
+    removed files are removed.  Display path lookups are kept between
+    changes, unless files were added or removed.
+    Other keyword arguments are passed to ``watch.AdlWatcher.watch()``.
+    """
+    log = logging.getLogger(__name__)
+    if session is None:
+        session = ConversionSession(cache=cache, store=store)
 
-    writer = output_handler.Widget2Pydm()
-    writer.write_ui(screen, output_path)
+    def convert(changed, removed):
+        for adlfile in removed:
+            log.info("removed: %s", adlfile)
+        if len(changed) > 0:
+            log.info("converting: %s", " ".join(changed))
+        added = [adlfile for adlfile in changed if adlfile not in watched]
+        if len(added) > 0 or len(removed) > 0:
+            session.resolver.invalidate()  # directory listings have changed
+        watched.update(added)
+        watched.difference_update(removed)
+        # also when only files were removed: removes their outputs
+        processFilesIncremental(changed, output_path, input_root=top, session=session)
+
+    def converted(adlfile):
+        # content converted before, per the manifest (read when first needed)
+        path = outputPathFor(adlfile, output_path, top)
+        return manifest.Manifest(path, session.options).convertedHash(adlfile)
+
+    watcher = watch.AdlWatcher(lambda: findAdlFiles(top, include=include, exclude=exclude), converted=converted)
+    watched = set(watcher.known)
+    log.info("watching %s", top)
+    try:
+        watcher.watch(convert, **kwargs)
+    except KeyboardInterrupt:
+        pass
+
+
+def outputPathFor(adl_filename, output_path=None, input_root=None):
+    """
+    Output directory for ``adl_filename``.
+
+    Default is the directory of ``adl_filename``.  If ``output_path`` and
+    ``input_root`` are given, the output tree mirrors the tree below
+    ``input_root``.
+    """
+    parent = pathlib.Path(adl_filename).parent
+    if output_path is None:
+        return str(parent)
+    if input_root is not None:
+        try:
+            return str(pathlib.Path(output_path) / parent.relative_to(input_root))
+        except ValueError:
+            pass  # not below input_root
+    return output_path
+
+
+def findAdlFiles(top, include=("*.adl",), exclude=()):
+    """
+    Generate the names of the .adl files in the directory tree ``top``.
+
+    Files are walked lazily, in sorted order.  ``include`` and ``exclude``
+    are glob patterns, matched against the file (or directory) name and
+    its path relative to ``top``.  Excluded directories are not entered.
+    """
+
+    def matches(relpath, patterns):
+        name = relpath.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relpath, p) for p in patterns)
+
+    for dirpath, dirnames, filenames in os.walk(top):
+        reldir = pathlib.Path(dirpath).relative_to(top).as_posix()
+        prefix = "" if reldir == "." else reldir + "/"
+        dirnames[:] = sorted(d for d in dirnames if not matches(prefix + d, exclude))
+        for fname in sorted(filenames):
+            relpath = prefix + fname
+            if matches(relpath, include) and not matches(relpath, exclude):
+                yield os.path.join(dirpath, fname)
 
 
 def get_user_parameters():
@@ -41,14 +463,100 @@ def get_user_parameters():
     parser.add_argument(
         "adlfiles",
         action="store",
-        nargs=argparse.ONE_OR_MORE,
+        nargs=argparse.ZERO_OR_MORE,
         help=msg,
     )
 
+    msg = "also convert the files in this directory tree"
+    msg += " (with --dir, the output tree mirrors it)"
+    parser.add_argument("-r", "--recursive", action="store", dest="recursive", help=msg, default=None)
+
+    msg = "with --recursive, convert files matching this glob pattern"
+    msg += " (name or relative path, may be repeated), default: *.adl"
+    parser.add_argument("--include", action="append", dest="include", help=msg, default=None)
+
+    msg = "with --recursive, skip files and directories matching this glob pattern"
+    msg += " (name or relative path, may be repeated)"
+    parser.add_argument("--exclude", action="append", dest="exclude", help=msg, default=[])
+
     msg = "output directory"
     msg += ", default: same directory as input file"
     parser.add_argument("-d", "--dir", action="store", dest="dir", help=msg, default=None)
 
+    msg = "directory of cached parsed screens (re-used when the .adl file is unchanged)"
+    msg += ", default: no cache"
+    parser.add_argument("--cache", action="store", dest="cache", help=msg, default=None)
+
+    msg = "maximum size of the cache directory, in MB"
+    msg += f", default: {adl_cache.DEFAULT_CACHE_MAX_BYTES // (1024 * 1024)}"
+    parser.add_argument(
+        "--cache-size",
+        action="store",
+        dest="cache_size",
+        type=int,
+        help=msg,
+        default=adl_cache.DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+    )
+
+    msg = "how to read .adl files: 'lines' (read, then parse), 'stream' (parse while reading,"
+    msg += " keep only the lines of one widget), 'mmap' (memory-mapped, decode lines as used)"
+    msg += ", default: lines"
+    parser.add_argument("--reader", action="store", dest="reader", choices=READERS, help=msg, default="lines")
+
+    msg = "convert duplicate .adl files (same name, same content but for whitespace) once,"
+    msg += " hard link (else reflink, else copy) the other .ui files"
+    parser.add_argument("--dedup", action="store_true", default=False, help=msg)
+
+    msg = "directory of converted .ui files, shared by identical .adl files"
+    msg += " (converted once, then copied), default: no store"
+    parser.add_argument("--store", action="store", dest="store", help=msg, default=None)
+
+    msg = "maximum size of the store directory, in MB"
+    msg += f", default: {adl_cache.DEFAULT_CACHE_MAX_BYTES // (1024 * 1024)}"
+    parser.add_argument(
+        "--store-size",
+        action="store",
+        dest="store_size",
+        type=int,
+        help=msg,
+        default=adl_cache.DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+    )
+
+    msg = "also convert the screens referenced (related display, composite file)"
+    msg += " by the adlfiles, and the screens they reference, each once"
+    msg += " (with --dir, the output tree mirrors the directories of the adlfiles and of the search path;"
+    msg += " without --dir, screens found in the search path are not converted)"
+    parser.add_argument("--follow", action="store_true", default=False, help=msg)
+
+    msg = "with --follow, directories to find referenced screens"
+    msg += f" (separated by '{os.pathsep}')"
+    msg += f", default: ${dependencies.ENV_EPICS_DISPLAY_PATH}"
+    parser.add_argument("--search-path", action="store", dest="search_path", help=msg, default=None)
+
+    msg = "watch this directory tree, convert .adl files as they change"
+    msg += " (with --dir, the output tree mirrors it; --include and --exclude apply)"
+    parser.add_argument("-w", "--watch", action="store", dest="watch", help=msg, default=None)
+
+    msg = "run a conversion server on a Unix domain socket (see adl2pydm-client)"
+    parser.add_argument("--serve", action="store_true", default=False, help=msg)
+
+    msg = "with --serve, the socket file"
+    msg += ", default: $XDG_RUNTIME_DIR/adl2pydm.sock or in a per-user directory in the temp directory"
+    parser.add_argument("--socket", action="store", dest="socket", help=msg, default=None)
+
+    msg = "only convert .adl files changed since the last --incremental run"
+    msg += f" (remembered in {manifest.MANIFEST_FILE} in the output directory)"
+    msg += ", remove outputs of deleted .adl files"
+    parser.add_argument("--incremental", action="store_true", default=False, help=msg)
+
+    msg = "number of files to convert in parallel processes"
+    msg += ", 0: one per CPU, default: 1"
+    parser.add_argument("-j", "--jobs", action="store", dest="jobs", type=int, help=msg, default=1)
+
+    msg = "write the time spent in each phase of each conversion"
+    msg += " (and totals) to this JSON file"
+    parser.add_argument("--stats", action="store", dest="stats", help=msg, default=None)
+
     parser.add_argument("-v", "--version", action="version", version=adl2pydm.__version__)
 
     parser.add_argument(
@@ -68,7 +576,13 @@ def get_user_parameters():
         ),
     )
 
-    return parser.parse_args()
+    options = parser.parse_args()
+    if options.serve and options.watch is not None:
+        parser.error("--serve and --watch both run until interrupted, use one of them")
+    if len(options.adlfiles) == 0 and options.recursive is None and options.watch is None:
+        if not options.serve:
+            parser.error("no .adl files given (neither adlfiles nor --recursive nor --watch)")
+    return options
 
 
 def configure_logging(options):
@@ -97,13 +611,61 @@ def main():
     options = get_user_parameters()
     configure_logging(options)
 
-    if options.use_scatterplot:
-        from .symbols import adl_widgets
+    cache = None
+    if options.cache:
+        cache = adl_cache.ParseCache(options.cache, options.cache_size * 1024 * 1024)
 
-        adl_widgets["cartesian plot"]["pydm_widget"] = "PyDMScatterPlot"
+    store = None
+    if options.store:
+        store = adl_cache.UiStore(options.store, options.store_size * 1024 * 1024)
 
-    for adlfile in options.adlfiles:
-        try:
-            processFile(adlfile, options.dir)
-        except Exception as exc:
-            logger.error(f"error processing {adlfile}:" f" {exc}")
+    session = ConversionSession(
+        use_scatterplot=options.use_scatterplot or None, cache=cache, store=store, reader=options.reader
+    )
+
+    stats = None
+    if options.stats is not None:
+        stats = adl_stats.RunStats()
+
+    jobs = options.jobs if options.jobs > 0 else os.cpu_count() or 1
+    adlfiles = options.adlfiles
+    if options.recursive is not None:
+        found = findAdlFiles(
+            options.recursive,
+            include=options.include or ["*.adl"],
+            exclude=options.exclude,
+        )
+        adlfiles = itertools.chain(adlfiles, found)  # lazy: convert while walking
+
+    if options.follow:
+        search_path = None
+        if options.search_path is not None:
+            search_path = [p for p in options.search_path.split(os.pathsep) if len(p) > 0]
+        processDisplayTree(adlfiles, options.dir, search_path=search_path, stats=stats, session=session)
+    else:
+        process = processFilesIncremental if options.incremental else processFiles
+        process(
+            adlfiles,
+            options.dir,
+            jobs=jobs,
+            input_root=options.recursive,
+            stats=stats,
+            dedup=options.dedup,
+            session=session,
+        )
+    if stats is not None:
+        stats.dump(options.stats)
+
+    if options.serve:
+        from .server import serve
+
+        serve(options.socket, jobs=jobs, session=session)
+
+    if options.watch is not None:
+        watchDirectory(
+            options.watch,
+            options.dir,
+            include=options.include or ["*.adl"],
+            exclude=options.exclude,
+            session=session,
+        )
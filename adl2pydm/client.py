@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""
+Ask a running adl2pydm server (``adl2pydm --serve``) to convert .adl files.
+
+Only rely on the standard Python distribution.  This module does not
+import the converter, so it starts quickly.
+
+The protocol is one JSON object per line, in both directions.  Requests:
+
+* ``{"adlfile": path, "dir": output directory}``: write the .ui file,
+  respond with its name in ``"ui_file"``
+* ``{"text": .adl content, "name": file name}``: respond with the .ui
+  content in ``"ui"``
+* ``{"command": "ping"}`` or ``{"command": "shutdown"}``
+
+Any request may have ``"options"``, such as ``{"use_scatterplot": true}``.
+Each response has ``"ok"``, and ``"error"`` if not ok, and the
+``"messages"`` logged during the conversion.
+"""
+
+import argparse
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+
+SOCKET_NAME = "adl2pydm.sock"
+
+
+def _userDirectory():
+    """per-user directory (mode 0700) for the socket in the temp directory"""
+    return os.path.join(tempfile.gettempdir(), f"adl2pydm-{os.getuid()}")
+
+
+def defaultSocketPath():
+    """``$XDG_RUNTIME_DIR/adl2pydm.sock``, or in a per-user directory in the temp directory"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join(_userDirectory(), SOCKET_NAME)
+
+
+def checkSocketPath(socket_path=None, create=False):
+    """
+    Return ``socket_path`` (default: ``defaultSocketPath()``), checked.
+
+    The per-user directory in the temp directory (made with ``create``)
+    must belong to this user and be closed to all others (mode 0700), or
+    else raise PermissionError: anyone can make such a name in a shared
+    temp directory.
+    """
+    socket_path = socket_path or defaultSocketPath()
+    directory = os.path.dirname(socket_path)
+    if directory != _userDirectory():
+        return socket_path
+    if create:
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{directory} must be a directory of this user, with mode 0700")
+    return socket_path
+
+
+def sendRequests(requests, socket_path=None):
+    """Send each request (a dict) on one connection, generate the responses."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(checkSocketPath(socket_path))
+        with sock.makefile("rw", encoding="utf8") as stream:
+            for request in requests:
+                stream.write(json.dumps(request) + "\n")
+                stream.flush()
+                line = stream.readline()
+                if len(line) == 0:
+                    raise ConnectionError("server closed the connection")
+                yield json.loads(line)
+
+
+def get_user_parameters():
+    doc = __doc__.strip().splitlines()[0]
+    parser = argparse.ArgumentParser(prog="adl2pydm-client", description=doc)
+
+    msg = "MEDM '.adl' file(s) to convert, '-': read from stdin, write .ui to stdout"
+    parser.add_argument("adlfiles", action="store", nargs=argparse.ONE_OR_MORE, help=msg)
+
+    msg = "output directory"
+    msg += ", default: same directory as input file"
+    parser.add_argument("-d", "--dir", action="store", dest="dir", help=msg, default=None)
+
+    msg = f"server socket, default: {defaultSocketPath()}"
+    parser.add_argument("--socket", action="store", dest="socket", help=msg, default=None)
+
+    msg = "Translate MEDM 'cartesian plot' widget as `PyDMScatterPlot`"
+    parser.add_argument("--use-scatterplot", action="store_true", default=False, help=msg)
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_user_parameters()
+    request_options = {}
+    if options.use_scatterplot:
+        request_options["use_scatterplot"] = True
+
+    def requests():
+        for adlfile in options.adlfiles:
+            if adlfile == "-":
+                request = dict(text=sys.stdin.read(), name="stdin.adl")
+            else:
+                request = dict(adlfile=os.path.abspath(adlfile))
+                if options.dir is not None:
+                    request["dir"] = os.path.abspath(options.dir)
+            request["options"] = request_options
+            yield request
+
+    errors = 0
+    responses = sendRequests(requests(), options.socket)
+    for adlfile, response in zip(options.adlfiles, responses):
+        for message in response.get("messages", []):
+            print(message, file=sys.stderr)
+        if not response["ok"]:
+            print(f"error processing {adlfile}: {response['error']}", file=sys.stderr)
+            errors += 1
+        elif "ui" in response:
+            sys.stdout.write(response["ui"])
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
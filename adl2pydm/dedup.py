@@ -0,0 +1,96 @@
+"""
+Find duplicate .adl files in a batch, convert each screen once.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+Two .adl files are duplicates when they have the same file name stem
+(the default window title) and the same content, ignoring blank lines
+and whitespace at the start and end of lines (neither changes the .ui
+file).  The .ui file of one representative is converted, the others are
+made from it with ``linkFile()``.
+"""
+
+import collections
+import logging
+import os
+import pathlib
+import shutil
+
+from .cache import content_key
+
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409  # Linux ioctl: share the data blocks of another file (reflink)
+LINK_METHODS = ("hardlink", "reflink", "copy")
+
+
+def normalizedContent(data):
+    """.adl content (bytes) without blank lines, each line stripped"""
+    return b"\n".join(line.strip() for line in data.splitlines() if len(line.strip()) > 0)
+
+
+def duplicateKey(adl_filename, **options):
+    """Key shared by ``adl_filename`` and its duplicates (with the same ``options``)."""
+    path = pathlib.Path(adl_filename)
+    return content_key(normalizedContent(path.read_bytes()), stem=path.stem, **options)
+
+
+def groupDuplicates(adlfiles, **options):
+    """
+    Group duplicate .adl files.
+
+    Returns an ordered dict: {representative: [its duplicates]}.  The
+    first file of each group (in the order of ``adlfiles``) represents it.
+    Files that cannot be read represent themselves (their conversion
+    reports the error).
+    """
+    groups = collections.OrderedDict()
+    representatives = {}  # key: representative
+    for adlfile in adlfiles:
+        try:
+            key = duplicateKey(adlfile, **options)
+        except OSError:
+            key = None
+        if key is None or key not in representatives:
+            if key is not None:
+                representatives[key] = adlfile
+            groups.setdefault(adlfile, [])
+        else:
+            groups[representatives[key]].append(adlfile)
+    return groups
+
+
+def _reflink(source, target):
+    import fcntl  # not on all platforms
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def linkFile(source, target):
+    """
+    Make file ``target`` the same as ``source``: hard link, else reflink, else copy.
+
+    An existing ``target`` is replaced.  Returns the method used
+    (one of ``LINK_METHODS``), or None if ``target`` is ``source``.
+    """
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return None
+    tmpname = f"{target}.{os.getpid()}.tmp"
+    try:
+        try:
+            os.link(source, tmpname)
+            method = "hardlink"
+        except OSError:
+            try:
+                _reflink(source, tmpname)
+                method = "reflink"
+            except (ImportError, OSError):
+                shutil.copyfile(source, tmpname)
+                method = "copy"
+        os.replace(tmpname, target)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+    return method
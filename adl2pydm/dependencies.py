@@ -0,0 +1,199 @@
+"""
+Find the .adl files that a screen refers to, and the files they refer to.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+A screen refers to other screens by the ``name`` of each display in a
+"related display" widget and by the "composite file" of a composite
+widget (written as a PyDM embedded display).  Names are found in the
+directory of the screen that refers to them, then in the search path
+(like MEDM, from ``EPICS_DISPLAY_PATH``).
+
+Each file found has a root directory: the directory of an entry screen
+(for the entries and the files found from their directory), or the
+search path directory where it was found.  Its path below the root is
+kept when the output tree mirrors the input (``relativeDirectory()``).
+"""
+
+import logging
+import os
+import pathlib
+
+from .session import ConversionSession
+
+
+logger = logging.getLogger(__name__)
+
+ENV_EPICS_DISPLAY_PATH = "EPICS_DISPLAY_PATH"
+ADL_FILE_EXTENSION = ".adl"
+
+
+def displaySearchPath():
+    """directories listed in the ``EPICS_DISPLAY_PATH`` environment variable"""
+    path = os.environ.get(ENV_EPICS_DISPLAY_PATH)
+    if path is None:
+        return []
+    return [p for p in path.split(os.pathsep) if len(p) > 0]
+
+
+def referencedDisplays(screen):
+    """Generate the names of the screens that ``screen`` refers to, in order."""
+
+    def walk(widgets):
+        for widget in widgets:
+            if widget.symbol == "related display":
+                for display in getattr(widget, "displays", []):
+                    yield display.get("name", "")
+            elif widget.symbol == "composite":
+                if len(widget.widgets) > 0:
+                    yield from walk(widget.widgets)
+                elif "composite file" in widget.contents:
+                    # same as output_handler: only the first file is used
+                    yield widget.contents["composite file"].split(";")[0]
+
+    for name in walk(screen.widgets):
+        name = name.strip()
+        if len(name) > 0:
+            yield name
+
+
+class DisplayCrawler(object):
+    """
+    visit each screen in the closure of the entry screens once
+
+    PARAMETERS
+
+    search_path
+        *[str]* : directories to find referenced screens,
+        default: ``displaySearchPath()``
+    session
+        *obj* : ``session.ConversionSession`` that parses the screens
+        (its reader and parse cache), default: a new one
+    """
+
+    ON_PATH, DONE = range(2)
+
+    def __init__(self, search_path=None, session=None):
+        if search_path is None:
+            search_path = displaySearchPath()
+        self.search_path = list(search_path)
+        self.session = session or ConversionSession()
+        self.graph = {}  # .adl file: [.adl files it refers to]
+        self.cycles = []  # each: [file, ..., file]
+        self.missing = []  # each: (.adl file, name not found)
+        self.unresolved = []  # each: (.adl file, name with macros)
+        self.roots = {}  # .adl file: root directory where it was found
+        self.searched = set()  # .adl files found in the search path (or from one there)
+
+    def resolve(self, name, referrer=None):
+        """
+        Full name of the .adl file ``name``, None if not found.
+
+        ``referrer`` is the .adl file that refers to ``name``
+        (None: look in the current directory).
+        """
+        if pathlib.PurePath(name).suffix == "":
+            name += ADL_FILE_EXTENSION
+        if os.path.isabs(name):
+            candidates = [(name, None)]
+        else:
+            local = os.curdir if referrer is None else os.path.dirname(referrer)
+            candidates = [(os.path.join(local, name), None)]
+            candidates += [(os.path.join(d, name), d) for d in self.search_path]
+        for candidate, search_dir in candidates:
+            if os.path.isfile(candidate):
+                fname = os.path.realpath(candidate)
+                if fname not in self.roots:
+                    if search_dir is not None:
+                        self.roots[fname] = os.path.realpath(search_dir)
+                        self.searched.add(fname)
+                    elif referrer is not None and referrer in self.roots:
+                        self.roots[fname] = self.roots[referrer]
+                        if referrer in self.searched:
+                            self.searched.add(fname)
+                    else:
+                        self.roots[fname] = os.path.dirname(fname)
+                return fname
+        return None
+
+    def relativeDirectory(self, adl_filename):
+        """
+        Directory of ``adl_filename`` relative to its root (str, "." for the root).
+
+        None if it is not below its root (such as an absolute name).
+        """
+        root = self.roots.get(adl_filename, os.path.dirname(adl_filename))
+        relative = os.path.relpath(os.path.dirname(adl_filename), root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return None
+        return relative
+
+    def inSearchPath(self, adl_filename):
+        """Was ``adl_filename`` found in the search path (or from a file found there)?"""
+        return adl_filename in self.searched
+
+    def references(self, adl_filename, screen):
+        """resolved .adl files that ``screen`` refers to"""
+        found = []
+        for name in referencedDisplays(screen):
+            if "$(" in name or "${" in name:
+                logger.debug("%s: cannot resolve macros in %s", adl_filename, name)
+                self.unresolved.append((adl_filename, name))
+                continue
+            fname = self.resolve(name, adl_filename)
+            if fname is None:
+                if (adl_filename, name) not in self.missing:
+                    logger.warning("%s: referenced display not found: %s", adl_filename, name)
+                    self.missing.append((adl_filename, name))
+            elif fname not in found:
+                found.append(fname)
+        return found
+
+    def crawl(self, entries):
+        """
+        Generate (adl_filename, screen) for each screen in the closure of ``entries``.
+
+        Depth-first, each file once.  Files that cannot be parsed are
+        logged and skipped.  Cycles are recorded in ``self.cycles``.
+        """
+        state = {}
+
+        def enter(fname):
+            state[fname] = self.ON_PATH
+            try:
+                screen = self.session.parse(fname)
+            except Exception as exc:
+                logger.error(f"error processing {fname}: {exc}")
+                self.graph[fname] = []
+                return None
+            self.graph[fname] = self.references(fname, screen)
+            return screen
+
+        for entry in entries:
+            root = self.resolve(entry)
+            if root is None:
+                logger.error(f"error processing {entry}: Could not find file: {entry}")
+                continue
+            if root in state:
+                continue
+            screen = enter(root)
+            if screen is not None:
+                yield root, screen
+            stack = [(root, iter(self.graph[root]))]
+            while len(stack) > 0:
+                node, children = stack[-1]
+                for child in children:
+                    if child not in state:
+                        screen = enter(child)
+                        if screen is not None:
+                            yield child, screen
+                        stack.append((child, iter(self.graph[child])))
+                        break
+                    if state[child] == self.ON_PATH:
+                        path = [n for n, _ in stack]
+                        cycle = path[path.index(child) :] + [child]
+                        logger.info("display cycle: %s", " -> ".join(cycle))
+                        self.cycles.append(cycle)
+                else:
+                    stack.pop()
+                    state[node] = self.DONE
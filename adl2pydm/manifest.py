@@ -0,0 +1,148 @@
+"""
+Remember which .adl files were converted, for incremental conversion.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+The manifest is a JSON file in the output directory.  For each .adl file
+converted there, it records the .ui file written, the content hash of
+the .adl file, the adl2pydm version and the conversion options.
+"""
+
+import json
+import logging
+import os
+import pathlib
+import tempfile
+
+from . import __version__
+from .cache import content_key
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = ".adl2pydm-manifest.json"
+
+
+class Manifest(object):
+    """
+    record of the .ui files in one output directory and their .adl sources
+
+    PARAMETERS
+
+    output_path
+        *str* : output directory (where the manifest file is kept)
+    options
+        *dict* : conversion options, a change means all files are out of date
+    """
+
+    def __init__(self, output_path, options=None):
+        self.path = pathlib.Path(output_path)
+        self.filename = self.path / MANIFEST_FILE
+        self.options = dict(options or {})
+        self.entries = {}  # absolute .adl file name: dict
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, "r") as fp:
+                self.entries = json.load(fp).get("files", {})
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as exc:
+            logger.warning("ignoring unreadable manifest %s: %s", self.filename, exc)
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest file (atomically), remove it if there are no entries."""
+        if len(self.entries) == 0:
+            if self.filename.exists():
+                self.filename.unlink()
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        content = dict(adl2pydm=__version__, files=self.entries)
+        fd, tmpname = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump(content, fp, indent=2, sort_keys=True)
+        os.replace(tmpname, self.filename)
+
+    def _source(self, adl_filename):
+        return os.path.abspath(adl_filename)
+
+    def isCurrent(self, adl_filename):
+        """
+        Is the .ui file of ``adl_filename`` up to date?
+
+        Unchanged size and modification time mean an unchanged file.
+        Otherwise, the content hash decides.
+        """
+        entry = self.entries.get(self._source(adl_filename))
+        if entry is None:
+            return False
+        if entry.get("version") != __version__ or entry.get("options") != self.options:
+            return False
+        if not (self.path / entry["ui"]).exists():
+            return False
+        try:
+            st = os.stat(adl_filename)
+        except OSError:
+            return False
+        if (st.st_mtime_ns, st.st_size) == (entry["mtime_ns"], entry["size"]):
+            return True
+        with open(adl_filename, "rb") as fp:
+            if content_key(fp.read()) != entry["sha256"]:
+                return False
+        # touched, not changed
+        entry["mtime_ns"], entry["size"] = st.st_mtime_ns, st.st_size
+        return True
+
+    def convertedHash(self, adl_filename):
+        """Content hash of ``adl_filename`` as converted (with these options, .ui file exists), or None."""
+        entry = self.entries.get(self._source(adl_filename))
+        if entry is None or entry.get("version") != __version__ or entry.get("options") != self.options:
+            return None
+        if not (self.path / entry["ui"]).exists():
+            return None
+        return entry["sha256"]
+
+    def record(self, adl_filename, ui_filename):
+        """Remember that ``adl_filename`` was converted to ``ui_filename``."""
+        source = self._source(adl_filename)
+        st = os.stat(adl_filename)
+        with open(adl_filename, "rb") as fp:
+            sha256 = content_key(fp.read())
+        ui_name = pathlib.Path(ui_filename).name
+        previous = self.entries.get(source)
+        self.entries[source] = dict(
+            ui=ui_name,
+            sha256=sha256,
+            version=__version__,
+            options=self.options,
+            mtime_ns=st.st_mtime_ns,
+            size=st.st_size,
+        )
+        if previous is not None and previous["ui"] != ui_name:
+            self._removeOutput(previous["ui"])  # screen title changed
+
+    def _removeOutput(self, ui_name):
+        if any(entry["ui"] == ui_name for entry in self.entries.values()):
+            return  # still written from another .adl file
+        ui_file = self.path / ui_name
+        if ui_file.exists():
+            logger.info("removing stale output: %s", ui_file)
+            ui_file.unlink()
+
+    def removeStale(self):
+        """Remove .ui files (and entries) whose .adl file no longer exists."""
+        stale = [source for source in self.entries if not os.path.exists(source)]
+        for source in stale:
+            entry = self.entries.pop(source)
+            self._removeOutput(entry["ui"])
+        return stale
+
+
+def findManifests(top):
+    """Generate the directories below ``top`` (and itself) with a manifest file."""
+    for dirpath, dirnames, filenames in os.walk(top):
+        dirnames.sort()
+        if MANIFEST_FILE in filenames:
+            yield dirpath
@@ -5,16 +5,21 @@ Only rely on packages in the standard Python distribution. (rules out lxml)
 """
 
 from collections import namedtuple
+import io
+import itertools
 import json
 import logging
 import os
 import pathlib
+import re
+import threading
 from xml.dom import minidom
 from xml.etree import ElementTree
 
 from . import symbols
 from .adl_parser import Color, Geometry
 from .calc2rules import convertCalcToRuleExpression
+from .stats import NO_STATS
 
 
 QT_STYLESHEET_FILE = "stylesheet.qss"
@@ -88,6 +93,18 @@ def convertDynamicAttribute_to_Rules(attr):
     return [rule]
 
 
+def screen_title(screen):
+    """window title of the screen, default: the .adl file name stem"""
+    return screen.title or str(pathlib.Path(screen.given_filename).stem)
+
+
+def screen_ui_filename(screen, output_path):
+    """name of the .ui file written for ``screen`` into ``output_path`` (None if no path)"""
+    if output_path is None:
+        return None
+    return str(pathlib.Path(output_path, f"{screen_title(screen)}{SCREEN_FILE_EXTENSION}"))
+
+
 class Widget2Pydm(object):
     """
     convert screen to PyDM structure and write the '.ui' file
@@ -104,62 +121,98 @@ class Widget2Pydm(object):
 
     """
 
-    def __init__(self):
+    # MEDM widget symbol: name of the method that writes it, see register_handler()
+    pydm_widget_handlers = {
+        "arc": "write_block_arc",
+        "bar": "write_block_bar",
+        "byte": "write_block_byte_indicator",
+        "cartesian plot": "write_block_cartesian_plot",
+        "choice button": "write_block_choice_button",
+        "composite": "write_block_composite",
+        "embedded display": "write_block_embedded_display",
+        "image": "write_block_image",
+        "indicator": "write_block_indicator",
+        "menu": "write_block_menu",
+        "message button": "write_block_message_button",
+        "meter": "write_block_meter",
+        "oval": "write_block_oval",
+        "polygon": "write_block_polygon",
+        "polyline": "write_block_polyline",
+        "rectangle": "write_block_rectangle",
+        "related display": "write_block_related_display",
+        "shell command": "write_block_shell_command",
+        "strip chart": "write_block_strip_chart",
+        "text": "write_block_text",
+        "text entry": "write_block_text_entry",
+        "text update": "write_block_text_update",
+        "valuator": "write_block_valuator",
+        "wheel switch": "write_block_wheel_switch",
+    }
+
+    def __init__(self, find_stylesheet=True, stats=None, adl_widgets=None):
+        self.custom_widgets = []
+        self.find_stylesheet = find_stylesheet  # False: no file access until .ui is written
+        self.stats = stats or NO_STATS  # stats.ConversionStats: time the phases
+        self.unique_widget_names = {}  # suggested name: index of its next "_N" name
+        # MEDM widget: PyDM widget, default: symbols.adl_widgets
+        self.adl_widgets = symbols.adl_widgets if adl_widgets is None else adl_widgets
+
+    def reset(self):
+        """Forget the widget names and custom widgets of the last screen."""
         self.custom_widgets = []
         self.unique_widget_names = {}
-        self.pydm_widget_handlers = {
-            "arc": self.write_block_arc,
-            "bar": self.write_block_bar,
-            "byte": self.write_block_byte_indicator,
-            "cartesian plot": self.write_block_cartesian_plot,
-            "choice button": self.write_block_choice_button,
-            "composite": self.write_block_composite,
-            "embedded display": self.write_block_embedded_display,
-            "image": self.write_block_image,
-            "indicator": self.write_block_indicator,
-            "menu": self.write_block_menu,
-            "message button": self.write_block_message_button,
-            "meter": self.write_block_meter,
-            "oval": self.write_block_oval,
-            "polygon": self.write_block_polygon,
-            "polyline": self.write_block_polyline,
-            "rectangle": self.write_block_rectangle,
-            "related display": self.write_block_related_display,
-            "shell command": self.write_block_shell_command,
-            "strip chart": self.write_block_strip_chart,
-            "text": self.write_block_text,
-            "text entry": self.write_block_text_entry,
-            "text update": self.write_block_text_update,
-            "valuator": self.write_block_valuator,
-            "wheel switch": self.write_block_wheel_switch,
-        }
+
+    @classmethod
+    def register_handler(cls, symbol, handler):
+        """
+        register how to write MEDM widget ``symbol``
+
+        ``handler`` is the name of a method of this class or a function
+        called as ``handler(writer, parent, block, nm, qw)`` where
+        ``writer`` is this ``Widget2Pydm`` object.
+        A subclass registers in its own table, the base class is not changed.
+        (Use ``adl_parser.registerMedmWidget()`` to parse a new symbol.)
+        """
+        if "pydm_widget_handlers" not in cls.__dict__:
+            cls.pydm_widget_handlers = dict(cls.pydm_widget_handlers)  # copy of the inherited table
+        cls.pydm_widget_handlers[symbol] = handler
+
+    def is_widget_name_taken(self, name):
+        """
+        is ``name`` in use?
+
+        A suggested name is in use, so are the "_N" names that have been
+        counted for a suggested name (given out or skipped).
+        """
+        if name in self.unique_widget_names:
+            return True
+        prefix, sep, index = name.rpartition("_")
+        if len(sep) == 0 or not index.isdigit() or index != str(int(index)):
+            return False
+        return 0 < int(index) < self.unique_widget_names.get(prefix, 0)
 
     def get_unique_widget_name(self, suggestion):
         """
         return a widget name that is not already in use
 
         Qt requires that all widgets have a unique name.
-        This algorithm keeps track of all widget names in use
-        (basedon the suggested name) and, if the suggested name
-        exists, generates a new name with an index number suffixed.
+        The first time, the suggested name is used.  After that, a counter
+        (for each suggested name) gives the next name with an index number
+        suffixed, skipping any name already in use.
         """
-        unique = suggestion
-
-        if unique in self.unique_widget_names:
-            knowns = self.unique_widget_names[suggestion]
-            unique = "%s_%d" % (suggestion, len(knowns))
-            if unique in self.unique_widget_names:
-                msg = "trouble getting a unique name from " + suggestion
-                msg += "\n  complicated:\n%s" % str(self.unique_widget_names)
-                raise ValueError(msg)
-        else:
-            unique = suggestion
-            self.unique_widget_names[suggestion] = []
-
-        # add this one to the list
-        self.unique_widget_names[suggestion].append(unique)
-
-        return unique
+        if not self.is_widget_name_taken(suggestion):
+            self.unique_widget_names[suggestion] = 1
+            return suggestion
+
+        # suggestion might be in use only as the "_N" name of another
+        self.unique_widget_names.setdefault(suggestion, 1)
+        while True:
+            index = self.unique_widget_names[suggestion]
+            unique = f"{suggestion}_{index}"
+            taken = self.is_widget_name_taken(unique)
+            self.unique_widget_names[suggestion] = index + 1
+            if not taken:
+                return unique
 
     def get_channel(self, contents):
         """return the PV channel described in the MEDM widget"""
@@ -208,18 +261,22 @@ class Widget2Pydm(object):
             block.color = None
 
     def write_block(self, parent, block):
+        with self.stats.handler(block):
+            self._write_block(parent, block)
+
+    def _write_block(self, parent, block):
         nm = self.get_unique_widget_name(block.symbol.replace(" ", "_"))
 
         if block.symbol == "composite" and len(block.widgets) == 0 and "composite file" in block.contents:
             block.symbol = "embedded display"
 
-        widget_info = symbols.adl_widgets.get(block.symbol)
+        widget_info = self.adl_widgets.get(block.symbol)
         if widget_info is not None:
             cls = widget_info["pydm_widget"]
             if cls not in self.custom_widgets:
                 self.custom_widgets.append(cls)
 
-        handler = self.pydm_widget_handlers.get(block.symbol, self.write_block_default)
+        handler = self.pydm_widget_handlers.get(block.symbol, "write_block_default")
 
         cls = widget_info["pydm_widget"]
         if cls == "PyDMLabel":
@@ -238,7 +295,10 @@ class Widget2Pydm(object):
         qw = self.writer.writeOpenTag(parent, "widget", cls=cls, name=nm)
         self.write_geometry(qw, block.geometry)
         # self.write_stylesheet(qw, block)
-        handler(parent, block, nm, qw)
+        if isinstance(handler, str):
+            getattr(self, handler)(parent, block, nm, qw)
+        else:
+            handler(self, parent, block, nm, qw)
         msg = "(#%d) %s -> %s: %s" % (block.line_offset, block.symbol, cls, nm)
         logger.debug(msg)
 
@@ -284,45 +344,64 @@ class Widget2Pydm(object):
         font = self.writer.writeOpenTag(propty, "font")
         self.writer.writeTaggedString(font, "pointsize", str(pointsize))
 
-    def write_ui(self, screen, output_path):
-        """main entry point to write the .ui file"""
-        title = screen.title or str(pathlib.Path(screen.given_filename).stem)
-        if output_path is not None:
-            ui_filename = str(pathlib.Path(output_path, f"{title}{SCREEN_FILE_EXTENSION}"))
-        else:
-            ui_filename = None
-
-        self.writer = PYDM_Writer(None)
-
-        root = self.writer.openFile(ui_filename)
-        logging.info("writing screen file: %s", ui_filename)
-        self.writer.writeTaggedString(root, "class", "Dialog")
-        form = self.writer.writeOpenTag(root, "widget", cls=TOP_LEVEL_WIDGET_CLASS, name="screen")
+    def write_ui(self, screen, output_path, widgets=None):
+        """
+        main entry point to write the .ui file
 
-        self.write_geometry(form, screen.geometry)
-        self.write_stylesheet(form, screen)
+        By default, write ``screen.widgets``.  Otherwise, ``widgets``
+        is any iterable of the screen's top-level widgets, such as
+        ``screen.iter_widgets(fileobj)``, consumed one at a time.
 
-        propty = self.writer.writeOpenProperty(form, "windowTitle")
-        self.writer.writeTaggedString(propty, value=title)
+        Returns the name of the .ui file (None if ``output_path`` is None).
+        """
+        self.reset()  # each screen has its own widget names
 
-        for i, widget in enumerate(screen.widgets):
-            # handle "widget" if it is a known screen component
-            logger.debug(
-                f"WIDGET {screen.given_filename}"
-                f" {widget.line_offset}"
-                f" {i+1}/{len(screen.widgets)}"
-                f" {widget.symbol}"
-            )
-            self.write_block(form, widget)
+        if widgets is None:
+            widgets = screen.widgets
+        if hasattr(widgets, "__len__"):
+            num_widgets = len(widgets)
+        else:
+            num_widgets = "?"
+            # the screen's geometry is known once the first widget is parsed
+            widgets = iter(widgets)
+            first = list(itertools.islice(widgets, 1))
+            widgets = itertools.chain(first, widgets)
+
+        title = screen_title(screen)
+        ui_filename = screen_ui_filename(screen, output_path)
+
+        self.writer = PYDM_Writer(None, find_stylesheet=self.find_stylesheet, stats=self.stats)
+        with self.stats.phase("xml build"):
+            root = self.writer.openFile(ui_filename)
+            logging.info("writing screen file: %s", ui_filename)
+            self.writer.writeTaggedString(root, "class", "Dialog")
+            form = self.writer.writeOpenTag(root, "widget", cls=TOP_LEVEL_WIDGET_CLASS, name="screen")
+
+            self.write_geometry(form, screen.geometry)
+            self.write_stylesheet(form, screen)
+
+            propty = self.writer.writeOpenProperty(form, "windowTitle")
+            self.writer.writeTaggedString(propty, value=title)
+
+            for i, widget in enumerate(widgets):
+                # handle "widget" if it is a known screen component
+                logger.debug(
+                    f"WIDGET {screen.given_filename}"
+                    f" {widget.line_offset}"
+                    f" {i+1}/{num_widgets}"
+                    f" {widget.symbol}"
+                )
+                self.write_block(form, widget)
 
-        # TODO: self.write widget <zorder/> elements here (#7)
+            # TODO: self.write widget <zorder/> elements here (#7)
 
-        self.write_customwidgets(root)
+            self.write_customwidgets(root)
 
-        # TODO: write .ui file <resources/> elements here (#9)
-        # TODO: write .ui file <connections/> elements here (#10)
+            # TODO: write .ui file <resources/> elements here (#9)
+            # TODO: write .ui file <connections/> elements here (#10)
 
         self.writer.closeFile()
+        return ui_filename
 
     def writePropertyBoolean(self, widget, tag, value, **kwargs):
         self.writer.writeProperty(widget, tag, str(value).lower(), tag="bool", **kwargs)
@@ -1009,24 +1088,17 @@ class Widget2Pydm(object):
         cw_set = self.writer.writeOpenTag(parent, "customwidgets")
 
         # some custom widgets extend other custom widgets
-        # include any inheritances
+        # include any inheritances, nearest ancestors first
         # example: PyDMDrawingPie extends PyDMDrawingArc
-        while True:  # do..until
-            additions = []
-            if TOP_LEVEL_WIDGET_CLASS not in self.custom_widgets:
-                self.custom_widgets.append(TOP_LEVEL_WIDGET_CLASS)
-            for widget in self.custom_widgets:
-                if widget == "PyDMDrawingPie":
-                    logger.debug("breakpoint")
-                item = symbols.pydm_widgets.get(widget)
-                if item is not None:
-                    klass = item.extends
-                    if klass.startswith("PyDM") and klass not in additions + self.custom_widgets:
-                        additions.append(klass)
-            if len(additions) > 0:
-                self.custom_widgets += additions
-            else:
-                break  # recurse until no new additions
+        if TOP_LEVEL_WIDGET_CLASS not in self.custom_widgets:
+            self.custom_widgets.append(TOP_LEVEL_WIDGET_CLASS)
+        known = set(self.custom_widgets)
+        chains = [symbols.pydm_widget_ancestors.get(widget, ()) for widget in self.custom_widgets]
+        for level in range(max(map(len, chains), default=0)):
+            for chain in chains:
+                if level < len(chain) and chain[level] not in known:
+                    known.add(chain[level])
+                    self.custom_widgets.append(chain[level])
 
         for widget in self.custom_widgets:
             item = symbols.pydm_widgets.get(widget)
@@ -1146,8 +1218,10 @@ class PYDM_Writer(object):
     write the screen description to a PyDM .ui file
     """
 
-    def __init__(self, adlParser):
+    def __init__(self, adlParser, find_stylesheet=True, stats=None):
         self.adlParser = adlParser
+        self.find_stylesheet = find_stylesheet
+        self.stats = stats or NO_STATS
         self.filename = None
         self.path = None
         self.file_suffix = SCREEN_FILE_EXTENSION
@@ -1158,20 +1232,8 @@ class PYDM_Writer(object):
 
     def openFile(self, outFile):
         """actually, begin to create the .ui file content IN MEMORY"""
-        if os.environ.get(ENV_PYDM_DISPLAYS_PATH) is None:
-            msg = "Environment variable %s is not defined." % "PYDM_DISPLAYS_PATH"
-            logger.info(msg)
-
-        sfile = findFile(QT_STYLESHEET_FILE)
-        if sfile is None:
-            msg = "file not found: " + QT_STYLESHEET_FILE
-            logger.info(msg)
-        else:
-            with open(sfile, "r") as fp:
-                self.stylesheet = fp.read()
-                msg = "Using stylesheet file in .ui files: " + sfile
-                msg += "\n  unset %s to not use any stylesheet" % ENV_PYDM_DISPLAYS_PATH
-                logger.info(msg)
+        if self.find_stylesheet:
+            self.readStylesheet()
 
         # adl2ui opened outFile here AND started to write XML-like content
         # that is not necessary now
@@ -1187,8 +1249,30 @@ class PYDM_Writer(object):
 
         return self.root
 
+    def readStylesheet(self):
+        """look for the stylesheet file in PYDM_DISPLAYS_PATH"""
+        if os.environ.get(ENV_PYDM_DISPLAYS_PATH) is None:
+            msg = "Environment variable %s is not defined." % "PYDM_DISPLAYS_PATH"
+            logger.info(msg)
+
+        sfile, text = DISPLAY_PATH_RESOLVER.read(QT_STYLESHEET_FILE)
+        if sfile is None:
+            msg = "file not found: " + QT_STYLESHEET_FILE
+            logger.info(msg)
+        else:
+            self.stylesheet = text
+            msg = "Using stylesheet file in .ui files: " + sfile
+            msg += "\n  unset %s to not use any stylesheet" % ENV_PYDM_DISPLAYS_PATH
+            logger.info(msg)
+
     def generate_ui_contents(self):
         """Generate .UI XML contents for writing to file."""
+        fp = io.StringIO()
+        self.write_ui_contents(fp)
+        return fp.getvalue()
+
+    def write_ui_contents(self, fp):
+        """Write .UI XML contents to open text file ``fp``."""
 
         def sorter(widget):
             return widget.order
@@ -1201,14 +1285,12 @@ class PYDM_Writer(object):
 
         # ElementTree needs help to pretty print
         # (easier in lxml but that's an additional package to add)
-        text = ElementTree.tostring(self.root)
-        return minidom.parseString(text).toprettyxml(indent=" " * 2)
+        write_pretty_xml(fp, self.root, indent=" " * 2)
 
     def closeFile(self):
         """finally, write .ui file (XML content)"""
         if self.outFile is not None:
-            with open(self.outFile, "w") as f:
-                f.write(self.generate_ui_contents())
+            self.stats.serializeTo(self.outFile, self.write_ui_contents)
 
     def writeProperty(self, parent, name, value, tag="string", **kwargs):
         prop = self.writeOpenTag(parent, "property", name=name)
@@ -1248,25 +1330,178 @@ class PYDM_Writer(object):
     # def writeMessage(self, mess): ...        # nothing to do
 
 
+class DisplayPathResolver(object):
+    """
+    find (and read) files in the PYDM_DISPLAYS_PATH directories, remember them
+
+    Each directory is listed once, each file is found and read once, for
+    as long as PYDM_DISPLAYS_PATH and the current directory do not change.
+    Call ``invalidate()`` when files in these directories may have changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._context = None  # (PYDM_DISPLAYS_PATH, current directory)
+        self._listings = {}  # directory: set of names in it
+        self._found = {}  # file name: full name (None: not found)
+        self._contents = {}  # full name: text
+
+    def invalidate(self):
+        """Forget all directory listings, files found and files read."""
+        with self._lock:
+            self._context = None
+            self._listings.clear()
+            self._found.clear()
+            self._contents.clear()
+
+    def _checkContext(self):
+        context = (os.environ.get(ENV_PYDM_DISPLAYS_PATH), os.getcwd())
+        if context != self._context:
+            self._context = context
+            self._listings.clear()
+            self._found.clear()
+            self._contents.clear()
+
+    def _exists(self, directory, fname):
+        if os.sep in fname or (os.altsep is not None and os.altsep in fname):
+            return (pathlib.Path(directory) / fname).exists()
+        names = self._listings.get(directory)
+        if names is None:
+            try:
+                names = set(os.listdir(directory or os.curdir))
+            except OSError:
+                names = set()
+            self._listings[directory] = names
+        return fname in names
+
+    def _search(self, fname):
+        path, cwd = self._context
+        if path is None:
+            paths = [cwd]  # safe choice that becomes redundant
+        else:
+            paths = path.split(os.pathsep)
+
+        if pathlib.Path(fname).is_absolute():
+            return fname if pathlib.Path(fname).exists() else None
+        if self._exists(cwd, fname):
+            # found it in current directory
+            return fname
+
+        for path in paths:
+            if self._exists(path, fname):
+                # found it in the DISPLAYS path
+                return str(pathlib.Path(path) / fname)
+
+        return None
+
+    def find(self, fname):
+        """Full name of ``fname`` (in the current directory or PYDM_DISPLAYS_PATH) or None."""
+        if fname is None or len(fname) == 0:
+            return None
+        with self._lock:
+            self._checkContext()
+            if fname not in self._found:
+                self._found[fname] = self._search(fname)
+            return self._found[fname]
+
+    def read(self, fname):
+        """Return (full name, text) of ``fname``, or (None, None) if not found."""
+        full_name = self.find(fname)
+        if full_name is None:
+            return None, None
+        with self._lock:
+            text = self._contents.get(full_name)
+        if text is None:
+            with open(full_name, "r") as fp:
+                text = fp.read()
+            with self._lock:
+                self._contents[full_name] = text
+        return full_name, text
+
+
+DISPLAY_PATH_RESOLVER = DisplayPathResolver()  # shared by all writers in this process
+
+
 def findFile(fname):
     """look for file in PYDM_DISPLAYS_PATH"""
-    if fname is None or len(fname) == 0:
-        return None
+    return DISPLAY_PATH_RESOLVER.find(fname)
+
 
-    path = os.environ.get(ENV_PYDM_DISPLAYS_PATH)
-    if path is None:
-        paths = [str(pathlib.Path.cwd())]  # safe choice that becomes redundant
-    else:
-        paths = path.split(os.pathsep)
+# XML 1.0 does not allow these characters, not even as references
+XML_INVALID_CHARACTERS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def _minidom_escapes():
+    """
+    (text, attribute) replacements made by this Python's minidom writer
+
+    These changed between Python versions, ask minidom directly.
+    """
+    text_escapes, attrib_escapes = [], []
+    for c in "&<>\"\n\t\r":  # "&" must be first
+        ref = "&#%d;" % ord(c)
+        xml = minidom.parseString(f'<a b="{ref}">{ref}</a>').documentElement.toxml()
+        attrib, text = re.match(r'<a b="(.*)">(.*)</a>$', xml, re.DOTALL).groups()
+        if text != c:
+            text_escapes.append((c, text))
+        if attrib != c:
+            attrib_escapes.append((c, attrib))
+    return text_escapes, attrib_escapes
 
-    if pathlib.Path(fname).exists():
-        # found it in current directory
-        return fname
 
-    for path in paths:
-        path_fname = pathlib.Path(path) / fname
-        if path_fname.exists():
-            # found it in the DISPLAYS path
-            return str(path_fname)
+XML_TEXT_ESCAPES, XML_ATTRIB_ESCAPES = _minidom_escapes()
 
-    return None
+
+def _escape_xml(text, escapes):
+    if XML_INVALID_CHARACTERS.search(text) is not None:
+        raise ValueError(f"not allowed in XML: {text!r}")
+    for c, ref in escapes:
+        if c in text:
+            text = text.replace(c, ref)
+    return text
+
+
+def _xml_text(text):
+    # an XML parser reads any line ending as "\n"
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return _escape_xml(text, XML_TEXT_ESCAPES)
+
+
+def write_pretty_xml(fp, root, indent="  "):
+    """
+    Write ElementTree ``root`` to open text file ``fp`` as indented XML.
+
+    Written in one pass, the content is the same as from
+    ``minidom.parseString(ElementTree.tostring(root)).toprettyxml(indent=indent)``
+    """
+    write = fp.write
+    write('<?xml version="1.0" ?>\n')
+
+    def write_element(element, prefix):
+        write(prefix + "<" + element.tag)
+        for k, v in element.attrib.items():
+            write(f' {k}="{_escape_xml(v, XML_ATTRIB_ESCAPES)}"')
+
+        # child nodes, as minidom sees them
+        nodes = [element.text] if element.text else []
+        for child in element:
+            nodes.append(child)
+            if child.tail:
+                nodes.append(child.tail)
+
+        if len(nodes) == 0:
+            write("/>\n")
+        elif len(nodes) == 1 and isinstance(nodes[0], str):
+            write(">" + _xml_text(nodes[0]) + "</" + element.tag + ">\n")
+        else:
+            write(">\n")
+            child_prefix = prefix + indent
+            for node in nodes:
+                if isinstance(node, str):
+                    write(child_prefix + _xml_text(node) + "\n")
+                else:
+                    write_element(node, child_prefix)
+            write(prefix + "</" + element.tag + ">\n")
+
+    write_element(root, "")
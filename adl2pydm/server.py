@@ -0,0 +1,177 @@
+"""
+Convert .adl files on request, in a long-running process (``adl2pydm --serve``).
+
+Only rely on packages in this project or from the standard Python distribution.
+
+The server listens on a Unix domain socket.  See the ``client`` module
+for the protocol and the thin client (``adl2pydm-client``).  The server
+keeps its imports and conversion session (handler tables, stylesheet,
+``--cache``) warm between requests.
+With ``--jobs N``, conversions run in a pool of N worker processes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+from . import __version__
+from . import api
+from . import cli
+from .client import checkSocketPath
+from .session import ConversionSession
+
+
+logger = logging.getLogger(__name__)
+
+
+def convertRequest(request, session=None):
+    """
+    Do one conversion request (dict) with ``session``, return the response (dict).
+
+    Display path lookups start afresh with each request.
+    """
+    options = request.get("options") or {}
+    try:
+        session = (session or ConversionSession()).withOptions(use_scatterplot=options.get("use_scatterplot"))
+        session.resolver.invalidate()  # displays may have been added or moved since the last request
+        if "text" in request:
+            name = request.get("name") or api.DEFAULT_SCREEN_NAME
+            return dict(ok=True, ui=session.convertScreen(api.parse_string(request["text"], name)))
+        if "adlfile" in request:
+            ui_file = session.convertFile(request["adlfile"], request.get("dir"))
+            return dict(ok=True, ui_file=ui_file)
+        raise ValueError("request needs 'adlfile' or 'text'")
+    except Exception as exc:
+        return dict(ok=False, error=str(exc))
+
+
+def _convertInWorker(request):
+    """convert in a worker process, return (response, log records)"""
+    collector = cli._worker["collector"]
+    collector.records = []
+    response = convertRequest(request, session=cli._worker["session"])
+    return response, collector.records
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """one connection: JSON requests and responses, one per line"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("not a JSON object")
+            except ValueError as exc:
+                request = {}
+                response = dict(ok=False, error=f"invalid request: {exc}")
+            else:
+                response = self.server.respond(request)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf8"))
+            self.wfile.flush()
+            if request.get("command") == "shutdown":
+                break
+
+
+class ConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    conversion server on a Unix domain socket
+
+    PARAMETERS
+
+    socket_path
+        *str* : socket file name, default: ``client.defaultSocketPath()``
+        (its per-user directory is made if needed)
+    jobs
+        *int* : number of worker processes (1: convert in this process)
+    session
+        *obj* : ``session.ConversionSession`` (options, ``--cache``),
+        default: a new one
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None, jobs=1, session=None):
+        self.socket_path = checkSocketPath(socket_path, create=True)
+        self.session = session or ConversionSession()
+        self.lock = threading.Lock()  # conversions in this process: one at a time
+        self.formatter = logging.Formatter(logging.BASIC_FORMAT)
+        self._removeStaleSocket()
+        umask = os.umask(0o177)  # the socket is made only for this user
+        try:
+            socketserver.UnixStreamServer.__init__(self, self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+        self.pool = None
+        if jobs > 1:
+            initargs = (logging.getLogger().getEffectiveLevel(), self.session)
+            self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=cli._initWorker, initargs=initargs)
+
+    def _removeStaleSocket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.socket_path)
+            except PermissionError as exc:
+                raise RuntimeError(f"cannot use {self.socket_path}: {exc}") from exc
+            except OSError:
+                try:
+                    os.remove(self.socket_path)  # left by a server that is gone
+                except PermissionError as exc:  # such as another user's
+                    raise RuntimeError(f"cannot remove stale {self.socket_path}: {exc}") from exc
+                return
+        raise RuntimeError(f"a server is already listening on {self.socket_path}")
+
+    def respond(self, request):
+        command = request.get("command")
+        if command == "ping":
+            return dict(ok=True, version=__version__)
+        if command == "shutdown":
+            threading.Thread(target=self.shutdown).start()
+            return dict(ok=True)
+        if command is not None:
+            return dict(ok=False, error=f"unknown command: {command}")
+
+        if self.pool is not None:
+            try:
+                response, records = self.pool.submit(_convertInWorker, request).result()
+            except Exception as exc:  # such as a worker process that died
+                response, records = dict(ok=False, error=str(exc)), []
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+        else:
+            collector = cli._RecordCollector()
+            with self.lock:
+                logging.root.addHandler(collector)
+                try:
+                    response = convertRequest(request, session=self.session)
+                finally:
+                    logging.root.removeHandler(collector)
+            records = collector.records
+        response["messages"] = [self.formatter.format(r) for r in records]
+        return response
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if self.pool is not None:
+            self.pool.shutdown()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def serve(socket_path=None, jobs=1, session=None):
+    """Run the conversion server until interrupted (or asked to shut down)."""
+    server = ConversionServer(socket_path, jobs=jobs, session=session)
+    logger.info("adl2pydm server listening on %s", server.socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
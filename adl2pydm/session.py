@@ -0,0 +1,211 @@
+"""
+Convert many screens with the same setup: a conversion session.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+A ``ConversionSession`` is made once per batch (or server), then converts
+any number of screens.  It owns what all those conversions share: the
+conversion options, its view of the MEDM to PyDM widgets (its options
+override ``symbols.adl_widgets``, without changing it, and widgets
+registered later are seen), the ``Widget2Pydm`` writer (its handler
+table and custom widget registry), the parse cache and the .ui store.
+It uses the process-wide display path resolver
+(``output_handler.DISPLAY_PATH_RESOLVER``, it caches the stylesheet).
+Between screens, only the writer's per-screen state is ``reset()``.
+
+EXAMPLE::
+
+    from adl2pydm.session import ConversionSession
+
+    session = ConversionSession(use_scatterplot=True)
+    for adlfile in adlfiles:
+        session.convertFile(adlfile, "ui")
+"""
+
+import collections
+import pathlib
+
+from . import adl_parser
+from . import output_handler
+from . import stats as adl_stats
+from . import symbols
+
+
+CARTESIAN_PLOT_WIDGETS = {False: "PyDMWaveformPlot", True: "PyDMScatterPlot"}
+# how .adl files are read (without a cache), see ConversionSession
+READERS = ("lines", "stream", "mmap")
+
+
+class ConversionSession(object):
+    """
+    setup shared by the conversions of a batch
+
+    PARAMETERS
+
+    use_scatterplot
+        *bool* : translate 'cartesian plot' as ``PyDMScatterPlot``,
+        default (None): as ``symbols.adl_widgets`` does now
+    cache
+        *obj* : ``cache.ParseCache`` for the parsed screens, default: None
+    store
+        *obj* : ``cache.UiStore`` for the .ui files, default: None
+    find_stylesheet
+        *bool* : look for the stylesheet file (False: no file access
+        until a .ui file is written), default: True
+    reader
+        *str* : how ``convertFile()`` reads .adl files (with a ``cache``:
+        only those not cached), one of ``READERS``: ``"lines"`` reads all
+        lines, then parses them (default); ``"stream"`` parses while
+        reading (``MedmMainWidget.iter_widgets()``), only the lines of the
+        widget being parsed are kept and the widgets are not collected
+        (the .ui XML is still built whole, its time includes the parse);
+        ``"mmap"`` maps the file, lines are decoded only as they are used
+        (``MedmMainWidget.mapAdlFile()``)
+    """
+
+    def __init__(self, use_scatterplot=None, cache=None, store=None, find_stylesheet=True, reader="lines"):
+        if reader not in READERS:
+            raise ValueError(f"unknown reader '{reader}', expected one of: {', '.join(READERS)}")
+        if use_scatterplot is None:
+            pydm_widget = symbols.adl_widgets["cartesian plot"]["pydm_widget"]
+            use_scatterplot = pydm_widget == CARTESIAN_PLOT_WIDGETS[True]
+        self.use_scatterplot = bool(use_scatterplot)
+        self.cache = cache
+        self.store = store
+        self.find_stylesheet = find_stylesheet
+        self.reader = reader
+
+        cartesian = dict(symbols.adl_widgets["cartesian plot"])
+        cartesian["pydm_widget"] = CARTESIAN_PLOT_WIDGETS[self.use_scatterplot]
+        # widgets registered later (adl_parser.registerMedmWidget()) are seen
+        self.adl_widgets = collections.ChainMap({"cartesian plot": cartesian}, symbols.adl_widgets)
+        self.resolver = output_handler.DISPLAY_PATH_RESOLVER
+        self.writer = output_handler.Widget2Pydm(find_stylesheet, adl_widgets=self.adl_widgets)
+        self._variants = {self.use_scatterplot: self}
+
+    def __getstate__(self):
+        # sent to worker processes: they make their own session
+        return dict(
+            use_scatterplot=self.use_scatterplot,
+            cache=None if self.cache is None else (self.cache.path, self.cache.max_bytes),
+            store=None if self.store is None else (self.store.path, self.store.max_bytes),
+            find_stylesheet=self.find_stylesheet,
+            reader=self.reader,
+        )
+
+    def __setstate__(self, state):
+        from . import cache as adl_cache
+
+        if state["cache"] is not None:
+            state["cache"] = adl_cache.ParseCache(*state["cache"])
+        if state["store"] is not None:
+            state["store"] = adl_cache.UiStore(*state["store"])
+        self.__init__(**state)
+
+    @property
+    def options(self):
+        """options (beyond the .adl file content) that change the .ui files"""
+        return dict(use_scatterplot=self.use_scatterplot)
+
+    def withOptions(self, use_scatterplot=None):
+        """This session, or one like it with other options (None: leave as is)."""
+        if use_scatterplot is None:
+            return self
+        use_scatterplot = bool(use_scatterplot)
+        if use_scatterplot not in self._variants:
+            variant = ConversionSession(use_scatterplot, self.cache, self.store, self.find_stylesheet, self.reader)
+            variant._variants = self._variants  # shared by all variants
+            self._variants[use_scatterplot] = variant
+        return self._variants[use_scatterplot]
+
+    def reset(self, stats=None):
+        """Make ready for the next screen, time it with ``stats`` (if given)."""
+        self.writer.stats = stats or adl_stats.NO_STATS
+        self.writer.reset()
+
+    def parse(self, adl_filename, stats=None):
+        """Read and parse ``adl_filename``, return the screen (``MedmMainWidget``)."""
+        stats = stats or adl_stats.NO_STATS
+        if self.cache is not None:
+            with stats.phase("read"):
+                return self.cache.parse(adl_filename)
+        screen = adl_parser.MedmMainWidget(adl_filename)
+        if self.reader == "mmap":
+            with stats.phase("read"):
+                buf = screen.mapAdlFile(adl_filename)
+            with buf:
+                self._parseLines(screen, buf, stats)
+        else:
+            with stats.phase("read"):
+                buf = screen.getAdlLines(adl_filename)
+            self._parseLines(screen, buf, stats)
+        return screen
+
+    def _parseLines(self, screen, buf, stats):
+        with stats.phase("block scan"):
+            tree = adl_parser.tokenizeAdlBuffer(buf)
+        with stats.phase("widget parse"):
+            screen.parseAdlTree(buf, tree)
+
+    def writeScreen(self, screen, output_path, stats=None):
+        """Write the .ui file of a parsed ``screen`` into ``output_path``, return its name."""
+        self.reset(stats)
+        return self.writer.write_ui(screen, output_path)
+
+    def convertScreen(self, screen):
+        """Convert a parsed ``screen``, return the .ui content (str)."""
+        self.reset()
+        self.writer.write_ui(screen, None)
+        return self.writer.writer.generate_ui_contents()
+
+    def _streamFile(self, adl_filename, output_path, stats=None):
+        """write the .ui file while parsing ``adl_filename``, return its name"""
+        if not pathlib.Path(adl_filename).exists():
+            raise ValueError("Could not find file: " + str(adl_filename))
+        screen = adl_parser.MedmMainWidget(adl_filename)
+        self.reset(stats)
+        # brutal: simply discard any non-utf8 characters (as getAdlLines())
+        with open(adl_filename, "r", encoding="utf8", errors="ignore") as fp:
+            return self.writer.write_ui(screen, output_path, widgets=screen.iter_widgets(fp))
+
+    def convertFile(self, adl_filename, output_path=None, stats=None, screen=None):
+        """
+        Convert one .adl file, write the .ui file into ``output_path`` (created if needed).
+
+        With the session's ``store``, copy the .ui file from there if an
+        identical .adl file was converted before.  If ``stats`` (a
+        ``stats.ConversionStats``) is given, time the phases there.
+        ``screen`` is the file already parsed (by ``parse()``), if it was.
+        Returns the name of the .ui file.
+        """
+        stats = stats or adl_stats.NO_STATS
+        output_path = output_path or str(pathlib.Path(adl_filename).parent)
+        pathlib.Path(output_path).mkdir(parents=True, exist_ok=True)
+
+        key = None
+        if self.store is not None:
+            adl_path = pathlib.Path(adl_filename)
+            if not adl_path.exists():
+                raise ValueError("Could not find file: " + str(adl_filename))
+            with stats.phase("read"):
+                key = self.store.key(adl_path.read_bytes(), adl_path.stem, **self.options)
+                found = self.store.lookup(key)
+            if found is not None:
+                ui_name, content = found
+                ui_filename = str(pathlib.Path(output_path) / ui_name)
+                with stats.phase("write"), adl_stats.openNewFile(ui_filename, "wb") as fp:
+                    fp.write(content)
+                stats.ui_filename = ui_filename
+                return ui_filename
+
+        if screen is not None:
+            ui_filename = self.writeScreen(screen, output_path, stats)
+        elif self.cache is None and self.reader == "stream":
+            ui_filename = self._streamFile(adl_filename, output_path, stats)
+        else:
+            screen = self.parse(adl_filename, stats)
+            ui_filename = self.writeScreen(screen, output_path, stats)
+        stats.ui_filename = ui_filename
+        if key is not None:
+            self.store.store(key, pathlib.Path(ui_filename).name, pathlib.Path(ui_filename).read_bytes())
+        return ui_filename
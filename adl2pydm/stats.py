@@ -0,0 +1,183 @@
+"""
+Time the phases of each conversion, report them as JSON (``--stats FILE``).
+
+Only rely on packages in this project or from the standard Python distribution.
+
+Phases of one conversion:
+
+* read: read the .adl file (with ``--cache``: also the cache lookup and,
+  on a miss, the parse)
+* block scan: tokenize the lines into a tree of blocks
+* widget parse: build the widgets from the tree
+* xml build: build the .ui XML elements, also timed by widget type
+  (exclusive of any child widgets)
+* serialize: format the XML
+* write: open, write and close the .ui file
+"""
+
+import contextlib
+import json
+import os
+import time
+
+from . import __version__
+
+
+PHASES = ("read", "block scan", "widget parse", "xml build", "serialize", "write")
+
+
+def openNewFile(fname, mode="w"):
+    """
+    Open file ``fname`` to write it as a new file.
+
+    An existing file is removed first: it may be a hard link to another
+    .ui file (``--dedup``), which must not be rewritten too.
+    """
+    try:
+        os.remove(fname)
+    except FileNotFoundError:
+        pass
+    return open(fname, mode)
+
+
+class _TimedFile(object):
+    """text file wrapper: count the time spent in write()"""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.seconds = 0.0
+
+    def write(self, text):
+        t0 = time.perf_counter()
+        n = self.fp.write(text)
+        self.seconds += time.perf_counter() - t0
+        return n
+
+
+class ConversionStats(object):
+    """timings of the conversion of one .adl file"""
+
+    def __init__(self, adl_filename=None):
+        self.adl_filename = adl_filename
+        self.ui_filename = None
+        self.error = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.handlers = {}  # widget symbol: [count, seconds]
+        self._nested = []  # time of child widgets, by level of nesting
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - t0
+
+    @contextlib.contextmanager
+    def handler(self, block):
+        """time writing ``block``, without the time of its child widgets"""
+        self._nested.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            children = self._nested.pop()
+            if len(self._nested) > 0:
+                self._nested[-1] += elapsed
+            entry = self.handlers.setdefault(block.symbol, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed - children
+
+    def serializeTo(self, fname, serializer):
+        """
+        Call ``serializer(fp)`` to write text file ``fname``.
+
+        Time spent in file operations is "write", the rest is "serialize".
+        """
+        t0 = time.perf_counter()
+        fp = openNewFile(fname)
+        opened = time.perf_counter()
+        timed = _TimedFile(fp)
+        try:
+            serializer(timed)
+        finally:
+            t1 = time.perf_counter()
+            fp.close()
+            t2 = time.perf_counter()
+        write = (opened - t0) + timed.seconds + (t2 - t1)
+        self.phases["write"] += write
+        self.phases["serialize"] += (t2 - t0) - write
+
+    def asdict(self):
+        return dict(
+            adl_file=self.adl_filename,
+            ui_file=self.ui_filename,
+            error=self.error,
+            seconds=sum(self.phases.values()),
+            phases=dict(self.phases),
+            handlers={k: dict(count=v[0], seconds=v[1]) for k, v in sorted(self.handlers.items())},
+        )
+
+
+class _NoStats(object):
+    """stand-in for ``ConversionStats`` when nothing is timed"""
+
+    _nothing = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._nothing
+
+    def handler(self, block):
+        return self._nothing
+
+    def serializeTo(self, fname, serializer):
+        with openNewFile(fname) as fp:
+            serializer(fp)
+
+
+NO_STATS = _NoStats()
+
+
+class RunStats(object):
+    """timings of all conversions in a run, with totals"""
+
+    def __init__(self):
+        self.files = []  # ConversionStats.asdict() of each file
+        self.deduplicated = None  # with --dedup: counts of files and duplicates
+
+    def add(self, file_stats):
+        """Add ``ConversionStats`` (or its ``asdict()``)."""
+        if isinstance(file_stats, ConversionStats):
+            file_stats = file_stats.asdict()
+        self.files.append(file_stats)
+
+    def totals(self):
+        phases = dict.fromkeys(PHASES, 0.0)
+        handlers = {}
+        for entry in self.files:
+            for k, v in entry["phases"].items():
+                phases[k] += v
+            for k, v in entry["handlers"].items():
+                total = handlers.setdefault(k, dict(count=0, seconds=0.0))
+                total["count"] += v["count"]
+                total["seconds"] += v["seconds"]
+        return dict(
+            files=len(self.files),
+            errors=sum(1 for entry in self.files if entry["error"] is not None),
+            seconds=sum(phases.values()),
+            phases=phases,
+            handlers=dict(sorted(handlers.items())),
+        )
+
+    def report(self):
+        report = dict(adl2pydm=__version__, files=self.files, total=self.totals())
+        if self.deduplicated is not None:
+            report["deduplicated"] = self.deduplicated
+        return report
+
+    def dump(self, fname):
+        """Write the report as JSON to file ``fname``."""
+        with open(fname, "w") as fp:
+            json.dump(self.report(), fp, indent=2)
+            fp.write("\n")
@@ -135,3 +135,30 @@ pydm_widgets = dict(
     PyDMSymbol=PyDM_CustomWidget("PyDMSymbol", "QWidget", "pydm.widgets.symbol"),
     PyDMWaveformTable=PyDM_CustomWidget("PyDMWaveformTable", "QTableWidget", "pydm.widgets.waveformtable"),
 )
+
+
+def _ancestors(cls, widgets):
+    """PyDM classes that ``cls`` extends, nearest first"""
+    chain = []
+    item = widgets.get(cls)
+    while item is not None and item.extends.startswith("PyDM") and item.extends not in chain + [cls]:
+        chain.append(item.extends)
+        item = widgets.get(item.extends)
+    return tuple(chain)
+
+
+def update_pydm_widget_ancestors():
+    """Recompute ``pydm_widget_ancestors``, call after changing ``pydm_widgets``."""
+    global pydm_widget_ancestors
+    pydm_widget_ancestors = {cls: _ancestors(cls, pydm_widgets) for cls in pydm_widgets}
+
+
+def register_pydm_widget(cls, extends, header):
+    """Add (or replace) a PyDM custom widget, update the table of ancestors."""
+    pydm_widgets[cls] = PyDM_CustomWidget(cls, extends, header)
+    update_pydm_widget_ancestors()
+
+
+# PyDM classes each custom widget extends (example: PyDMDrawingPie extends PyDMDrawingArc)
+pydm_widget_ancestors = {}
+update_pydm_widget_ancestors()
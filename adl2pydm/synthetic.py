@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+"""
+Write synthetic MEDM .adl screens of any size, to test the conversion at scale.
+
+Only rely on packages in this project or from the standard Python distribution.
+
+The screens use all the widget types of ``symbols.adl_widgets`` in turn.
+MEDM writes an 'embedded display' as a ``composite`` with a
+``"composite file"``, so does this module.  Size and shape::
+
+    widgets
+        number of widgets (not counting the children of composites)
+    depth
+        the widgets are inside this many nested composites
+    colors
+        number of colors in the color map
+    points
+        number of points of each polyline and polygon
+    entries
+        number of ``display[n]``, ``command[n]``, ``trace[n]`` and ``pen[n]``
+        blocks of each related display, shell command, cartesian plot
+        and strip chart
+    macros
+        number of macros in each channel name, such as ``$(P)$(R)``
+
+EXAMPLE::
+
+    adl2pydm-synthetic big.adl --widgets 20000 --depth 10 --points 100
+"""
+
+import argparse
+import math
+import sys
+
+from . import symbols
+
+
+WIDGET_TYPES = tuple(symbols.adl_widgets)
+DEFAULT_SCREEN = dict(widgets=100, depth=0, colors=65, points=4, entries=2, macros=2)
+CELL_WIDTH = 120  # each widget is placed in a cell of this grid
+CELL_HEIGHT = 40
+
+
+def _quoted(symbol):
+    return f'"{symbol}"' if " " in symbol else symbol
+
+
+def _render(symbol, items, level):
+    """generate the lines of a block, ``items`` are 'key=value' or (symbol, items)"""
+    indent = "\t" * level
+    yield f"{indent}{_quoted(symbol)} {{\n"
+    for item in items:
+        if isinstance(item, tuple):
+            yield from _render(*item, level + 1)
+        else:
+            yield f"{indent}\t{item}\n"
+    yield f"{indent}}}\n"
+
+
+class _Screen(object):
+    """make the blocks of one synthetic screen"""
+
+    def __init__(self, widgets, depth, colors, points, entries, macros, types=WIDGET_TYPES):
+        self.widgets = widgets
+        self.depth = depth
+        self.colors = max(2, colors)
+        self.points = max(2, points)
+        self.entries = entries
+        names = ["P", "R"] + [f"M{i}" for i in range(2, macros)]
+        self.prefix = "".join(f"$({name})" for name in names[:macros])
+        unknown = [t for t in types if t not in symbols.adl_widgets]
+        if len(unknown) > 0:
+            raise ValueError(f"unknown widget type(s): {', '.join(unknown)}")
+        self.types = list(types)
+        self.columns = max(1, math.ceil(math.sqrt(widgets)))
+
+    def clr(self, i):
+        return f"clr={i % self.colors}"
+
+    def bclr(self, i):
+        return f"bclr={(i + 3) % self.colors}"
+
+    def chan(self, i, field="VAL"):
+        return f'chan="{self.prefix}pv{i}.{field}"'
+
+    def object(self, i, width=CELL_WIDTH - 10, height=CELL_HEIGHT - 10):
+        x = CELL_WIDTH * (i % self.columns)
+        y = CELL_HEIGHT * (i // self.columns)
+        return ("object", [f"x={x}", f"y={y}", f"width={width}", f"height={height}"])
+
+    def monitor(self, i):
+        return ("monitor", [self.chan(i), self.clr(i), self.bclr(i)])
+
+    def control(self, i):
+        return ("control", [self.chan(i), self.clr(i), self.bclr(i)])
+
+    def attributes(self, i):
+        return [
+            ("basic attribute", [self.clr(i), 'fill="outline"', "width=2"]),
+            ("dynamic attribute", ['clr="alarm"', 'vis="calc"', 'calc="A>0"', self.chan(i)]),
+        ]
+
+    def pointList(self, i):
+        x = CELL_WIDTH * (i % self.columns)
+        y = CELL_HEIGHT * (i // self.columns)
+        return [f"({x + k % (CELL_WIDTH - 10)},{y + (k * 7) % (CELL_HEIGHT - 10)})" for k in range(self.points)]
+
+    def widget(self, i, symbol):
+        """(symbol, items) of widget number ``i``"""
+        items = [self.object(i)]
+        if symbol in ("arc", "oval", "rectangle", "polygon", "polyline"):
+            items += self.attributes(i)
+            if symbol == "arc":
+                items += ["begin=0", "path=11520"]
+            elif symbol in ("polygon", "polyline"):
+                items.append(("points", self.pointList(i)))
+        elif symbol in ("bar", "byte", "indicator", "meter", "text update"):
+            items.append(self.monitor(i))
+            if symbol == "byte":
+                items += ["sbit=15", "ebit=0"]
+            else:
+                items.append(("limits", []))
+            if symbol == "text update":
+                items.append('align="horiz. centered"')
+        elif symbol in ("choice button", "menu", "message button", "text entry", "valuator", "wheel switch"):
+            items.append(self.control(i))
+            if symbol == "message button":
+                items += [f'label="press {i}"', 'press_msg="1"']
+            elif symbol in ("text entry", "valuator", "wheel switch"):
+                items.append(("limits", []))
+        elif symbol == "text":
+            items += self.attributes(i)[:1]
+            items += [f'textix="text {i}"', 'align="horiz. centered"']
+        elif symbol == "image":
+            items += ['type="gif"', f'"image name"="image{i}.gif"']
+        elif symbol == "cartesian plot":
+            items.append(("plotcom", [f'title="plot {i}"', self.clr(i), self.bclr(i)]))
+            items += ['style="line"', 'count="100"']
+            for k in range(self.entries):
+                trace = [f'xdata="{self.prefix}x{i}_{k}"', f'ydata="{self.prefix}y{i}_{k}"']
+                trace.append(f"data_clr={k % self.colors}")
+                items.append((f"trace[{k}]", trace))
+            items += [("x_axis", ['rangeStyle="auto-scale"']), ("y1_axis", ['rangeStyle="auto-scale"'])]
+        elif symbol == "strip chart":
+            items.append(("plotcom", [f'title="chart {i}"', self.clr(i), self.bclr(i)]))
+            for k in range(self.entries):
+                items.append((f"pen[{k}]", [self.chan(i, f"P{k}"), self.clr(k), ("limits", [])]))
+        elif symbol == "related display":
+            for k in range(self.entries):
+                args = f"P={self.prefix},N={k}"
+                items.append((f"display[{k}]", [f'label="screen {k}"', f'name="screen{k}.adl"', f'args="{args}"']))
+            items += [self.clr(i), self.bclr(i)]
+        elif symbol == "shell command":
+            for k in range(self.entries):
+                command = [f'label="command {k}"', f'name="echo {k}"', f'args="{self.prefix}"']
+                items.append((f"command[{k}]", command))
+            items += [self.clr(i), self.bclr(i)]
+        elif symbol == "embedded display":
+            symbol = "composite"
+            items += ['"composite name"=""', f'"composite file"="embedded{i}.adl;P={self.prefix}"']
+        elif symbol == "composite":
+            children = [self.widget(i, "text"), self.widget(i, "rectangle")]
+            items += ['"composite name"=""', ("children", children)]
+        return symbol, items
+
+    def header(self):
+        rows = math.ceil(self.widgets / self.columns)
+        width, height = CELL_WIDTH * self.columns, CELL_HEIGHT * max(1, rows)
+        colors = [f"{(k * 0x0A0B0C) & 0xFFFFFF:06x}," for k in range(self.colors)]
+        return [
+            ("file", ['name="synthetic.adl"', "version=030117"]),
+            ("display", [self.object(0, width, height), "clr=14", "bclr=4", 'cmap=""']),
+            ("color map", [f"ncolors={self.colors}", ("colors", colors)]),
+        ]
+
+    def lines(self):
+        for symbol, items in self.header():
+            yield from _render(symbol, items, 0)
+        # the nested composites, then the widgets in the innermost one
+        for level in range(self.depth):
+            label = self.widget(level, "text")
+            indent = "\t" * (2 * level)
+            yield f"{indent}composite {{\n"
+            yield from _render(*self.object(0), 2 * level + 1)
+            yield f'{indent}\t"composite name"=""\n'
+            yield f"{indent}\tchildren {{\n"
+            yield from _render(*label, 2 * level + 2)
+        for i in range(self.widgets):
+            yield from _render(*self.widget(i, self.types[i % len(self.types)]), 2 * self.depth)
+        for level in reversed(range(self.depth)):
+            indent = "\t" * (2 * level)
+            yield f"{indent}\t}}\n"
+            yield f"{indent}}}\n"
+
+
+def syntheticLines(types=WIDGET_TYPES, **screen):
+    """
+    Generate the lines of a synthetic .adl screen.
+
+    ``screen`` may have the keys of ``DEFAULT_SCREEN``.  ``types`` are
+    the widget types to use (in turn).
+    """
+    unknown = set(screen) - set(DEFAULT_SCREEN)
+    if len(unknown) > 0:
+        raise TypeError(f"unknown screen parameter(s): {', '.join(sorted(unknown))}")
+    return _Screen(types=types, **dict(DEFAULT_SCREEN, **screen)).lines()
+
+
+def syntheticScreen(types=WIDGET_TYPES, **screen):
+    """Text of a synthetic .adl screen, see ``syntheticLines()``."""
+    return "".join(syntheticLines(types=types, **screen))
+
+
+def writeSyntheticScreen(fname, types=WIDGET_TYPES, **screen):
+    """Write a synthetic .adl screen to file ``fname``, see ``syntheticLines()``."""
+    with open(fname, "w") as fp:
+        fp.writelines(syntheticLines(types=types, **screen))
+
+
+def get_user_parameters():
+    doc = __doc__.strip().splitlines()[0]
+    parser = argparse.ArgumentParser(prog="adl2pydm-synthetic", description=doc)
+
+    msg = "the .adl file to write, '-': write to stdout"
+    parser.add_argument("adlfile", action="store", help=msg)
+
+    for name, msg in [
+        ("widgets", "number of widgets"),
+        ("depth", "number of nested composites around the widgets"),
+        ("colors", "number of colors in the color map"),
+        ("points", "points of each polyline and polygon"),
+        ("entries", "display[n], command[n], trace[n] and pen[n] blocks of each widget that has them"),
+        ("macros", "macros in each channel name"),
+    ]:
+        default = DEFAULT_SCREEN[name]
+        parser.add_argument(
+            f"--{name}", action="store", dest=name, type=int, help=f"{msg}, default: {default}", default=default
+        )
+
+    msg = "widget types to use (separated by ','), default: all"
+    parser.add_argument("--types", action="store", dest="types", help=msg, default=None)
+
+    return parser.parse_args()
+
+
+def main():
+    options = get_user_parameters()
+    types = WIDGET_TYPES
+    if options.types is not None:
+        types = [t.strip() for t in options.types.split(",") if len(t.strip()) > 0]
+    screen = {k: getattr(options, k) for k in DEFAULT_SCREEN}
+    if options.adlfile == "-":
+        sys.stdout.writelines(syntheticLines(types=types, **screen))
+    else:
+        writeSyntheticScreen(options.adlfile, types=types, **screen)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,15 @@ def convertAdlFile(adlname, temppath):
     return uiname
 
 
+def expectedUi(adlname):
+    """.ui content of MEDM screen ``adlname``, converted alone (no session)"""
+    screen = adl_parser.MedmMainWidget(str(MEDM_SCREEN_DIR / adlname))
+    screen.parseAdlBuffer(screen.getAdlLines())
+    writer = output_handler.Widget2Pydm()
+    writer.write_ui(screen, None)
+    return writer.writer.generate_ui_contents()
+
+
 def getNamedProperty(parent, propName):
     properties = parent.findall("property")
     # assert len(properties) > 0
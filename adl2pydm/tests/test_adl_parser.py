@@ -658,3 +658,132 @@ def test_parse_medm_userArrayCalc():
     _core.assertIsInstance(control, dict)
     _core.assertEqual(len(control), 1)
     assertEqualDictKeyValue(control, "chan", "$(P)$(C).AA")
+
+
+@pytest.mark.parametrize("test_file", _core.ALL_EXAMPLE_FILES)
+def test_tokenize_matches_locate(test_file):
+    if not test_file.endswith(".adl"):
+        return
+    screen = adl_parser.MedmMainWidget()
+    buf = screen.getAdlLines(_core.MEDM_SCREEN_DIR / test_file)
+    root = adl_parser.tokenizeAdlBuffer(buf)
+
+    def compare(node, sub):
+        blocks = screen.locateBlocks(sub)
+        _core.assertEqual(dict(node.assignments), dict(screen.locateAssignments(sub)))
+        _core.assertEqual(len(node.blocks), len(blocks))
+        offset = node.start + 1
+        for block, expected in zip(node.blocks, blocks):
+            _core.assertEqual(block.symbol, expected.symbol)
+            _core.assertEqual(block.start - offset, expected.start)
+            _core.assertEqual(block.end - offset, expected.end)
+            compare(block, block.lines(buf))
+
+    compare(root, buf)
+
+
+def test_buffer_view():
+    buf = [f"line {i}\n" for i in range(10)]
+    view = adl_parser.BufferView(buf, 2, 8)
+    _core.assertEqual(len(view), 6)
+    _core.assertEqual(list(view), buf[2:8])
+    _core.assertEqual(view[0], buf[2])
+    _core.assertEqual(view[-1], buf[7])
+    _core.assertEqual(view.text(), "".join(buf[2:8]))
+
+    sub = view[1:4]
+    _core.assertIsInstance(sub, adl_parser.BufferView)
+    _core.assertTrue(sub.buffer is buf)  # no copy of the lines
+    _core.assertEqual(list(sub), buf[3:6])
+
+    with pytest.raises(IndexError):
+        view[6]
+
+
+def test_parse_buffer_view():
+    screen = adl_parser.MedmMainWidget()
+    buf = screen.getAdlLines(_core.MEDM_SCREEN_DIR / "ADBase-R3-3-1.adl")
+    root = adl_parser.tokenizeAdlBuffer(buf)
+    block = root.blocks[-1]  # last widget in the file
+
+    widget = adl_parser.MedmGenericWidget(0, screen, block.symbol)
+    screen.color_table = [adl_parser.Color(0, 0, 0)] * 65
+    widget.parseAdlBuffer(block.lines(buf))
+    _core.assertIsNotNone(widget.geometry)
+
+    view = block.lines(buf)
+    _core.assertEqual(
+        [b.symbol for b in screen.locateBlocks(view)],
+        [b.symbol for b in block.blocks],
+    )
+    _core.assertEqual(dict(screen.locateAssignments(view)), dict(block.assignments))
+
+
+def test_iter_widgets():
+    full_name = _core.MEDM_SCREEN_DIR / "std-R3-5-ID_ctrl.adl"
+    expected = parseFile(full_name.name)
+
+    screen = adl_parser.MedmMainWidget(str(full_name))
+    with open(full_name, "r") as fp:
+        widgets = list(screen.iter_widgets(fp))
+    _core.assertEqual(len(widgets), len(expected.widgets))
+    for w, e in zip(widgets, expected.widgets):
+        _core.assertEqual(w.symbol, e.symbol)
+        _core.assertEqual(w.line_offset, e.line_offset)
+        _core.assertEqual(w.geometry, e.geometry)
+        _core.assertEqual(w.contents, e.contents)
+    _core.assertEqual(screen.geometry, expected.geometry)
+    _core.assertEqual(screen.color_table, expected.color_table)
+    _core.assertEqual(screen.adl_version, expected.adl_version)
+
+
+def test_compact_widgets():
+    screen = parseFile("std-R3-5-ID_ctrl.adl")
+
+    def walk(widgets):
+        for w in widgets:
+            yield w
+            yield from walk(getattr(w, "widgets", []))
+
+    widgets = list(walk(screen.widgets))
+    assert len(widgets) > 0
+    for w in widgets:
+        assert not hasattr(w, "__dict__"), w.symbol
+    # the main widget keeps arbitrary display attributes
+    assert hasattr(screen, "__dict__")
+
+    # a repeated value is one string, attribute blocks are plain dicts
+    values = {}
+    for w in widgets:
+        for k, v in w.contents.items():
+            if isinstance(v, str):
+                assert values.setdefault(v, v) is v, k
+            elif isinstance(v, dict):
+                assert type(v) is dict, k
+    assert len(values) > 0
+
+
+@pytest.mark.parametrize("test_file", _core.ALL_EXAMPLE_FILES)
+def test_mapped_adl_file(test_file):
+    if not test_file.endswith(".adl"):
+        return
+    screen = adl_parser.MedmMainWidget()
+    lines = screen.getAdlLines(_core.MEDM_SCREEN_DIR / test_file)
+    with screen.mapAdlFile() as buf:
+        _core.assertEqual(len(buf), len(lines))
+        _core.assertEqual(list(buf), lines)
+        _core.assertEqual(list(buf.iterItems()), list(adl_parser.iterAdlItems(lines)))
+
+
+def test_mapped_adl_file_universal_newlines(tempdir):
+    text = (_core.MEDM_SCREEN_DIR / "rectangle.adl").read_text()
+    fname = pathlib.Path(tempdir) / "rectangle.adl"
+    fname.write_bytes(text.replace("\n", "\r\n").encode())
+
+    expected = parseFile("rectangle.adl")
+    screen = adl_parser.MedmMainWidget(str(fname))
+    with screen.mapAdlFile() as buf:
+        _core.assertIsNone(buf.mm)  # read as text
+        screen.parseAdlBuffer(buf)
+    _core.assertEqual(len(screen.widgets), len(expected.widgets))
+    _core.assertEqual(screen.widgets[0].contents, expected.widgets[0].contents)
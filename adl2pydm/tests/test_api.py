@@ -0,0 +1,57 @@
+import builtins
+import os
+import pathlib
+import pytest
+
+from .. import api
+from .. import symbols
+
+from . import _core
+
+
+def forbid_file_access(monkeypatch):
+    def forbidden(*args, **kwargs):
+        raise AssertionError(f"file access: {args}")
+
+    for obj, name in [
+        (builtins, "open"),
+        (os, "stat"),
+        (os, "listdir"),
+        (os, "scandir"),
+        (pathlib.Path, "exists"),
+    ]:
+        monkeypatch.setattr(obj, name, forbidden)
+
+
+@pytest.mark.parametrize("test_file", _core.ALL_EXAMPLE_FILES)
+def test_convert_bytes(test_file, monkeypatch):
+    if not test_file.endswith(".adl"):
+        return
+    full_name = _core.MEDM_SCREEN_DIR / test_file
+    data = full_name.read_bytes()
+    expected = _core.expectedUi(test_file)
+
+    with monkeypatch.context() as m:
+        forbid_file_access(m)
+        result = api.convert_bytes(data, name=test_file)
+    _core.assertEqual(result, expected)
+
+
+def test_convert_string(monkeypatch):
+    adlname = "userArrayCalcPlot.adl"
+    text = (_core.MEDM_SCREEN_DIR / adlname).read_text()
+    expected = _core.expectedUi(adlname)
+
+    with monkeypatch.context() as m:
+        forbid_file_access(m)
+        # any line endings
+        _core.assertEqual(api.convert_string(text, name=adlname), expected)
+        _core.assertEqual(api.convert_string(text.replace("\n", "\r\n"), name=adlname), expected)
+
+        scatter = api.convert_string(text, name=adlname, use_scatterplot=True)
+        assert "PyDMScatterPlot" in scatter
+        assert "PyDMScatterPlot" not in expected
+        assert symbols.adl_widgets["cartesian plot"]["pydm_widget"] == "PyDMWaveformPlot"
+
+        # default window title
+        assert "<string>screen</string>" in api.convert_string(text)
@@ -0,0 +1,81 @@
+import pathlib
+import pytest
+
+from ._core import tempdir
+from .. import benchmark
+
+from . import _core
+
+
+def test_corpus_file(tempdir):
+    adlfile = str(_core.MEDM_SCREEN_DIR / "slider.adl")
+    assert adlfile in benchmark.corpusFiles()
+
+    result = benchmark.benchmarkFile(adlfile, repeat=1, output_path=tempdir)
+    assert result["widgets"] > 0
+    for step in ("parse", "write", "convert"):
+        assert result[step] > 0
+    assert result["peak_bytes"] > 0
+    assert 0 < result["retained_bytes"] < result["peak_bytes"]
+    assert (pathlib.Path(tempdir) / "slider.ui").exists()
+
+
+def test_scaling():
+    assert benchmark.loglogSlope([1, 2, 4, 8], [3, 6, 12, 24]) == pytest.approx(1)
+    assert benchmark.loglogSlope([1, 2, 4, 8], [1, 4, 16, 64]) == pytest.approx(2)
+
+    result = benchmark.benchmarkScaling("widgets", (10, 20), repeat=1)
+    assert result["sizes"] == [10, 20]
+    assert len(result["parse"]) == len(result["convert"]) == 2
+
+
+def test_history(tempdir):
+    fname = pathlib.Path(tempdir) / "history.json"
+    assert benchmark.readHistory(fname) == []
+
+    def run(parse, slope):
+        scaling = dict(parse_slope=slope, superlinear=slope > benchmark.MAX_SCALING_SLOPE)
+        corpus = dict(parse=parse, write=0.1, convert=0.2)
+        return dict(corpus={"a.adl": corpus}, scaling={"widgets": scaling})
+
+    benchmark.appendHistory(fname, run(0.1, 1.0))
+    history = benchmark.appendHistory(fname, run(0.1, 1.0))
+    assert len(benchmark.readHistory(fname)) == 2
+    assert benchmark.compareRuns(history[0], history[1]) == []
+
+    messages = benchmark.compareRuns(history[0], run(0.2, 2.0))
+    assert len(messages) == 2
+    assert messages[0].startswith("a.adl parse")
+    assert "super-linearly with widgets" in messages[1]
+
+    bigger = run(0.1, 1.0)
+    history[1]["corpus"]["a.adl"]["retained_bytes"] = 1000
+    bigger["corpus"]["a.adl"]["retained_bytes"] = 2000
+    messages = benchmark.compareRuns(history[1], bigger)
+    assert len(messages) == 1
+    assert messages[0].startswith("a.adl retained memory")
+
+
+def test_missing_corpus(tempdir, monkeypatch):
+    # as installed: the bundled screens are not there
+    monkeypatch.setattr(benchmark, "CORPUS_DIR", pathlib.Path(tempdir))
+    monkeypatch.setattr(benchmark.sys, "argv", ["adl2pydm-benchmark", "--no-synthetic", "--no-calcs"])
+    with pytest.raises(SystemExit) as exc:
+        benchmark.main()
+    assert "--no-corpus" in str(exc.value)
+
+
+def test_missing_calcs(tempdir, monkeypatch):
+    monkeypatch.setattr(benchmark, "CALC_CASES", pathlib.Path(tempdir) / "test_calcs.json")
+    monkeypatch.setattr(benchmark.sys, "argv", ["adl2pydm-benchmark", "--no-synthetic", "--no-corpus"])
+    with pytest.raises(SystemExit) as exc:
+        benchmark.main()
+    assert "--no-calcs" in str(exc.value)
+
+
+def test_calcs():
+    result = benchmark.benchmarkCalcs(repeat=1, rounds=2)
+    assert result["expressions"] > 0
+    assert result["rounds"] == 2
+    assert result["compile"] > 0
+    assert result["cached"] > 0
@@ -0,0 +1,121 @@
+import pathlib
+import pytest
+import shutil
+import sys
+
+from ._core import tempdir
+from .. import cache
+from .. import cli
+from .. import output_handler
+from .. import session
+
+from . import _core
+
+
+def test_content_key():
+    k = cache.content_key(b"data", "1.0", a=1, b=2)
+    assert k == cache.content_key(b"data", "1.0", b=2, a=1)
+    assert k != cache.content_key(b"data", "1.1", a=1, b=2)
+    assert k != cache.content_key(b"data", "1.0", a=1, b=3)
+    assert k != cache.content_key(b"Data", "1.0", a=1, b=2)
+
+
+def test_disk_cache_eviction(tempdir):
+    dc = cache.DiskCache(pathlib.Path(tempdir) / "c", max_bytes=250)
+    assert dc.get("a") is None
+    for key in "abc":
+        dc.put(key, key.encode() * 100)
+    # "a" is the least-recently-used entry
+    assert "a" not in dc
+    assert len(dc) == 2
+    assert dc.get("b") == b"b" * 100
+
+    dc.put("d", b"d" * 100)  # "c" was used less recently than "b"
+    assert "b" in dc
+    assert "c" not in dc
+
+    dc.clear()
+    assert len(dc) == 0
+
+
+@pytest.mark.parametrize("adlname", ["std-R3-5-ID_ctrl.adl", "testDisplay.adl"])
+def test_parse_cache(adlname, tempdir):
+    full_name = _core.MEDM_SCREEN_DIR / adlname
+    pc = cache.ParseCache(pathlib.Path(tempdir) / "cache")
+
+    first = pc.parse(full_name)
+    assert (pc.hits, pc.misses) == (0, 1)
+    second = pc.parse(full_name)
+    assert (pc.hits, pc.misses) == (1, 1)
+    assert second is not first
+    assert len(second.widgets) == len(first.widgets)
+    for w, e in zip(second.widgets, first.widgets):
+        assert (w.symbol, w.line_offset, w.contents) == (e.symbol, e.line_offset, e.contents)
+
+    writer = output_handler.Widget2Pydm()
+    writer.write_ui(first, tempdir)
+    expected = writer.writer.generate_ui_contents()
+    writer = output_handler.Widget2Pydm()
+    writer.write_ui(second, tempdir)
+    assert writer.writer.generate_ui_contents() == expected
+
+    # same content, other name: cache hit, reported with the new name
+    renamed = pathlib.Path(tempdir) / ("copy_" + adlname)
+    shutil.copy(full_name, renamed)
+    third = pc.parse(renamed)
+    assert pc.hits == 2
+    assert third.given_filename == str(renamed)
+
+
+def test_cli_cache(tempdir):
+    full_name = _core.MEDM_SCREEN_DIR / "testDisplay.adl"
+    cache_dir = pathlib.Path(tempdir) / "cache"
+    uiname = pathlib.Path(tempdir) / (full_name.stem + output_handler.SCREEN_FILE_EXTENSION)
+
+    sys.argv = [sys.argv[0], "-d", tempdir, "--cache", str(cache_dir), str(full_name)]
+    cli.main()
+    expected = uiname.read_text()
+    assert len(list(cache_dir.iterdir())) == 1
+
+    uiname.unlink()
+    cli.main()
+    assert uiname.read_text() == expected
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ui_store(jobs, tempdir):
+    src = pathlib.Path(tempdir) / "src"
+    out = pathlib.Path(tempdir) / "out"
+    adlfiles = []
+    for relpath in ["a/motorx.adl", "b/motorx.adl", "c/renamed.adl"]:
+        (src / relpath).parent.mkdir(parents=True)
+        shutil.copy(_core.MEDM_SCREEN_DIR / "motorx-R6-10-1.adl", src / relpath)
+        adlfiles.append(str(src / relpath))
+    store = cache.UiStore(pathlib.Path(tempdir) / "store")
+
+    results = cli.processFiles(adlfiles, str(out), jobs=jobs, input_root=str(src), store=store)
+    assert [pathlib.Path(r).relative_to(out).as_posix() for r in results] == [
+        "a/motorx.ui",
+        "b/motorx.ui",
+        "c/renamed.ui",
+    ]
+    assert (out / "a/motorx.ui").read_text() == (out / "b/motorx.ui").read_text()
+    # the window title comes from the file name
+    assert "<string>renamed</string>" in (out / "c/renamed.ui").read_text()
+    assert len(store) == 2
+
+    # same as converted without the store
+    plain = cli.processFile(adlfiles[0], str(pathlib.Path(tempdir) / "plain"))
+    assert pathlib.Path(plain).read_text() == (out / "b/motorx.ui").read_text()
+
+    store.hits = store.misses = 0
+    cli.processFiles(adlfiles, str(out), input_root=str(src), store=store)
+    assert (store.hits, store.misses) == (3, 0)
+
+    scatter = session.ConversionSession(use_scatterplot=True, store=store)
+    cli.processFile(adlfiles[0], str(out), session=scatter)  # other options: not in the store
+    assert store.misses == 1
+
+    with pytest.raises(ValueError):
+        cli.processFile(str(src / "missing.adl"), str(out), store=store)
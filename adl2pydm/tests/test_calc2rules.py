@@ -1,5 +1,6 @@
 import json
 import pathlib
+import pytest
 
 from .. import calc2rules
 
@@ -20,3 +21,54 @@ def test_example_calcs():
     for testcase in test_calcs:
         rule = calc2rules.convertCalcToRuleExpression(testcase[0])
         assert rule == testcase[-1], testcase[0]
+
+
+def test_tokenize_calc():
+    tokens = list(calc2rules.tokenizeCalc("!(A#1) && ABS(b-1.5e3)?"))
+    assert tokens == [
+        ("other", "!"),
+        ("op", "("),
+        ("name", "A"),
+        ("op", "#"),
+        ("number", "1"),
+        ("op", ")"),
+        ("space", " "),
+        ("op", "&&"),
+        ("space", " "),
+        ("name", "ABS"),
+        ("op", "("),
+        ("name", "b"),
+        ("op", "-"),
+        ("number", "1.5e3"),
+        ("op", ")"),
+        ("other", "?"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "calc",
+    [
+        "E>1",  # no channel for special variable
+        "A>x",  # unknown variable
+        "(A=0",  # unbalanced parentheses
+        "A=0)",
+        "A+=0",  # operator without an operand before it
+        "A|=1",
+        "A&&=B",
+        "=A",
+        "A>=(<B)",
+        "A[0]",  # not MEDM calc
+        "_A",
+    ],
+)
+def test_calc_errors(calc):
+    with pytest.raises(ValueError):
+        calc2rules.convertCalcToRuleExpression(calc)
+
+
+def test_calc_cache():
+    calc2rules.convertCalcToRuleExpression.cache_clear()
+    for _ in range(3):
+        assert calc2rules.convertCalcToRuleExpression("A#0") == "ch[0]!=0"
+    info = calc2rules.convertCalcToRuleExpression.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
@@ -1,10 +1,16 @@
+import json
+import os
 import pathlib
 import pytest
+import shutil
 import sys
 
 from ._core import tempdir
 from .. import cli
+from .. import manifest
 from .. import output_handler
+from .. import stats
+from .. import session
 
 from . import _core
 
@@ -24,3 +30,183 @@ def test_screen_files_can_convert(screen_file, tempdir):
 
     uiname = full_name.stem + output_handler.SCREEN_FILE_EXTENSION
     assert (pathlib.Path(tempdir) / uiname).exists()
+
+
+def test_reader(tempdir):
+    full_name = _core.MEDM_SCREEN_DIR / "testDisplay.adl"
+    uiname = full_name.stem + output_handler.SCREEN_FILE_EXTENSION
+    contents = []
+    for reader in ("lines", "stream", "mmap"):
+        path = pathlib.Path(tempdir) / reader
+        sys.argv = [sys.argv[0], "-d", str(path), "--reader", reader, str(full_name)]
+        cli.main()
+        contents.append((path / uiname).read_text())
+    assert contents[0] == contents[1] == contents[2]
+
+
+def test_jobs(tempdir, caplog):
+    adlnames = ["testDisplay.adl", "std-R3-5-ID_ctrl.adl", "slider.adl", "rectangle.adl"]
+    adlfiles = [str(_core.MEDM_SCREEN_DIR / name) for name in adlnames]
+    serial = pathlib.Path(tempdir) / "serial"
+    parallel = pathlib.Path(tempdir) / "parallel"
+    serial.mkdir()
+    parallel.mkdir()
+
+    missing = str(pathlib.Path(tempdir) / "missing.adl")
+    adlfiles.insert(1, missing)
+    assert cli.processFiles(adlfiles, str(serial)).count(None) == 1
+    serial_messages = [r.getMessage() for r in caplog.records]
+    caplog.clear()
+
+    results = cli.processFiles(adlfiles, str(parallel), jobs=3)
+    assert results[1] is None
+    assert results.count(None) == 1
+    # same messages, in the same (input file) order
+    assert [r.getMessage() for r in caplog.records] == serial_messages
+    assert "missing.adl" in serial_messages[0]
+
+    for name in adlnames:
+        uiname = pathlib.Path(name).stem + output_handler.SCREEN_FILE_EXTENSION
+        assert (parallel / uiname).read_text() == (serial / uiname).read_text()
+
+
+def test_incremental(tempdir):
+    src = pathlib.Path(tempdir) / "src"
+    out = pathlib.Path(tempdir) / "out"
+    src.mkdir()
+    out.mkdir()
+    adlfiles = []
+    for name in ["testDisplay.adl", "slider.adl", "rectangle.adl"]:
+        shutil.copy(_core.MEDM_SCREEN_DIR / name, src / name)
+        adlfiles.append(str(src / name))
+
+    def ui(name):
+        return out / (pathlib.Path(name).stem + output_handler.SCREEN_FILE_EXTENSION)
+
+    assert cli.processFilesIncremental(adlfiles, str(out)) == adlfiles
+    assert (out / manifest.MANIFEST_FILE).exists()
+    assert cli.processFilesIncremental(adlfiles, str(out)) == []
+
+    # touched, not changed
+    os.utime(adlfiles[0], (1, 1))
+    assert cli.processFilesIncremental(adlfiles, str(out)) == []
+
+    # changed
+    with open(adlfiles[1], "a") as fp:
+        fp.write("\n")
+    assert cli.processFilesIncremental(adlfiles, str(out)) == adlfiles[1:2]
+
+    # output removed
+    ui(adlfiles[2]).unlink()
+    assert cli.processFilesIncremental(adlfiles, str(out)) == adlfiles[2:]
+    assert ui(adlfiles[2]).exists()
+
+    # source removed: stale output removed
+    os.remove(adlfiles[0])
+    assert cli.processFilesIncremental(adlfiles[1:], str(out)) == []
+    assert not ui(adlfiles[0]).exists()
+    assert ui(adlfiles[1]).exists()
+
+    # other options: convert again
+    scatter = session.ConversionSession(use_scatterplot=True)
+    assert cli.processFilesIncremental(adlfiles[1:], str(out), session=scatter) == adlfiles[1:]
+
+
+@pytest.mark.parametrize("output_path", ["./out", "out/"])
+def test_incremental_output_name(output_path, tempdir, monkeypatch):
+    monkeypatch.chdir(tempdir)
+    src = pathlib.Path("src")
+    (src / "sub").mkdir(parents=True)
+    for relpath in ["rectangle.adl", "sub/slider.adl"]:
+        shutil.copy(_core.MEDM_SCREEN_DIR / pathlib.Path(relpath).name, src / relpath)
+
+    def convert():
+        return cli.processFilesIncremental(list(cli.findAdlFiles("src/")), output_path, input_root="src/")
+
+    assert len(convert()) == 2
+    with open(src / "rectangle.adl", "a") as fp:
+        fp.write("\n")
+    assert convert() == [os.path.join("src/", "rectangle.adl")]
+    assert convert() == []  # the manifest kept the new content
+
+
+@pytest.mark.parametrize("mirror", [True, False])
+def test_incremental_removed_directory(mirror, tempdir):
+    src = pathlib.Path(tempdir) / "src"
+    out = pathlib.Path(tempdir) / "out" if mirror else src
+    for relpath, name in [("a.adl", "slider.adl"), ("sub/deeper/b.adl", "rectangle.adl")]:
+        (src / relpath).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(_core.MEDM_SCREEN_DIR / name, src / relpath)
+
+    def convert():
+        found = cli.findAdlFiles(str(src))
+        return cli.processFilesIncremental(found, str(out) if mirror else None, input_root=str(src))
+
+    assert len(convert()) == 2
+    stale = out / "sub" / "deeper"
+    assert (stale / "b.ui").exists()
+    assert (stale / manifest.MANIFEST_FILE).exists()
+
+    if mirror:
+        shutil.rmtree(src / "sub")
+    else:
+        os.remove(src / "sub/deeper/b.adl")  # the outputs are in the same directory
+    assert convert() == []
+    assert not (stale / "b.ui").exists()
+    assert not (stale / manifest.MANIFEST_FILE).exists()
+    if mirror:
+        assert not (out / "sub").exists()  # empty output directories removed
+    assert (out / "a.ui").exists()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_recursive(jobs, tempdir):
+    src = pathlib.Path(tempdir) / "opi"
+    out = pathlib.Path(tempdir) / "ui"
+    for relpath, name in [
+        ("a.adl", "testDisplay.adl"),
+        ("sub/b.adl", "slider.adl"),
+        ("sub/deeper/c.adl", "rectangle.adl"),
+        ("sub/old_d.adl", "rectangle.adl"),
+        ("skip/e.adl", "rectangle.adl"),
+        ("sub/notes.txt", "rectangle.adl"),
+    ]:
+        (src / relpath).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(_core.MEDM_SCREEN_DIR / name, src / relpath)
+
+    found = cli.findAdlFiles(str(src), exclude=["skip", "old_*"])
+    assert not isinstance(found, list)
+    expected = ["a.adl", "sub/b.adl", "sub/deeper/c.adl"]
+    assert [pathlib.Path(f).relative_to(src).as_posix() for f in found] == expected
+
+    sys.argv = [sys.argv[0], "-d", str(out), "-r", str(src), "--exclude", "skip"]
+    sys.argv += ["--exclude", "sub/old_*", "-j", str(jobs)]
+    cli.main()
+    written = sorted(p.relative_to(out).as_posix() for p in out.rglob("*.ui"))
+    assert written == ["a.ui", "sub/b.ui", "sub/deeper/c.ui"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_stats(jobs, tempdir):
+    adlfiles = [str(_core.MEDM_SCREEN_DIR / name) for name in ("testDisplay.adl", "slider.adl")]
+    adlfiles.append(str(pathlib.Path(tempdir) / "missing.adl"))
+    stats_file = pathlib.Path(tempdir) / "stats.json"
+
+    sys.argv = [sys.argv[0], "-d", tempdir, "--stats", str(stats_file), "-j", str(jobs)]
+    sys.argv += adlfiles
+    cli.main()
+
+    report = json.loads(stats_file.read_text())
+    assert [f["adl_file"] for f in report["files"]] == adlfiles
+    converted, missing = report["files"][0], report["files"][2]
+    assert converted["error"] is None
+    assert pathlib.Path(converted["ui_file"]).exists()
+    assert sorted(converted["phases"]) == sorted(stats.PHASES)
+    assert all(t > 0 for t in converted["phases"].values())
+    assert converted["handlers"]["cartesian plot"]["count"] > 0
+    assert "Could not find file" in missing["error"]
+
+    total = report["total"]
+    assert (total["files"], total["errors"]) == (3, 1)
+    counts = [f["handlers"].get("text", {}).get("count", 0) for f in report["files"]]
+    assert total["handlers"]["text"]["count"] == sum(counts)
@@ -0,0 +1,118 @@
+import json
+import os
+import pathlib
+import pytest
+import shutil
+import sys
+
+from ._core import tempdir
+from .. import cli
+from .. import dedup
+
+from . import _core
+
+
+def test_duplicate_key(tempdir):
+    original = (_core.MEDM_SCREEN_DIR / "slider.adl").read_bytes()
+    reformatted = b"\r\n\r\n".join(b"  " + line + b" \t" for line in original.splitlines())
+    path = pathlib.Path(tempdir)
+    for relpath, data in [
+        ("a/slider.adl", original),
+        ("b/slider.adl", reformatted),
+        ("c/other.adl", original),  # other window title
+        ("d/slider.adl", original.replace(b"slider", b"Slider")),
+    ]:
+        (path / relpath).parent.mkdir()
+        (path / relpath).write_bytes(data)
+
+    key = dedup.duplicateKey(path / "a/slider.adl")
+    assert dedup.duplicateKey(path / "b/slider.adl") == key
+    assert dedup.duplicateKey(path / "c/other.adl") != key
+    assert dedup.duplicateKey(path / "d/slider.adl") != key
+    assert dedup.duplicateKey(path / "a/slider.adl", use_scatterplot=True) != key
+
+    adlfiles = [str(path / p) for p in ["a/slider.adl", "c/other.adl", "b/slider.adl", "missing.adl"]]
+    groups = dedup.groupDuplicates(adlfiles)
+    assert list(groups.items()) == [
+        (adlfiles[0], [adlfiles[2]]),
+        (adlfiles[1], []),
+        (adlfiles[3], []),
+    ]
+
+
+def test_link_file(tempdir, monkeypatch):
+    source = pathlib.Path(tempdir) / "source.ui"
+    source.write_text("content")
+    target = pathlib.Path(tempdir) / "target.ui"
+    target.write_text("old")
+
+    assert dedup.linkFile(source, source) is None
+    assert dedup.linkFile(source, target) == "hardlink"
+    assert os.path.samefile(source, target)
+
+    def fail(*args):
+        raise OSError("not supported")
+
+    monkeypatch.setattr(os, "link", fail)
+    monkeypatch.setattr(dedup, "_reflink", fail)
+    target.unlink()
+    assert dedup.linkFile(source, target) == "copy"
+    assert target.read_text() == "content"
+    assert not os.path.samefile(source, target)
+    assert sorted(p.name for p in pathlib.Path(tempdir).iterdir()) == ["source.ui", "target.ui"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_dedup(jobs, tempdir):
+    src = pathlib.Path(tempdir) / "src"
+    out = pathlib.Path(tempdir) / "out"
+    for relpath, name in [
+        ("a/motorx.adl", "motorx-R6-10-1.adl"),
+        ("b/motorx.adl", "motorx-R6-10-1.adl"),
+        ("c/motorx.adl", "motorx-R6-10-1.adl"),
+        ("c/slider.adl", "slider.adl"),
+    ]:
+        (src / relpath).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(_core.MEDM_SCREEN_DIR / name, src / relpath)
+    stats_file = pathlib.Path(tempdir) / "stats.json"
+
+    sys.argv = [sys.argv[0], "-d", str(out), "-r", str(src), "--dedup", "-j", str(jobs)]
+    sys.argv += ["--stats", str(stats_file)]
+    cli.main()
+
+    written = sorted(p.relative_to(out).as_posix() for p in out.rglob("*.ui"))
+    assert written == ["a/motorx.ui", "b/motorx.ui", "c/motorx.ui", "c/slider.ui"]
+    assert os.path.samefile(out / "a/motorx.ui", out / "c/motorx.ui")
+    expected = pathlib.Path(cli.processFile(str(src / "b/motorx.adl"), str(pathlib.Path(tempdir) / "plain")))
+    assert (out / "b/motorx.ui").read_text() == expected.read_text()
+
+    report = json.loads(stats_file.read_text())
+    assert report["deduplicated"] == dict(files=4, converted=2, duplicates=2, hardlink=2)
+    assert len(report["files"]) == 2
+
+    # same output directory: nothing to link
+    adlfiles = [str(src / "a/motorx.adl"), str(src / "b/motorx.adl")]
+    results = cli.processFiles(adlfiles, str(pathlib.Path(tempdir) / "flat"), dedup=True)
+    assert results[0] == results[1]
+
+
+def test_dedup_then_edit(tempdir):
+    src = pathlib.Path(tempdir) / "src"
+    out = pathlib.Path(tempdir) / "out"
+    for relpath in ["a/rectangle.adl", "b/rectangle.adl"]:
+        (src / relpath).parent.mkdir(parents=True)
+        shutil.copy(_core.MEDM_SCREEN_DIR / "rectangle.adl", src / relpath)
+    adlfiles = [str(src / "a/rectangle.adl"), str(src / "b/rectangle.adl")]
+    cli.processFiles(adlfiles, str(out), input_root=str(src), dedup=True)
+    assert os.path.samefile(out / "a/rectangle.ui", out / "b/rectangle.ui")
+
+    # no longer duplicates: each output is written, the other one is kept
+    edited = (src / "a/rectangle.adl").read_text().replace("x=96", "x=77", 1)
+    assert edited != (src / "b/rectangle.adl").read_text()
+    (src / "a/rectangle.adl").write_text(edited)
+    cli.processFiles(adlfiles[:1], str(out), input_root=str(src))
+    assert not os.path.samefile(out / "a/rectangle.ui", out / "b/rectangle.ui")
+    for adlfile in adlfiles:
+        relpath = pathlib.Path(adlfile).relative_to(src)
+        expected = cli.processFile(adlfile, str(pathlib.Path(tempdir) / "plain" / relpath.parent))
+        assert (out / relpath.with_suffix(".ui")).read_text() == pathlib.Path(expected).read_text()
@@ -0,0 +1,122 @@
+import pathlib
+import pytest
+import shutil
+import sys
+
+from ._core import tempdir
+from .. import cache
+from .. import cli
+from .. import dependencies
+from .. import output_handler
+from .. import session
+
+from . import _core
+
+
+def test_crawl_corpus():
+    entry = _core.MEDM_SCREEN_DIR / "userArrayCalc.adl"
+    crawler = dependencies.DisplayCrawler(search_path=[])
+    visited = [fname for fname, screen in crawler.crawl([str(entry)])]
+
+    names = [pathlib.Path(f).name for f in visited]
+    assert len(names) == len(set(names))  # each file once
+    assert names[0] == "userArrayCalc.adl"
+    for name in "userArrayCalc_plot.adl userArrayCalcPlot.adl userArrayCalc_small.adl".split():
+        assert name in names
+
+    # userArrayCalc.adl -> userArrayCalc_plot.adl -> userArrayCalc.adl
+    cycles = [[pathlib.Path(f).name for f in cycle] for cycle in crawler.cycles]
+    assert ["userArrayCalc.adl", "userArrayCalc_plot.adl", "userArrayCalc.adl"] in cycles
+    assert set(crawler.graph) == set(visited)
+
+
+def test_search_path(tempdir):
+    top = pathlib.Path(tempdir)
+    (top / "a").mkdir()
+    (top / "b").mkdir()
+    shutil.copy(_core.MEDM_SCREEN_DIR / "relatedDisplayOptions.adl", top / "a")
+    shutil.copy(_core.MEDM_SCREEN_DIR / "relatedDisplayNumber.adl", top / "b")
+    entry = str(top / "a" / "relatedDisplayOptions.adl")
+
+    crawler = dependencies.DisplayCrawler(search_path=[])
+    assert len(list(crawler.crawl([entry]))) == 1
+    assert [name for _f, name in crawler.missing] == ["relatedDisplayNumber.adl"]
+
+    crawler = dependencies.DisplayCrawler(search_path=[str(top / "b")])
+    visited = [f for f, _s in crawler.crawl([entry, entry])]
+    assert [pathlib.Path(f).parent.name for f in visited] == ["a", "b"]
+    assert crawler.missing == []
+    # relatedDisplayNumber.adl refers to itself
+    assert len(crawler.cycles) == 1
+
+    out = top / "ui"
+    sys.argv = [sys.argv[0], "-d", str(out), "--follow", "--search-path", str(top / "b"), entry]
+    cli.main()
+    ext = output_handler.SCREEN_FILE_EXTENSION
+    written = sorted(p.name for p in out.iterdir())
+    assert written == ["relatedDisplayNumber" + ext, "relatedDisplayOptions" + ext]
+
+
+def test_follow_outputs(tempdir, caplog):
+    top = pathlib.Path(tempdir)
+    for relpath, name in [
+        ("a/relatedDisplayOptions.adl", "relatedDisplayOptions.adl"),
+        ("b/relatedDisplayNumber.adl", "relatedDisplayNumber.adl"),
+        ("c/relatedDisplayOptions.adl", "relatedDisplayOptions.adl"),
+    ]:
+        (top / relpath).parent.mkdir(exist_ok=True)
+        shutil.copy(_core.MEDM_SCREEN_DIR / name, top / relpath)
+    entries = [str(top / "a/relatedDisplayOptions.adl"), str(top / "c/relatedDisplayOptions.adl")]
+    ext = output_handler.SCREEN_FILE_EXTENSION
+
+    # no --dir: nothing written into the search path
+    crawler = cli.processDisplayTree(entries[:1], search_path=[str(top / "b")])
+    assert len(crawler.graph) == 2
+    assert (top / "a" / ("relatedDisplayOptions" + ext)).exists()
+    assert not (top / "b" / ("relatedDisplayNumber" + ext)).exists()
+    assert "is in the search path" in caplog.text
+
+    # --dir: same .ui file from two screens, the first one is kept
+    out = top / "ui"
+    cli.processDisplayTree(entries, str(out), search_path=[str(top / "b")])
+    written = sorted(p.name for p in out.iterdir())
+    assert written == ["relatedDisplayNumber" + ext, "relatedDisplayOptions" + ext]
+    assert "same .ui file as " + entries[0] in caplog.text
+
+
+@pytest.mark.parametrize("reader", ["lines", "mmap"])
+def test_follow_session(reader, tempdir, monkeypatch):
+    top = pathlib.Path(tempdir)
+    entry = str(_core.MEDM_SCREEN_DIR / "relatedDisplayOptions.adl")
+    store = cache.UiStore(top / "store")
+    conversion = session.ConversionSession(store=store, reader=reader)
+    parsed = []
+    real_parse = conversion.parse
+
+    def parse(adl_filename, stats=None):
+        parsed.append(adl_filename)
+        return real_parse(adl_filename, stats)
+
+    monkeypatch.setattr(conversion, "parse", parse)
+    crawler = cli.processDisplayTree([entry], str(top / "ui"), search_path=[], session=conversion)
+    assert sorted(parsed) == sorted(crawler.graph)  # each file parsed once
+    assert store.misses == len(crawler.graph)
+
+    store.hits = store.misses = 0
+    cli.processDisplayTree([entry], str(top / "again"), search_path=[], session=conversion)
+    assert (store.hits, store.misses) == (len(crawler.graph), 0)
+
+
+def test_relative_directory(tempdir):
+    top = pathlib.Path(tempdir)
+    (top / "b" / "sub").mkdir(parents=True)
+    shutil.copy(_core.MEDM_SCREEN_DIR / "relatedDisplayNumber.adl", top / "b" / "sub")
+    shutil.copy(_core.MEDM_SCREEN_DIR / "rectangle.adl", top)
+
+    crawler = dependencies.DisplayCrawler(search_path=[str(top / "b")])
+    entry = crawler.resolve(str(top / "rectangle.adl"))
+    found = crawler.resolve("sub/relatedDisplayNumber", entry)
+    assert crawler.relativeDirectory(entry) == "."
+    assert crawler.relativeDirectory(found) == "sub"
+    assert crawler.inSearchPath(found)
+    assert not crawler.inSearchPath(entry)
@@ -1,12 +1,16 @@
+import io
+import os
 import pathlib
 import pytest
 
+from xml.dom import minidom
 from xml.etree import ElementTree
 
 from . import _core
 from ._core import tempdir
 from .. import adl_parser
 from .. import output_handler
+from .. import symbols
 
 
 @pytest.mark.parametrize("test_file", _core.ALL_EXAMPLE_FILES)
@@ -58,6 +62,64 @@ def test_write_extends_customwidget(tempdir):
     assert output_handler.TOP_LEVEL_WIDGET_CLASS in customs
 
 
+def test_customwidgets_order(monkeypatch):
+    registry = dict(symbols.pydm_widgets)
+    for cls, extends in [
+        ("PyDMTestC", "PyDMTestB"),
+        ("PyDMTestB", "PyDMTestA"),
+        ("PyDMTestA", "QWidget"),
+        ("PyDMTestD", "PyDMTestA"),
+    ]:
+        registry[cls] = symbols.PyDM_CustomWidget(cls, extends, "test")
+    monkeypatch.setattr(symbols, "pydm_widgets", registry)
+    symbols.update_pydm_widget_ancestors()
+    try:
+        writer = output_handler.Widget2Pydm()
+        writer.writer = output_handler.PYDM_Writer(None, find_stylesheet=False)
+        root = writer.writer.openFile(None)
+        writer.custom_widgets = ["PyDMTestC", "PyDMLabel", "PyDMDrawingPie", "PyDMTestD"]
+        writer.write_customwidgets(root)
+    finally:
+        monkeypatch.undo()
+        symbols.update_pydm_widget_ancestors()
+
+    # used widgets, top-level widget, then ancestors: nearest first
+    expected = ["PyDMTestC", "PyDMLabel", "PyDMDrawingPie", "PyDMTestD"]
+    expected += [output_handler.TOP_LEVEL_WIDGET_CLASS, "PyDMTestB", "PyDMDrawingArc", "PyDMTestA"]
+    assert writer.custom_widgets == expected
+    customs = [w.find("class").text for w in root.find("customwidgets").findall("customwidget")]
+    assert customs == expected
+
+
+def test_unique_widget_names():
+    writer = output_handler.Widget2Pydm()
+    names = [writer.get_unique_widget_name(n) for n in "text text text_2 text text_1 text arc".split()]
+    assert names == ["text", "text_1", "text_2", "text_3", "text_1_1", "text_4", "arc"]
+
+    writer = output_handler.Widget2Pydm()
+    names = [writer.get_unique_widget_name(n) for n in "a_1 a a a_1 a_02".split()]
+    assert names == ["a_1", "a", "a_2", "a_1_1", "a_02"]
+
+    writer = output_handler.Widget2Pydm()
+    names = [writer.get_unique_widget_name("rectangle") for _ in range(10000)]
+    assert len(set(names)) == len(names)
+    assert writer.unique_widget_names == dict(rectangle=10000)
+
+
+def test_widget_names_for_each_screen(tempdir):
+    def parse(adlname):  # writing changes the screen: parse it for each writer
+        screen = adl_parser.MedmMainWidget(str(_core.MEDM_SCREEN_DIR / adlname))
+        screen.parseAdlBuffer(screen.getAdlLines())
+        return screen
+
+    batch = output_handler.Widget2Pydm()
+    for adlname in ("testDisplay.adl", "slider.adl", "testDisplay.adl"):
+        batch.write_ui(parse(adlname), None)
+        alone = output_handler.Widget2Pydm()
+        alone.write_ui(parse(adlname), None)
+        assert batch.writer.generate_ui_contents() == alone.writer.generate_ui_contents()
+
+
 def test_write_widget_arc(tempdir):
     uiname = _core.convertAdlFile("testDisplay.adl", tempdir)
     full_uiname = pathlib.Path(tempdir) / uiname
@@ -1167,6 +1229,46 @@ def test_openfile_reads_stylesheet_from_pydm_displays_path(tempdir, monkeypatch)
     _core.assertEqual(writer.stylesheet, stylesheet_text)
 
 
+def test_display_path_resolver(tempdir, monkeypatch):
+    displays = pathlib.Path(tempdir) / "displays"
+    other = pathlib.Path(tempdir) / "other"
+    for path in (displays, other):
+        path.mkdir()
+    (displays / output_handler.QT_STYLESHEET_FILE).write_text("first")
+    monkeypatch.setenv(output_handler.ENV_PYDM_DISPLAYS_PATH, os.pathsep.join([str(other), str(displays)]))
+    monkeypatch.chdir(tempdir)
+
+    listed = []
+    listdir = os.listdir
+
+    def counting_listdir(path):
+        listed.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(os, "listdir", counting_listdir)
+    resolver = output_handler.DisplayPathResolver()
+    expected = str(displays / output_handler.QT_STYLESHEET_FILE)
+    for _ in range(3):
+        assert resolver.read(output_handler.QT_STYLESHEET_FILE) == (expected, "first")
+        assert resolver.find("no-such-file.qss") is None
+    assert len(listed) == 3  # current directory and each directory in the path, once
+
+    # known until invalidated
+    (other / output_handler.QT_STYLESHEET_FILE).write_text("second")
+    (displays / output_handler.QT_STYLESHEET_FILE).write_text("changed")
+    assert resolver.read(output_handler.QT_STYLESHEET_FILE) == (expected, "first")
+    resolver.invalidate()
+    expected = str(other / output_handler.QT_STYLESHEET_FILE)
+    assert resolver.read(output_handler.QT_STYLESHEET_FILE) == (expected, "second")
+
+    # other path: look again
+    monkeypatch.setenv(output_handler.ENV_PYDM_DISPLAYS_PATH, str(displays))
+    expected = str(displays / output_handler.QT_STYLESHEET_FILE)
+    assert resolver.read(output_handler.QT_STYLESHEET_FILE) == (expected, "changed")
+    assert resolver.find(str(displays / "missing")) is None
+    assert resolver.find(expected) == expected
+
+
 def test_xml_subelements(tempdir):
     fname = pathlib.Path(tempdir) / "test.xml"
     writer = output_handler.PYDM_Writer(None)
@@ -1201,3 +1303,122 @@ def test_xml_subelements(tempdir):
         "</ui>",
     )
     _core.assertEqual(len(buf), len(expected))
+
+
+@pytest.mark.parametrize("test_file", _core.ALL_EXAMPLE_FILES)
+def test_write_ui_streaming(test_file):
+    "streamed widgets write the same .ui content as the parsed screen"
+    if not test_file.endswith(".adl"):
+        return
+    full_name = str(_core.MEDM_SCREEN_DIR / test_file)
+
+    screen = adl_parser.MedmMainWidget(full_name)
+    screen.parseAdlBuffer(screen.getAdlLines())
+    writer = output_handler.Widget2Pydm()
+    writer.write_ui(screen, None)
+    expected = writer.writer.generate_ui_contents()
+
+    screen = adl_parser.MedmMainWidget(full_name)
+    with open(full_name, "r", encoding="utf8", errors="ignore") as fp:
+        writer = output_handler.Widget2Pydm()
+        writer.write_ui(screen, None, screen.iter_widgets(fp))
+    _core.assertEqual(len(screen.widgets), 0)
+    _core.assertEqual(writer.writer.generate_ui_contents(), expected)
+
+
+def test_register_widget_handlers(tempdir, monkeypatch):
+    "site-specific MEDM widget, registered without subclassing"
+    symbol = "site gauge"
+    monkeypatch.setitem(symbols.adl_widgets, symbol, {})
+    monkeypatch.setitem(adl_parser.MedmBaseWidget.medm_widget_handlers, symbol, None)
+    monkeypatch.setitem(output_handler.Widget2Pydm.pydm_widget_handlers, symbol, None)
+
+    class SiteGaugeWidget(adl_parser.MedmGenericWidget):
+        pass
+
+    def write_site_gauge(writer, parent, block, nm, qw):
+        writer.write_tooltip(qw, "gauge: " + block.contents["monitor"]["chan"])
+
+    adl_parser.registerMedmWidget(symbol, SiteGaugeWidget, pydm_widget="PyDMScaleIndicator")
+    output_handler.Widget2Pydm.register_handler(symbol, write_site_gauge)
+
+    buf = (_core.MEDM_SCREEN_DIR / "rectangle.adl").read_text().splitlines(True)
+    buf += [
+        '"site gauge" {\n',
+        "\tobject {\n",
+        "\t\tx=1\n",
+        "\t\ty=2\n",
+        "\t\twidth=30\n",
+        "\t\theight=40\n",
+        "\t}\n",
+        "\tmonitor {\n",
+        '\t\tchan="demo:gauge"\n',
+        "\t}\n",
+        "}\n",
+    ]
+    screen = adl_parser.MedmMainWidget("rectangle.adl")
+    screen.parseAdlBuffer(buf)
+    widget = screen.widgets[-1]
+    _core.assertIsInstance(widget, SiteGaugeWidget)
+
+    writer = output_handler.Widget2Pydm()
+    writer.write_ui(screen, tempdir)
+    root = ElementTree.parse(pathlib.Path(tempdir) / "rectangle.ui").getroot()
+    screen = _core.getSubElement(root, "widget")
+    w = _core.getNamedWidget(screen, "site_gauge")
+    _core.assertEqualClassName(w, "PyDMScaleIndicator", "site_gauge")
+    _core.assertEqualToolTip(w, "gauge: demo:gauge")
+
+
+def test_register_handler_in_subclass():
+    "a subclass registers its own handlers, the base class is not changed"
+
+    class SiteWriter(output_handler.Widget2Pydm):
+        pass
+
+    def write_site_text(writer, parent, block, nm, qw):
+        pass
+
+    SiteWriter.register_handler("text", write_site_text)
+    _core.assertEqual(SiteWriter.pydm_widget_handlers["text"], write_site_text)
+    _core.assertEqual(output_handler.Widget2Pydm.pydm_widget_handlers["text"], "write_block_text")
+    assert SiteWriter.pydm_widget_handlers is not output_handler.Widget2Pydm.pydm_widget_handlers
+
+
+def _minidom_pretty_xml(root):
+    return minidom.parseString(ElementTree.tostring(root)).toprettyxml(indent="  ")
+
+
+@pytest.mark.parametrize("test_file", _core.ALL_EXAMPLE_FILES)
+def test_write_pretty_xml(test_file, tempdir):
+    "streamed .ui files are the same as minidom's pretty print"
+    if not test_file.endswith(".adl"):
+        return
+    uiname = _core.convertAdlFile(test_file, tempdir)
+
+    screen = adl_parser.MedmMainWidget(str(_core.MEDM_SCREEN_DIR / test_file))
+    screen.parseAdlBuffer(screen.getAdlLines())
+    writer = output_handler.Widget2Pydm()
+    writer.write_ui(screen, None)
+    writer.writer.generate_ui_contents()  # adds the <zorder> elements
+    expected = _minidom_pretty_xml(writer.writer.root)
+    _core.assertEqual((pathlib.Path(tempdir) / uiname).read_text(), expected)
+
+
+def test_write_pretty_xml_escapes():
+    root = ElementTree.Element("ui", version="4.0")
+    child = ElementTree.SubElement(root, "a", name='x"<&>\n\t\r y', other="é")
+    child.text = "t\r\nx\r&<>\"'é\t"
+    ElementTree.SubElement(root, "b").text = ""
+    mixed = ElementTree.SubElement(root, "c")
+    mixed.text = "mixed"
+    ElementTree.SubElement(mixed, "d").tail = "tail\r"
+    ElementTree.SubElement(mixed, "e").text = " "
+
+    fp = io.StringIO()
+    output_handler.write_pretty_xml(fp, root)
+    _core.assertEqual(fp.getvalue(), _minidom_pretty_xml(root))
+
+    ElementTree.SubElement(root, "f").text = "bell\x07"
+    with pytest.raises(ValueError):
+        output_handler.write_pretty_xml(io.StringIO(), root)
@@ -0,0 +1,115 @@
+import pathlib
+import pytest
+import sys
+import threading
+
+from ._core import tempdir
+from .. import cli
+from .. import client
+from .. import output_handler
+from .. import server
+from .. import symbols
+
+from . import _core
+
+
+@pytest.fixture(scope="function")
+def conversion_server(tempdir):
+    srv = server.ConversionServer(str(pathlib.Path(tempdir) / "test.sock"))
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.start()
+    yield srv
+
+    srv.shutdown()
+    thread.join()
+    srv.server_close()
+
+
+def test_requests(conversion_server, tempdir):
+    adlname = "userArrayCalcPlot.adl"
+    full_name = _core.MEDM_SCREEN_DIR / adlname
+    requests = [
+        dict(command="ping"),
+        dict(text=full_name.read_text(), name=adlname),
+        dict(text=full_name.read_text(), name=adlname, options=dict(use_scatterplot=True)),
+        dict(adlfile=str(full_name), dir=tempdir),
+        dict(adlfile=str(pathlib.Path(tempdir) / "missing.adl")),
+        dict(command="unknown"),
+    ]
+    responses = list(client.sendRequests(requests, conversion_server.socket_path))
+    assert [r["ok"] for r in responses] == [True, True, True, True, False, False]
+
+    assert responses[1]["ui"] == _core.expectedUi(adlname)
+    assert "PyDMScatterPlot" not in responses[1]["ui"]
+    assert "PyDMScatterPlot" in responses[2]["ui"]
+    assert symbols.adl_widgets["cartesian plot"]["pydm_widget"] == "PyDMWaveformPlot"
+    # logged while converting
+    assert any("number of plot points" in m for m in responses[1]["messages"])
+
+    ui_file = pathlib.Path(responses[3]["ui_file"])
+    assert ui_file.parent == pathlib.Path(tempdir)
+    assert ui_file.read_text() == responses[1]["ui"]
+    assert "Could not find file" in responses[4]["error"]
+
+
+def test_shutdown(tempdir):
+    socket_path = str(pathlib.Path(tempdir) / "test.sock")
+    srv = server.ConversionServer(socket_path)
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        server.ConversionServer(socket_path)  # already running
+
+    responses = list(client.sendRequests([dict(command="shutdown")], socket_path))
+    assert responses[0]["ok"]
+    thread.join(5)
+    assert not thread.is_alive()
+    srv.server_close()
+    assert not pathlib.Path(socket_path).exists()
+
+
+def test_default_socket(tempdir, monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(client.tempfile, "tempdir", tempdir)
+    socket_path = pathlib.Path(client.defaultSocketPath())
+    directory = socket_path.parent
+    assert directory.parent == pathlib.Path(tempdir)
+
+    srv = server.ConversionServer()
+    assert srv.socket_path == str(socket_path)
+    assert directory.stat().st_mode & 0o777 == 0o700
+    assert socket_path.stat().st_mode & 0o777 == 0o600
+    srv.server_close()
+
+    directory.chmod(0o755)  # others could make the socket
+    with pytest.raises(PermissionError):
+        server.ConversionServer()
+    with pytest.raises(PermissionError):
+        list(client.sendRequests([dict(command="ping")]))
+
+
+def test_stale_socket(tempdir, monkeypatch):
+    socket_path = pathlib.Path(tempdir) / "test.sock"
+    socket_path.touch()  # no server listening
+
+    def remove(path):
+        raise PermissionError(f"not allowed: {path}")
+
+    monkeypatch.setattr(server.os, "remove", remove)
+    with pytest.raises(RuntimeError):
+        server.ConversionServer(str(socket_path))
+
+
+def test_fresh_display_lookups(monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(output_handler.DISPLAY_PATH_RESOLVER, "invalidate", lambda: invalidated.append(1))
+    text = (_core.MEDM_SCREEN_DIR / "rectangle.adl").read_text()
+    for _ in range(2):
+        assert server.convertRequest(dict(text=text, name="rectangle.adl"))["ok"]
+    assert len(invalidated) == 2  # displays may have been added or moved between requests
+
+
+def test_serve_and_watch(tempdir, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["adl2pydm", "--serve", "--watch", tempdir])
+    with pytest.raises(SystemExit):
+        cli.get_user_parameters()
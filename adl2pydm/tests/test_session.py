@@ -0,0 +1,98 @@
+import pathlib
+import pickle
+import pytest
+
+from ._core import tempdir
+from .. import adl_parser
+from .. import cache
+from .. import cli
+from .. import session
+from .. import symbols
+
+from . import _core
+
+
+def test_batch(tempdir):
+    adlnames = ["userArrayCalcPlot.adl", "testDisplay.adl", "slider.adl", "userArrayCalcPlot.adl"]
+    conversion = session.ConversionSession()
+    writer = conversion.writer
+    for adlname in adlnames:
+        ui_filename = conversion.convertFile(str(_core.MEDM_SCREEN_DIR / adlname), tempdir)
+        # same as converted alone
+        assert pathlib.Path(ui_filename).read_text() == _core.expectedUi(adlname)
+    assert conversion.writer is writer  # set up once
+
+
+def test_options():
+    adlname = "userArrayCalcPlot.adl"
+    full_name = str(_core.MEDM_SCREEN_DIR / adlname)
+    conversion = session.ConversionSession()
+    assert conversion.options == dict(use_scatterplot=False)
+
+    scatter = conversion.withOptions(use_scatterplot=True)
+    assert scatter.options == dict(use_scatterplot=True)
+    assert conversion.withOptions(use_scatterplot=True) is scatter
+    assert scatter.withOptions(use_scatterplot=False) is conversion
+    assert conversion.withOptions() is conversion
+
+    screen = adl_parser.MedmMainWidget(full_name)
+    screen.parseAdlBuffer(screen.getAdlLines())
+    assert "PyDMScatterPlot" in scatter.convertScreen(screen)
+    # the global table is not changed
+    assert symbols.adl_widgets["cartesian plot"]["pydm_widget"] == "PyDMWaveformPlot"
+
+    screen = adl_parser.MedmMainWidget(full_name)
+    screen.parseAdlBuffer(screen.getAdlLines())
+    assert conversion.convertScreen(screen) == _core.expectedUi(adlname)
+
+
+def test_pickle(tempdir):
+    path = pathlib.Path(tempdir)
+    conversion = session.ConversionSession(
+        use_scatterplot=True,
+        cache=cache.ParseCache(path / "cache"),
+        store=cache.UiStore(path / "store"),
+    )
+    copy = pickle.loads(pickle.dumps(conversion))
+    assert copy.options == conversion.options
+    assert copy.cache.path == conversion.cache.path
+    assert copy.store.path == conversion.store.path
+    assert copy.writer is not conversion.writer
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_process_files(jobs, tempdir):
+    adlfiles = [str(_core.MEDM_SCREEN_DIR / name) for name in ["userArrayCalcPlot.adl", "slider.adl"]]
+    conversion = session.ConversionSession(use_scatterplot=True)
+    results = cli.processFiles(adlfiles, tempdir, jobs=jobs, session=conversion)
+    assert "PyDMScatterPlot" in pathlib.Path(results[0]).read_text()
+    assert symbols.adl_widgets["cartesian plot"]["pydm_widget"] == "PyDMWaveformPlot"
+
+
+@pytest.mark.parametrize("reader", ["stream", "mmap"])
+def test_readers(reader, tempdir):
+    adlnames = ["userArrayCalcPlot.adl", "testDisplay.adl", "slider.adl"]
+    conversion = session.ConversionSession(reader=reader)
+    for adlname in adlnames:
+        ui_filename = conversion.convertFile(str(_core.MEDM_SCREEN_DIR / adlname), tempdir)
+        assert pathlib.Path(ui_filename).read_text() == _core.expectedUi(adlname)
+    with pytest.raises(ValueError):
+        conversion.convertFile(str(pathlib.Path(tempdir) / "missing.adl"), tempdir)
+    with pytest.raises(ValueError):
+        session.ConversionSession(reader="unknown")
+
+
+def test_widget_registered_later(monkeypatch):
+    conversion = session.ConversionSession(use_scatterplot=True)
+    symbol = "site gauge"
+    monkeypatch.setitem(symbols.adl_widgets, symbol, {})
+    monkeypatch.setitem(adl_parser.MedmBaseWidget.medm_widget_handlers, symbol, None)
+    adl_parser.registerMedmWidget(symbol, adl_parser.MedmGenericWidget, pydm_widget="PyDMScaleIndicator")
+
+    buf = (_core.MEDM_SCREEN_DIR / "rectangle.adl").read_text().splitlines(True)
+    buf += ['"site gauge" {\n', "\tobject {\n", "\t\tx=1\n", "\t\ty=2\n"]
+    buf += ["\t\twidth=30\n", "\t\theight=40\n", "\t}\n", "}\n"]
+    screen = adl_parser.MedmMainWidget("rectangle.adl")
+    screen.parseAdlBuffer(buf)
+    assert 'class="PyDMScaleIndicator"' in conversion.convertScreen(screen)
+    assert conversion.adl_widgets["cartesian plot"]["pydm_widget"] == "PyDMScatterPlot"
@@ -35,3 +35,24 @@ def test_symbols_pydm_widgets():
     assert w.cls == "PyDMLabel"
     assert w.extends == "QLabel"
     assert w.header == "pydm.widgets.label"
+
+
+def test_pydm_widget_ancestors(monkeypatch):
+    assert symbols.pydm_widget_ancestors["PyDMDrawingPie"] == ("PyDMDrawingArc",)
+    assert symbols.pydm_widget_ancestors["PyDMLabel"] == ()
+    assert set(symbols.pydm_widget_ancestors) == set(symbols.pydm_widgets)
+
+    monkeypatch.setattr(symbols, "pydm_widgets", dict(symbols.pydm_widgets))
+    symbols.register_pydm_widget("PyDMTestWedge", "PyDMDrawingPie", "test.wedge")
+    try:
+        assert symbols.pydm_widgets["PyDMTestWedge"].header == "test.wedge"
+        assert symbols.pydm_widget_ancestors["PyDMTestWedge"] == ("PyDMDrawingPie", "PyDMDrawingArc")
+
+        # a loop does not hang
+        symbols.register_pydm_widget("PyDMTestA", "PyDMTestB", "test")
+        symbols.register_pydm_widget("PyDMTestB", "PyDMTestA", "test")
+        assert symbols.pydm_widget_ancestors["PyDMTestA"] == ("PyDMTestB",)
+    finally:
+        monkeypatch.undo()
+        symbols.update_pydm_widget_ancestors()
+    assert "PyDMTestWedge" not in symbols.pydm_widget_ancestors
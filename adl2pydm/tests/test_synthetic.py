@@ -0,0 +1,83 @@
+import pathlib
+import pytest
+import sys
+
+from ._core import tempdir
+from .. import adl_parser
+from .. import cli
+from .. import symbols
+from .. import synthetic
+
+
+def parse(adlfile):
+    screen = adl_parser.MedmMainWidget(str(adlfile))
+    screen.parseAdlBuffer(screen.getAdlLines())
+    return screen
+
+
+def all_widgets(widgets):
+    for widget in widgets:
+        yield widget
+        yield from all_widgets(getattr(widget, "widgets", []))
+
+
+def test_all_widget_types(tempdir):
+    adlfile = pathlib.Path(tempdir) / "synthetic.adl"
+    synthetic.writeSyntheticScreen(adlfile, widgets=2 * len(symbols.adl_widgets))
+    screen = parse(adlfile)
+    assert len(screen.widgets) == 2 * len(symbols.adl_widgets)
+
+    found = set(w.symbol for w in screen.widgets)
+    embedded = [w for w in screen.widgets if "composite file" in w.contents]
+    assert len(embedded) == 2
+    found.add("embedded display")  # written as a composite, like MEDM does
+    assert found == set(symbols.adl_widgets)
+
+    ui = pathlib.Path(cli.processFile(str(adlfile), tempdir)).read_text()
+    for info in symbols.adl_widgets.values():
+        assert info["pydm_widget"] in ui
+
+
+@pytest.mark.parametrize("depth", [0, 1, 12])
+def test_shape(depth, tempdir):
+    adlfile = pathlib.Path(tempdir) / "synthetic.adl"
+    types = ["polyline", "cartesian plot", "strip chart", "related display", "shell command"]
+    synthetic.writeSyntheticScreen(
+        adlfile, types=types, widgets=5, depth=depth, colors=200, points=50, entries=12, macros=4
+    )
+    screen = parse(adlfile)
+    assert len(screen.color_table) == 200
+
+    widgets = screen.widgets
+    for level in range(depth):
+        assert [w.symbol for w in widgets] == ["composite"]
+        widgets = widgets[0].widgets
+        assert widgets[0].symbol == "text"
+        widgets = widgets[1:]
+    polyline, plot, chart, related, shell = widgets
+    assert len(polyline.points) == 50
+    assert len(plot.contents["traces"]) == 12
+    assert len(chart.contents["pens"]) == 12
+    assert len(related.displays) == 12
+    assert len(shell.commands) == 12
+    assert chart.contents["pens"][0]["chan"].startswith("$(P)$(R)$(M2)$(M3)pv")
+
+    assert len(list(all_widgets(screen.widgets))) == 5 + 2 * depth
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        synthetic.syntheticScreen(types=["no such widget"])
+    with pytest.raises(TypeError):
+        synthetic.syntheticScreen(size=5)
+
+
+def test_main(tempdir, capsys):
+    adlfile = pathlib.Path(tempdir) / "cli.adl"
+    sys.argv = [sys.argv[0], str(adlfile), "--widgets", "3", "--types", "text, meter"]
+    synthetic.main()
+    assert [w.symbol for w in parse(adlfile).widgets] == ["text", "meter", "text"]
+
+    sys.argv = [sys.argv[0], "-", "--widgets", "3"]
+    synthetic.main()
+    assert capsys.readouterr().out == synthetic.syntheticScreen(widgets=3)
@@ -0,0 +1,96 @@
+import os
+import pathlib
+import pytest
+import shutil
+
+from ._core import tempdir
+from .. import cli
+from .. import manifest
+from .. import output_handler
+from .. import session
+from .. import watch
+
+from . import _core
+
+
+def test_poll(tempdir):
+    top = pathlib.Path(tempdir)
+    adlfile = top / "slider.adl"
+    shutil.copy(_core.MEDM_SCREEN_DIR / "slider.adl", adlfile)
+    watcher = watch.AdlWatcher(lambda: cli.findAdlFiles(tempdir), debounce=0.1)
+    assert watcher.poll(now=0) == ([], [])
+
+    with open(adlfile, "a") as fp:
+        fp.write("\n")
+    assert watcher.poll(now=1) == ([], [])  # not yet stable
+    assert watcher.poll(now=1.05) == ([], [])
+    assert watcher.poll(now=1.2) == ([str(adlfile)], [])
+    assert watcher.poll(now=2) == ([], [])
+
+    # saved, not changed
+    os.utime(adlfile, (1, 1))
+    assert watcher.poll(now=3) == ([], [])
+    assert watcher.poll(now=4) == ([], [])
+
+    added = top / "sub" / "rectangle.adl"
+    added.parent.mkdir()
+    shutil.copy(_core.MEDM_SCREEN_DIR / "rectangle.adl", added)
+    assert watcher.poll(now=5) == ([], [])
+    assert watcher.poll(now=6) == ([str(added)], [])
+
+    os.remove(adlfile)
+    assert watcher.poll(now=7) == ([], [str(adlfile)])
+
+
+@pytest.mark.parametrize("hashed", [False, True])
+def test_touched_at_start(hashed, tempdir):
+    top = pathlib.Path(tempdir)
+    adlfile = top / "slider.adl"
+    shutil.copy(_core.MEDM_SCREEN_DIR / "slider.adl", adlfile)
+    out = top / "out"
+    cli.processFilesIncremental([str(adlfile)], str(out))
+    converted = None
+    if hashed:
+        converted = manifest.Manifest(out, session.ConversionSession().options).convertedHash
+    watcher = watch.AdlWatcher(lambda: cli.findAdlFiles(tempdir), debounce=0.1, converted=converted)
+
+    # saved, not changed since converted
+    os.utime(adlfile, (1, 1))
+    assert watcher.poll(now=1) == ([], [])
+    assert watcher.poll(now=2) == ([], [])
+
+    with open(adlfile, "a") as fp:
+        fp.write("\n")
+    assert watcher.poll(now=3) == ([], [])
+    assert watcher.poll(now=4) == ([str(adlfile)], [])
+
+
+def test_watch_directory(tempdir, monkeypatch):
+    src = pathlib.Path(tempdir) / "src"
+    out = pathlib.Path(tempdir) / "out"
+    src.mkdir()
+    adlfile = src / "sub" / "slider.adl"
+    uifile = out / "sub" / ("slider" + output_handler.SCREEN_FILE_EXTENSION)
+    polls = []
+    converted = []
+    invalidated = []
+    real_sleep = watch.time.sleep
+
+    def sleep(interval):
+        polls.append(interval)
+        real_sleep(interval)
+        if len(polls) == 1:
+            adlfile.parent.mkdir()
+            shutil.copy(_core.MEDM_SCREEN_DIR / "slider.adl", adlfile)
+        elif len(converted) == 0 and uifile.exists():
+            converted.append(uifile.read_text())
+            os.remove(adlfile)  # only a removal in the next poll
+        elif len(converted) > 0 and not uifile.exists() or len(polls) > 40:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    monkeypatch.setattr(output_handler.DISPLAY_PATH_RESOLVER, "invalidate", lambda: invalidated.append(1))
+    cli.watchDirectory(str(src), str(out), interval=0.05)
+    assert len(converted) == 1
+    assert not uifile.exists()  # output of the removed file
+    assert len(invalidated) == 2  # file added, file removed
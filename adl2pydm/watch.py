@@ -0,0 +1,114 @@
+"""
+Watch .adl files, report them as they change.
+
+Only rely on packages in this project or from the standard Python distribution.
+(So, poll: the standard library has no interface to inotify.)
+"""
+
+import logging
+import os
+import time
+
+from .cache import content_key
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 0.2  # seconds
+DEFAULT_DEBOUNCE = 0.1  # seconds a change must be stable before it is reported
+
+
+class AdlWatcher(object):
+    """
+    poll a set of .adl files (such as a directory tree) for changes
+
+    A file is changed when its modification time or size differ from the
+    last poll and, once they stop changing for ``debounce`` seconds, its
+    content differs too.  (Saving a file without changes is ignored.)
+
+    PARAMETERS
+
+    list_files
+        *callable* : returns the names of the files to watch,
+        such as ``lambda: cli.findAdlFiles(top)``
+    debounce
+        *float* : seconds a change must be stable before it is reported
+    converted
+        *callable* : ``converted(file)`` returns the content hash
+        (``cache.content_key()``) of the file as it was last converted,
+        None if unknown (a change of the file is then reported), such as
+        from a ``manifest.Manifest``.  Files found at the start are
+        hashed when they first change.  Default: None, files found at
+        the start are hashed then.
+    """
+
+    def __init__(self, list_files, debounce=DEFAULT_DEBOUNCE, converted=None):
+        self.list_files = list_files
+        self.debounce = debounce
+        self.converted = converted
+        self.known = {}  # file: [mtime_ns, size, content hash or None (not hashed yet)]
+        self.pending = {}  # file: ((mtime_ns, size), time first seen)
+        for fname, stat in self.scan().items():
+            digest = None
+            if converted is None:
+                try:
+                    digest = self._hash(fname)
+                except OSError:  # removed since listed
+                    continue
+            self.known[fname] = [stat[0], stat[1], digest]
+
+    def scan(self):
+        """{file: (mtime_ns, size)} of the watched files"""
+        found = {}
+        for fname in self.list_files():
+            try:
+                st = os.stat(fname)
+            except OSError:  # removed since listed
+                continue
+            found[fname] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def _hash(self, fname):
+        with open(fname, "rb") as fp:
+            return content_key(fp.read())
+
+    def poll(self, now=None):
+        """Return (changed, removed) lists of files since the last poll."""
+        now = time.monotonic() if now is None else now
+        found = self.scan()
+        changed = []
+        for fname, stat in found.items():
+            known = self.known.get(fname)
+            if known is not None and tuple(known[:2]) == stat:
+                self.pending.pop(fname, None)
+                continue
+            first = self.pending.get(fname)
+            if first is None or first[0] != stat:
+                self.pending[fname] = (stat, now)  # wait until it stops changing
+                continue
+            if now - first[1] < self.debounce:
+                continue
+            del self.pending[fname]
+            try:
+                digest = self._hash(fname)
+            except OSError:
+                continue
+            if known is not None and known[2] is None:
+                known[2] = self.converted(fname)  # found at the start, not hashed
+            if known is None or known[2] != digest:
+                changed.append(fname)
+            self.known[fname] = [stat[0], stat[1], digest]
+
+        removed = sorted(set(self.known) - set(found))
+        for fname in removed:
+            del self.known[fname]
+            self.pending.pop(fname, None)
+        return changed, removed
+
+    def watch(self, callback, interval=DEFAULT_POLL_INTERVAL):
+        """Call ``callback(changed, removed)`` after each poll that finds changes, forever."""
+        while True:
+            changed, removed = self.poll()
+            if len(changed) > 0 or len(removed) > 0:
+                callback(changed, removed)
+            time.sleep(interval)
@@ -15,6 +15,9 @@ import adl2pydm as package
 __entry_points__ = {
     "console_scripts": [
         "adl2pydm = adl2pydm.cli:main",
+        "adl2pydm-client = adl2pydm.client:main",
+        "adl2pydm-benchmark = adl2pydm.benchmark:main",
+        "adl2pydm-synthetic = adl2pydm.synthetic:main",
     ],
     # 'gui_scripts': [],
 }